@@ -0,0 +1,92 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-25 10:12:48
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-25 10:12:48
+FilePath: /mss_diting/app/bench/bench_api.py
+Description: 列表接口基准：触发记录逐级增长，测量首页、深翻页与按条件过滤的响应耗时
+
+键集分页下各项耗时应与表大小无关。
+运行方式（在 app 目录下）：python -m bench.bench_api [最大条数] [级数]
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, sys, time, random, tempfile
+
+# 基准使用临时数据库，需在导入 diting 之前设置
+DB_DIR = tempfile.mkdtemp(prefix="diting-bench-")
+os.environ["DB_FILE"] = os.path.join(DB_DIR, "api.db")
+
+from loguru import logger
+from fastapi.testclient import TestClient
+from diting import db_sqlite
+from diting.mode_api import api, _encode_cursor
+
+RULES = 2000
+SYMBOLS = 200
+TAGS = 10
+START = 1_700_000_000
+
+
+def load_rules():
+    with db_sqlite.get_conn() as conn:
+        conn.executemany("INSERT INTO rules(name,symbol,brokers,rule_json,webhook_url,tag) VALUES(?,?,?,?,?,?)",
+                         [(f"bench-{i}", f"SIM.{i % SYMBOLS:05d}", "sim", "{}", "http://127.0.0.1:9/hook", f"tag-{i % TAGS}")
+                          for i in range(RULES)])
+
+
+def grow(start: int, stop: int, rng: random.Random):
+    # 每条间隔 2 秒，按写入顺序递增
+    rows = []
+    for i in range(start, stop):
+        rule_id = rng.randrange(RULES) + 1
+        rows.append((rule_id, f"SIM.{(rule_id - 1) % SYMBOLS:05d}", "bench",
+                     time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(START + i * 2))))
+    with db_sqlite.get_conn() as conn:
+        conn.executemany("INSERT INTO triggers(rule_id,symbol,message,ts) VALUES(?,?,?,?)", rows)
+
+
+def timed(client: TestClient, url: str, repeat: int = 20) -> float:
+    # 取多次中的最快一次，单位毫秒
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url).raise_for_status()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(total: int = 2_000_000, steps: int = 4):
+    logger.remove()
+    db_sqlite.init_db()
+    load_rules()
+    client = TestClient(api)
+    rng = random.Random(42)
+
+    print(f"{'条数':>10} {'首页':>8} {'深翻页':>8} {'标的':>8} {'规则':>8} {'标签':>8} {'时间段':>8}  (ms)")
+    loaded = 0
+    for step in range(1, steps + 1):
+        target = total * step // steps
+        grow(loaded, target, rng)
+        loaded = target
+        db_sqlite.get_conn().execute("ANALYZE")
+
+        first = timed(client, "/triggers")
+        # 深翻页：从表中部开始取一页
+        middle = db_sqlite.get_conn().execute("SELECT ts, id FROM triggers WHERE id=?", (loaded // 2,)).fetchone()
+        deep = timed(client, f"/triggers?cursor={_encode_cursor(middle['ts'], middle['id'])}")
+        symbol = timed(client, "/triggers/symbol/SIM.00007")
+        rule = timed(client, "/triggers/rule/7")
+        tag = timed(client, "/triggers?tag=tag-3")
+        # 最近半段时间
+        since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(START + loaded))
+        window = timed(client, f"/triggers?since={since}&limit=500")
+        print(f"{loaded:>10,} {first:>8.2f} {deep:>8.2f} {symbol:>8.2f} {rule:>8.2f} {tag:>8.2f} {window:>8.2f}")
+    db_sqlite.close_db()
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,109 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-18 11:26:04
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-18 11:26:04
+FilePath: /mss_diting/app/bench/bench_db.py
+Description: SQLite 并发读写基准：每次新建连接 与 线程长连接 + WAL 对比
+
+模拟引擎线程持续写入触发记录，同时多个 API 线程读取最新触发记录。
+运行方式（在 app 目录下）：python -m bench.bench_db [秒数] [读线程数]
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import os, sys, sqlite3, tempfile, threading, time
+
+# 基准使用临时数据库，需在导入 diting 之前设置
+DB_DIR = tempfile.mkdtemp(prefix="diting-bench-")
+os.environ["DB_FILE"] = os.path.join(DB_DIR, "pooled.db")
+
+from loguru import logger
+from diting import db_sqlite
+from diting.models import Trigger
+
+
+def legacy_add_trigger(db_file: str, trigger: Trigger):
+    # 改造前的写法：每条语句新建连接并提交
+    conn = sqlite3.connect(db_file, timeout=5)
+    cur = conn.cursor()
+    cur.execute("INSERT INTO triggers(rule_id,symbol,message) VALUES(?,?,?)",
+                (trigger.rule_id, trigger.symbol, trigger.message))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_triggers(db_file: str, limit: int = 100):
+    conn = sqlite3.connect(db_file, timeout=5)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT * FROM triggers ORDER BY ts DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def run(add, read, seconds: float, readers: int) -> dict:
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    trigger = Trigger(rule_id=1, symbol="HK.00700", message="bench")
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            try:
+                add(trigger)
+                n += 1
+            except sqlite3.Error:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["writes"] += n
+
+    def reader():
+        n = 0
+        while not stop.is_set():
+            try:
+                read()
+                n += 1
+            except sqlite3.Error:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["reads"] += n
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"inserts/s": round(counts["writes"] / seconds), "reads/s": round(counts["reads"] / seconds),
+            "errors": counts["errors"]}
+
+
+def main(seconds: float = 5, readers: int = 4):
+    logger.remove()
+
+    # 改造前：默认回滚日志模式，每次调用新建连接
+    legacy_db = os.path.join(DB_DIR, "legacy.db")
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("""CREATE TABLE triggers(id INTEGER PRIMARY KEY AUTOINCREMENT, rule_id INTEGER NOT NULL,
+                    symbol TEXT, message TEXT, ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+    conn.commit()
+    conn.close()
+    before = run(lambda t: legacy_add_trigger(legacy_db, t), lambda: legacy_get_triggers(legacy_db), seconds, readers)
+
+    # 改造后：线程长连接 + WAL
+    db_sqlite.init_db()
+    after = run(db_sqlite.add_trigger, db_sqlite.get_triggers, seconds, readers)
+    db_sqlite.close_db()
+
+    print(f"并发读线程 {readers}，持续 {seconds}s")
+    print(f"改造前 : {before}")
+    print(f"改造后 : {after}")
+
+
+if __name__ == '__main__':
+    args = [float(a) for a in sys.argv[1:3]]
+    main(args[0] if args else 5, int(args[1]) if len(args) > 1 else 4)
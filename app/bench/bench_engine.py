@@ -0,0 +1,217 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-22 10:40:26
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-22 10:40:26
+FilePath: /mss_diting/app/bench/bench_engine.py
+Description: 引擎负载基准：标的数 × 每标的规则数 × 规则深度
+
+每组参数分两段测量：
+1. 求值：SimulatedEngine 同步驱动，只计数不触发，得到求值吞吐、每轮耗时与单条规则内存；
+2. 端到端：经 QuoteManager 以固定频率运行，触发写入 SQLite 发件箱并投递到本地 webhook 接收桩，
+   得到触发到 webhook 到达的延迟分位数与 SQLite 写入速率。
+结果写入 bench/results/engine-<时间>.json，并与目录中上一次结果对比求值吞吐。
+运行方式（在 app 目录下）：python -m bench.bench_engine [每段秒数] [每秒行情轮数] [结果目录]
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, sys, json, time, random, platform, subprocess, tempfile, tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# 基准使用临时数据库，需在导入 diting 之前设置；本地接收桩不做主机限速
+DB_DIR = tempfile.mkdtemp(prefix="diting-bench-")
+os.environ["DB_FILE"] = os.path.join(DB_DIR, "engine.db")
+os.environ.setdefault("WEBHOOK_HOST_RATE", "1000000")
+os.environ.setdefault("WEBHOOK_HOST_BURST", "1000000")
+
+import numpy as np
+from loguru import logger
+from diting import db_sqlite
+from diting.models import Rule
+from diting.quote_base import QUOTE_INTERVAL, RULE_EVAL_MODE
+from diting.quote_manager import manager
+from diting.quote_sim import SimulatedEngine
+from diting.trigger_writer import trigger_writer
+from diting.webhook_outbox import outbox
+from bench.bench_rule import make_rule
+from bench.webhook_stub import WebhookStub
+
+SYMBOLS = (100, 1000)
+RULES_PER_SYMBOL = (1, 5)
+DEPTHS = (1, 3)
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    def pick(p: float) -> float | None:
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(len(values) * p))], 2)
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": pick(1.0)}
+
+
+def load_rules(symbols: int, per_symbol: int, depth: int, url: str) -> int:
+    conn = db_sqlite.get_conn()
+    conn.executescript("DELETE FROM rules; DELETE FROM triggers; DELETE FROM webhook_outbox; DELETE FROM rule_changes;")
+    rng = random.Random(42)
+    for i in range(symbols):
+        for k in range(per_symbol):
+            db_sqlite.add_rule(Rule(name=f"bench-{i}-{k}", symbol=f"SIM.{i:05d}", brokers="sim",
+                                    rule_json=json.dumps(make_rule(depth, rng)), webhook_url=url,
+                                    tag="bench", cooldown=0))
+    return symbols * per_symbol
+
+
+def bench_eval(rules: int, per_symbol: int, seconds: float) -> dict:
+    engine = SimulatedEngine(rate=0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    engine._load_symbols_rules()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    matched = [0]
+    def count(rule, symbol, ohlc):
+        matched[0] += 1
+    engine.fire_rule = count
+
+    events, ticks = 0, 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        events += engine.tick()
+        ticks += 1
+    elapsed = time.perf_counter() - started
+    cycle_ms = elapsed / ticks * 1000
+    return {
+        "quotes_per_s": round(events / elapsed),
+        "rule_evals_per_s": round(events * per_symbol / elapsed),
+        "cycle_ms": round(cycle_ms, 3),
+        # 按当前每轮耗时，一个 QUOTE_INTERVAL 内最多可求值的标的数
+        "symbols_per_interval": int(len(engine._symbols) * QUOTE_INTERVAL * 1000 / cycle_ms),
+        "matched": matched[0],
+        "bytes_per_rule": round(retained / rules),
+    }
+
+
+def bench_e2e(rate: float, seconds: float, stub: WebhookStub, fired: dict, latencies: list) -> dict:
+    class BenchEngine(SimulatedEngine):
+        def fire_rule(self, rule, symbol, ohlc):
+            fired.setdefault(rule["name"], time.perf_counter())
+            super().fire_rule(rule, symbol, ohlc)
+
+    engine = BenchEngine(rate=rate)
+    manager.engines.clear()
+    manager.register(engine)
+    committed, delivered, received = trigger_writer.status()["committed"], outbox.status()["delivered"], stub.items
+    manager.start_all()
+    time.sleep(seconds)
+    # 停止行情后留出时间排空写入与投递
+    engine.stop()
+    deadline = time.monotonic() + 5
+    while fired and time.monotonic() < deadline:
+        time.sleep(0.05)
+    status = engine.status()["simulator"]
+    writer = trigger_writer.status()
+    manager.stop_all()
+
+    written = writer["committed"] - committed
+    return {
+        "ticks": status["ticks"],
+        "late_ticks": status["late"],
+        "triggers": written,
+        "delivered": stub.items - received,
+        "undelivered": len(fired),
+        "outbox_delivered": outbox.status()["delivered"] - delivered,
+        "latency_ms": percentiles(latencies),
+        "sqlite_writes_per_s": round(written / seconds),
+        "sqlite_batches": writer["batches"],
+        "sqlite_last_flush_ms": round(writer["last_flush_ms"], 2),
+    }
+
+
+def previous_result(results_dir: Path) -> dict | None:
+    files = sorted(results_dir.glob("engine-*.json"))
+    if not files:
+        return None
+    with open(files[-1], encoding="utf-8") as f:
+        return json.load(f)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(seconds: float = 3, rate: float = 2, results_dir: Path = RESULTS_DIR):
+    logger.remove()
+    db_sqlite.init_db()
+
+    fired, latencies = dict(), list()
+    def on_payload(payload, arrived: float):
+        for item in payload if isinstance(payload, list) else [payload]:
+            started = fired.pop(item["name"], None)
+            if started is not None:
+                latencies.append((arrived - started) * 1000)
+    stub = WebhookStub(on_payload).start()
+
+    results = []
+    for symbols in SYMBOLS:
+        for per_symbol in RULES_PER_SYMBOL:
+            for depth in DEPTHS:
+                rules = load_rules(symbols, per_symbol, depth, stub.url)
+                fired.clear()
+                latencies.clear()
+                result = {"symbols": symbols, "rules_per_symbol": per_symbol, "depth": depth, "rules": rules,
+                          "eval": bench_eval(rules, per_symbol, seconds),
+                          "e2e": bench_e2e(rate, seconds, stub, fired, latencies)}
+                results.append(result)
+                print(f"标的 {symbols:>5} 规则/标的 {per_symbol} 深度 {depth}: "
+                      f"求值 {result['eval']['rule_evals_per_s']:>10} 条/秒 每轮 {result['eval']['cycle_ms']:>8} ms "
+                      f"内存 {result['eval']['bytes_per_rule']:>6} B/规则 | "
+                      f"触发 {result['e2e']['triggers']:>6} 延迟 {result['e2e']['latency_ms']} "
+                      f"写入 {result['e2e']['sqlite_writes_per_s']} 条/秒")
+    stub.stop()
+    db_sqlite.close_db()
+
+    report = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "eval_mode": RULE_EVAL_MODE,
+        "quote_interval": QUOTE_INTERVAL,
+        "seconds": seconds,
+        "rate": rate,
+        "results": results,
+    }
+    results_dir.mkdir(parents=True, exist_ok=True)
+    previous = previous_result(results_dir)
+    path = results_dir / f"engine-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {path}")
+
+    if previous is not None:
+        # 与上一次结果对比求值吞吐，参数组合相同的才比较
+        key = lambda r: (r["symbols"], r["rules_per_symbol"], r["depth"])
+        before = {key(r): r for r in previous["results"]}
+        print(f"对比 {previous['time']} ({previous.get('commit')}):")
+        for r in results:
+            old = before.get(key(r))
+            if old is not None and old["eval"]["rule_evals_per_s"]:
+                ratio = r["eval"]["rule_evals_per_s"] / old["eval"]["rule_evals_per_s"]
+                print(f"  {key(r)}: 求值吞吐 x{ratio:.2f}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(float(args[0]) if args else 3,
+         float(args[1]) if len(args) > 1 else 2,
+         Path(args[2]) if len(args) > 2 else RESULTS_DIR)
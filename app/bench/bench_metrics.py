@@ -0,0 +1,63 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-23 11:20:07
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-23 11:20:07
+FilePath: /mss_diting/app/bench/bench_metrics.py
+Description: 运行指标开销基准：SimulatedEngine 同步求值，指标开启与关闭交替运行对比吞吐
+
+运行方式（在 app 目录下）：python -m bench.bench_metrics [标的数] [每标的规则数] [轮数]
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import sys, time, timeit
+
+# bench_engine 在导入 diting 之前切换到临时数据库
+from bench.bench_engine import load_rules
+from loguru import logger
+from diting import db_sqlite
+from diting.metrics import registry, RULE_EVAL_SECONDS
+from diting.quote_sim import SimulatedEngine
+
+
+def run(engine: SimulatedEngine, seconds: float) -> float:
+    events = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        events += engine.tick()
+    return events / (time.perf_counter() - started)
+
+
+def main(symbols: int = 1000, per_symbol: int = 5, rounds: int = 6, seconds: float = 1):
+    logger.remove()
+    db_sqlite.init_db()
+    load_rules(symbols, per_symbol, 2, "http://127.0.0.1:9/hook")
+    engine = SimulatedEngine(rate=0)
+    engine._load_symbols_rules()
+    engine.fire_rule = lambda rule, symbol, ohlc: None
+
+    # 交替运行，抵消机器负载波动；预热一轮不计入
+    run(engine, seconds)
+    on, off = [], []
+    for _ in range(rounds):
+        registry.enabled = True
+        on.append(run(engine, seconds))
+        registry.enabled = False
+        off.append(run(engine, seconds))
+    registry.enabled = True
+    db_sqlite.close_db()
+
+    best_on, best_off = max(on), max(off)
+    histogram = RULE_EVAL_SECONDS.labels("bench")
+    per_observe = timeit.timeit(lambda: histogram.observe(0.0003), number=200_000) / 200_000 * 1e9
+    print(f"标的 {symbols} 规则/标的 {per_symbol}")
+    print(f"指标关闭 : {best_off:,.0f} 条/秒")
+    print(f"指标开启 : {best_on:,.0f} 条/秒")
+    print(f"开销     : {(best_off - best_on) / best_off * 100:.2f}%")
+    print(f"单次记录 : {per_observe:.0f} ns")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    main(*args)
@@ -0,0 +1,72 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-24 09:47:15
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-24 09:47:15
+FilePath: /mss_diting/app/bench/bench_quote_batch.py
+Description: 行情转换基准：iterrows + QuoteOHLC 与 QuoteBatch.from_dataframe 对比
+
+运行方式（在 app 目录下）：python -m bench.bench_quote_batch
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import timeit
+import numpy as np
+import pandas as pd
+
+from diting.models import QuoteOHLC
+from diting.quote_batch import QuoteBatch
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    # 与 Futu get_stock_quote 返回的列保持一致
+    rng = np.random.default_rng(7)
+    prev = rng.uniform(1, 500, rows)
+    last = prev * rng.uniform(0.9, 1.1, rows)
+    return pd.DataFrame({
+        "code": [f"HK.{i:05d}" for i in range(rows)],
+        "open_price": prev * rng.uniform(0.95, 1.05, rows),
+        "high_price": last * 1.02,
+        "low_price": last * 0.98,
+        "last_price": last,
+        "prev_close_price": prev,
+        "volume": rng.integers(0, 10_000_000, rows),
+    })
+
+
+def legacy_convert(data: pd.DataFrame) -> list[dict]:
+    # 改造前：逐行构造 pydantic 模型，求值时再 model_dump()
+    quotes = []
+    for _, row in data.iterrows():
+        quotes.append(QuoteOHLC(
+            symbol=row['code'],
+            open=row['open_price'],
+            high=row['high_price'],
+            low=row['low_price'],
+            close=row['last_price'],
+            pct_chg=row['last_price'] / row['prev_close_price'] * 100 - 100,
+            pct_amp=row['high_price'] / row['low_price'] * 100 - 100,
+            volume=int(row['volume'])
+        ))
+    return [q.model_dump() for q in quotes]
+
+
+def batch_convert(data: pd.DataFrame) -> list[dict]:
+    return list(QuoteBatch.from_dataframe(data).snapshots())
+
+
+def main():
+    for rows in (100, 1_000, 10_000):
+        data = make_frame(rows)
+        number = max(1, 10_000 // rows)
+        t_legacy = timeit.timeit(lambda: legacy_convert(data), number=number) / number
+        t_batch = timeit.timeit(lambda: QuoteBatch.from_dataframe(data), number=number) / number
+        t_snap = timeit.timeit(lambda: batch_convert(data), number=number) / number
+        print(f"{rows:>6} 行  iterrows+pydantic {t_legacy * 1e3:8.2f} ms | "
+              f"QuoteBatch {t_batch * 1e3:6.3f} ms | QuoteBatch+快照 {t_snap * 1e3:7.2f} ms "
+              f"(x{t_legacy / t_snap:.0f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-10 09:12:40
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-10 09:12:40
+FilePath: /mss_diting/app/bench/bench_rule.py
+Description: 规则求值微基准：eval_rule 与编译闭包对比
+
+运行方式（在 app 目录下）：python -m bench.bench_rule
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import random, timeit
+
+from diting.quote_rule import eval_rule, compile_rule, validate_rule
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+OPS = [">", "<", ">=", "<="]
+
+
+def make_rule(depth: int, rng: random.Random) -> dict:
+    if depth <= 0:
+        return {"field": rng.choice(FIELDS), "op": rng.choice(OPS), "value": rng.uniform(0, 1000)}
+    logic = rng.choice(["AND", "OR", "NOT"])
+    if logic == "NOT":
+        return {"logic": "NOT", "conditions": [make_rule(depth - 1, rng)]}
+    return {"logic": logic, "conditions": [make_rule(depth - 1, rng) for _ in range(rng.randint(2, 4))]}
+
+
+def main(rules_count: int = 2000, depth: int = 3, rounds: int = 20):
+    rng = random.Random(42)
+    rules = [make_rule(depth, rng) for _ in range(rules_count)]
+    for rule in rules:
+        validate_rule(rule)
+    compiled = [compile_rule(rule) for rule in rules]
+    snapshot = {"symbol": "HK.00700", "open": 500.0, "high": 520.0, "low": 490.0,
+                "close": 510.0, "pct_chg": 1.2, "pct_amp": 6.1, "volume": 600}
+
+    # 结果一致性检查
+    assert [eval_rule(r, snapshot) for r in rules] == [c(snapshot) for c in compiled]
+
+    t_eval = timeit.timeit(lambda: [eval_rule(r, snapshot) for r in rules], number=rounds)
+    t_comp = timeit.timeit(lambda: [c(snapshot) for c in compiled], number=rounds)
+    t_build = timeit.timeit(lambda: [compile_rule(r) for r in rules], number=1)
+
+    per_eval = t_eval / rounds / rules_count * 1e6
+    per_comp = t_comp / rounds / rules_count * 1e6
+    print(f"规则数 {rules_count} 深度 {depth}")
+    print(f"eval_rule      : {per_eval:.3f} us/rule")
+    print(f"compile_rule   : {per_comp:.3f} us/rule (x{per_eval / per_comp:.1f})")
+    print(f"编译耗时        : {t_build * 1e3:.1f} ms / {rules_count} 条")
+
+
+if __name__ == '__main__':
+    main()
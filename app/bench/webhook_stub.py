@@ -0,0 +1,94 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-22 10:02:51
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-22 10:02:51
+FilePath: /mss_diting/app/bench/webhook_stub.py
+Description: 本地 webhook 接收桩
+
+在独立线程的事件循环上运行一个最小的 HTTP/1.1 服务（支持长连接），
+收到的每个 JSON 负载连同到达时间交给回调，批量负载按数组逐条应答成功。
+单独运行（在 app 目录下）：python -m bench.webhook_stub [端口]
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import sys, json, time, asyncio, threading
+from typing import Any, Callable
+
+
+class WebhookStub:
+    def __init__(self, on_payload: Callable[[Any, float], None] | None = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.on_payload = on_payload  # 回调参数：(负载, 到达时的 perf_counter)
+        self.host = host
+        self.port = port
+        self.received = 0  # 收到的请求数
+        self.items = 0  # 收到的负载条数，批量请求按数组长度计
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/hook"
+
+    def start(self) -> "WebhookStub":
+        self._thread = threading.Thread(target=self._run, name="webhook-stub", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._loop = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                body = await reader.readexactly(length) if length else b""
+                arrived = time.perf_counter()
+                payload = json.loads(body) if body else None
+                self.received += 1
+                self.items += len(payload) if isinstance(payload, list) else 1
+                if self.on_payload is not None:
+                    self.on_payload(payload, arrived)
+                result = json.dumps([True] * len(payload) if isinstance(payload, list) else {"ok": True}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(result)).encode() + b"\r\n\r\n" + result)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    stub = WebhookStub(lambda payload, _: print(json.dumps(payload, ensure_ascii=False)),
+                       port=int(sys.argv[1]) if len(sys.argv) > 1 else 21001).start()
+    print(f"webhook 接收桩: {stub.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
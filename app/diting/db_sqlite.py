@@ -9,20 +9,76 @@ Description: Sqlite数据库操作
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
 
-import os, json, sqlite3
+import os, json, time, sqlite3, threading
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 from loguru import logger
 from dotenv import load_dotenv
 
 from .models import Rule, Trigger
 from .quote_rule import validate_rule
+from .rule_events import rule_bus
 
 
 # 加载环境变量
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
 DB_FILE = os.getenv("DB_FILE", "diting.db")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # WAL 模式下 NORMAL 即可保证一致性
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-16000"))  # 页缓存，负数单位为 KiB
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))  # 等待写锁的超时，单位秒
+
+# -------------------------
+# 连接管理：每个线程复用一个长连接
+# -------------------------
+_local = threading.local()
+_conns = []
+_conns_lock = threading.Lock()
+
+def get_conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # cached_statements 缓存预编译语句，连接复用后不再重复解析 SQL
+        conn = sqlite3.connect(DB_FILE, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=256,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _local.conn = conn
+        with _conns_lock:
+            _conns.append(conn)
+    return conn
+
+def iter_rows(sql: str, args: list | tuple = (), size: int = 500) -> Iterator[Any]:
+    """独立连接逐批读取，供流式响应使用（迭代可能跨线程，不能复用线程长连接），读完即关闭"""
+    conn = sqlite3.connect(DB_FILE, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        cur = conn.execute(sql, args)
+        while rows := cur.fetchmany(size):
+            yield from rows
+    finally:
+        conn.close()
+
+def close_db():
+    # 关闭所有线程的连接（退出时调用）
+    with _conns_lock:
+        for conn in _conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _conns.clear()
+    _local.__dict__.clear()
+
+
+def _add_column(cur: sqlite3.Cursor, table: str, column: str, ddl: str):
+    columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in columns:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        logger.info(f"数据表 {table} 新增字段 {column}")
 
 # 初始化数据库
 def init_db():
@@ -35,11 +91,10 @@ def init_db():
     else:
         logger.info(f"数据库文件已存在：{DB_FILE}") 
     
-    # 连接数据库
-    conn = sqlite3.connect(DB_FILE)
+    # 连接数据库（同时切换为 WAL 模式）
+    conn = get_conn()
     # 创建游标
     cur = conn.cursor()
-
     # 创建表
     cur.execute("""CREATE TABLE IF NOT EXISTS rules(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -56,124 +111,287 @@ def init_db():
         ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY(rule_id) REFERENCES rules(id)
     )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS webhook_outbox(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trigger_id INTEGER, rule_id INTEGER NOT NULL,
+        symbol TEXT, url TEXT NOT NULL, payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL, last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(trigger_id) REFERENCES triggers(id)
+    )""")
+    # 规则变更日志，由触发器维护，引擎据此增量同步（包括停用与删除）
+    cur.execute("""CREATE TABLE IF NOT EXISTS rule_changes(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        rule_id INTEGER NOT NULL, op TEXT NOT NULL,
+        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_rules_insert AFTER INSERT ON rules BEGIN
+        INSERT INTO rule_changes(rule_id, op) VALUES(NEW.id, 'upsert');
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_rules_update AFTER UPDATE ON rules BEGIN
+        INSERT INTO rule_changes(rule_id, op) VALUES(NEW.id, 'upsert');
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_rules_delete AFTER DELETE ON rules BEGIN
+        INSERT INTO rule_changes(rule_id, op) VALUES(OLD.id, 'delete');
+    END""")
+    # 各引擎已同步到的变更序号，所有引擎都已同步的变更日志可以清理
+    cur.execute("""CREATE TABLE IF NOT EXISTS rule_change_cursors(
+        engine TEXT PRIMARY KEY, seq INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    # 规则冷却状态快照，引擎重启后据此恢复冷却与边沿状态
+    cur.execute("""CREATE TABLE IF NOT EXISTS rule_state(
+        rule_id INTEGER PRIMARY KEY,
+        cooldown_until REAL, last_state INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_rules_delete_state AFTER DELETE ON rules BEGIN
+        DELETE FROM rule_state WHERE rule_id = OLD.id;
+    END""")
+    # 旧库迁移：规则冷却时长与触发模式
+    _add_column(cur, "rules", "cooldown", "INTEGER")
+    _add_column(cur, "rules", "trigger_mode", "TEXT NOT NULL DEFAULT 'level'")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_rules_symbol ON rules(symbol)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_rules_enabled ON rules(enabled)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_triggers_rule_id ON triggers(rule_id)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_triggers_symbol ON triggers(symbol)")
-    # 提交事务并关闭连接
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_rules_tag ON rules(tag)")
+    # 触发记录按 (条件, ts) 分页，索引末尾隐含 rowid，(ts, id) 键集翻页直接走索引；复合索引取代旧的单列索引
+    cur.execute("DROP INDEX IF EXISTS idx_triggers_rule_id")
+    cur.execute("DROP INDEX IF EXISTS idx_triggers_symbol")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_triggers_rule_ts ON triggers(rule_id, ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_triggers_symbol_ts ON triggers(symbol, ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_triggers_ts ON triggers(ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox(status, next_attempt_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_url ON webhook_outbox(url, status)")
+    # 启动时各引擎都会全量加载规则，旧的同步进度与变更日志不再需要（保留最新一条以延续序号）
+    cur.execute("DELETE FROM rule_change_cursors")
+    cur.execute("DELETE FROM rule_changes WHERE seq < (SELECT MAX(seq) FROM rule_changes)")
+    # 提交事务
     conn.commit()
-    conn.close()
     logger.info("数据库初始化完成")
 
 def add_rule(rule: Rule) -> Any:
     # 插入数据库前校验规则
     validate_rule(json.loads(rule.rule_json)) 
 
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO rules(name,symbol,brokers,rule_json,webhook_url,tag,note,enabled,updated_at) VALUES(?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP)",
-                (rule.name, rule.symbol, rule.brokers, rule.rule_json, rule.webhook_url, rule.tag, rule.note, int(rule.enabled)))
-    conn.commit()
-    rule_id = cur.lastrowid
-    conn.close()
-    return rule_id
+    with get_conn() as conn:
+        cur = conn.execute("INSERT INTO rules(name,symbol,brokers,rule_json,webhook_url,tag,note,enabled,cooldown,trigger_mode,updated_at) VALUES(?,?,?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP)",
+                           (rule.name, rule.symbol, rule.brokers, rule.rule_json, rule.webhook_url, rule.tag, rule.note, int(rule.enabled),
+                            rule.cooldown, rule.trigger_mode))
+    rule_bus.publish(cur.lastrowid, "add")
+    return cur.lastrowid
 
 def get_rules(only_valid: bool = True) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
     if only_valid:
-        rows = conn.execute("SELECT * FROM rules WHERE enabled=1").fetchall()
-    else:
-        rows = conn.execute("SELECT * FROM rules").fetchall()
-    conn.close()
-    return rows
+        return get_conn().execute("SELECT * FROM rules WHERE enabled=1").fetchall()
+    return get_conn().execute("SELECT * FROM rules").fetchall()
 
-def get_updated_rules(since: str) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM rules WHERE updated_at > ? AND enabled=1", (since,)).fetchall()
-    conn.close()
-    return rows
+def get_rule_change_seq() -> int:
+    row = get_conn().execute("SELECT MAX(seq) FROM rule_changes").fetchone()
+    return row[0] or 0
+
+def claim_rule_change_seq(engine: str) -> int:
+    # 全量加载前登记引擎的同步进度为当前最新序号并返回；在同一写事务中完成，期间的清理不会越过该序号
+    with get_conn() as conn:
+        conn.execute("""INSERT INTO rule_change_cursors(engine, seq) SELECT ?, COALESCE(MAX(seq), 0) FROM rule_changes WHERE true
+            ON CONFLICT(engine) DO UPDATE SET seq=excluded.seq, updated_at=CURRENT_TIMESTAMP""", (engine,))
+        return conn.execute("SELECT seq FROM rule_change_cursors WHERE engine=?", (engine,)).fetchone()[0]
+
+def ack_rule_changes(engine: str, seq: int) -> None:
+    # 记录引擎已同步到的序号，并清理所有引擎都已同步的变更日志（保留最新一条以延续序号）
+    with get_conn() as conn:
+        conn.execute("""INSERT INTO rule_change_cursors(engine, seq) VALUES(?, ?)
+            ON CONFLICT(engine) DO UPDATE SET seq=excluded.seq, updated_at=CURRENT_TIMESTAMP""", (engine, seq))
+        conn.execute("""DELETE FROM rule_changes WHERE seq <= (SELECT MIN(seq) FROM rule_change_cursors)
+            AND seq < (SELECT MAX(seq) FROM rule_changes)""")
+
+def get_rule_changes(since_seq: int) -> tuple[list[Any], int]:
+    # 返回 seq 之后变更过的规则（每条规则一行）及最新序号；已删除的规则除 change_rule_id 外均为 NULL
+    rows = get_conn().execute("""SELECT c.rule_id AS change_rule_id, MAX(c.seq) AS change_seq, r.*
+        FROM rule_changes c LEFT JOIN rules r ON r.id = c.rule_id
+        WHERE c.seq > ? GROUP BY c.rule_id ORDER BY change_seq""", (since_seq,)).fetchall()
+    seq = max((row["change_seq"] for row in rows), default=since_seq)
+    return rows, seq
 
 def get_rules_by_symbol(symbol: str, only_valid: bool = True) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
     if only_valid:
-        rows = conn.execute("SELECT * FROM rules WHERE symbol=? AND enabled=1", (symbol,)).fetchall()
-    else:
-        rows = conn.execute("SELECT * FROM rules WHERE symbol=?", (symbol,)).fetchall()
-    conn.close()
-    return rows
+        return get_conn().execute("SELECT * FROM rules WHERE symbol=? AND enabled=1", (symbol,)).fetchall()
+    return get_conn().execute("SELECT * FROM rules WHERE symbol=?", (symbol,)).fetchall()
+
+def _rules_query(symbol: str | None, tag: str | None, only_valid: bool, after_id: int) -> tuple[list, list]:
+    sql, args = ["SELECT * FROM rules WHERE id > ?"], [after_id]
+    if only_valid:
+        sql.append("AND enabled=1")
+    for column, value in (("symbol", symbol), ("tag", tag)):
+        if value:
+            sql.append(f"AND {column}=?")
+            args.append(value)
+    sql.append("ORDER BY id")
+    return sql, args
+
+def get_rules_page(symbol: str | None = None, tag: str | None = None, only_valid: bool = True,
+                   after_id: int = 0, limit: int = 100) -> list[Any]:
+    # 按 id 键集分页
+    sql, args = _rules_query(symbol, tag, only_valid, after_id)
+    return get_conn().execute(" ".join(sql + ["LIMIT ?"]), args + [limit]).fetchall()
+
+def iter_rules(symbol: str | None = None, tag: str | None = None, only_valid: bool = True,
+               after_id: int = 0) -> Iterator[Any]:
+    sql, args = _rules_query(symbol, tag, only_valid, after_id)
+    return iter_rows(" ".join(sql), args)
 
 def get_rule(rule_id: int) -> Any:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    row = conn.execute("SELECT * FROM rules WHERE id=?", (rule_id,)).fetchone()
-    conn.close()
-    return row
+    return get_conn().execute("SELECT * FROM rules WHERE id=?", (rule_id,)).fetchone()
 
 def update_rule(rule_id: int, rule: Rule) -> Any:
     # 插入数据库前校验规则
     validate_rule(json.loads(rule.rule_json)) 
     
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("UPDATE rules SET name=?,symbol=?,brokers=?,rule_json=?,webhook_url=?,tag=?,note=?,updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                 (rule.name, rule.symbol, rule.brokers, rule.rule_json, rule.webhook_url, rule.tag, rule.note, rule_id))
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        conn.execute("UPDATE rules SET name=?,symbol=?,brokers=?,rule_json=?,webhook_url=?,tag=?,note=?,cooldown=?,trigger_mode=?,updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                     (rule.name, rule.symbol, rule.brokers, rule.rule_json, rule.webhook_url, rule.tag, rule.note,
+                      rule.cooldown, rule.trigger_mode, rule_id))
+    rule_bus.publish(rule_id, "update")
     return rule_id
 
 def delete_rule(rule_id: int) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("UPDATE rules SET enabled=0 WHERE id=?", (rule_id,))
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        conn.execute("UPDATE rules SET enabled=0 WHERE id=?", (rule_id,))
+    rule_bus.publish(rule_id, "delete")
 
 def purge_rule(rule_id: int) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("DELETE FROM rules WHERE id=?", (rule_id,))
-    conn.commit()
-    conn.close()
-
-def add_trigger(trigger: Trigger) -> Any:
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO triggers(rule_id,symbol,message) VALUES(?,?,?)",
-                (trigger.rule_id, trigger.symbol, trigger.message))
-    conn.commit()
-    trigger_id = cur.lastrowid
-    conn.close()
-    return trigger_id
+    with get_conn() as conn:
+        conn.execute("DELETE FROM rules WHERE id=?", (rule_id,))
+    rule_bus.publish(rule_id, "purge")
 
 def get_triggers(limit: int = 100) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM triggers ORDER BY ts DESC LIMIT ?", (limit,)).fetchall()
-    conn.close()
-    return rows
+    return get_conn().execute("SELECT * FROM triggers ORDER BY ts DESC LIMIT ?", (limit,)).fetchall()
 
 def get_triggers_by_rule_id(rule_id: int, limit: int = 100) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM triggers WHERE rule_id=? ORDER BY ts DESC LIMIT ?", (rule_id, limit)).fetchall()
-    conn.close()
-    return rows
+    return get_conn().execute("SELECT * FROM triggers WHERE rule_id=? ORDER BY ts DESC LIMIT ?", (rule_id, limit)).fetchall()
 
 def get_triggers_by_symbol(symbol: str, limit: int = 100) -> list[Any]:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM triggers WHERE symbol=? ORDER BY ts DESC LIMIT ?", (symbol, limit)).fetchall()
-    conn.close()
-    return rows
+    return get_conn().execute("SELECT * FROM triggers WHERE symbol=? ORDER BY ts DESC LIMIT ?", (symbol, limit)).fetchall()
 
 def delete_trigger(trigger_id: int) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("DELETE FROM triggers WHERE id=?", (trigger_id,))
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        conn.execute("DELETE FROM triggers WHERE id=?", (trigger_id,))
 
 def clear_triggers() -> None:
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("DELETE FROM triggers")
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        conn.execute("DELETE FROM triggers")
+
+def get_triggers_page(symbol: str | None = None, rule_id: int | None = None, tag: str | None = None,
+                      since: str | None = None, until: str | None = None,
+                      before: tuple[str, int] | None = None, limit: int = 100) -> list[Any]:
+    # 按 (ts, id) 倒序键集分页，before 为上一页最后一条的 (ts, id)；时间范围为 [since, until)
+    sql, args = ["SELECT * FROM triggers WHERE 1=1"], []
+    for clause, value in (("AND symbol=?", symbol), ("AND rule_id=?", rule_id),
+                          ("AND rule_id IN (SELECT id FROM rules WHERE tag=?)", tag),
+                          ("AND ts>=?", since), ("AND ts<?", until)):
+        if value is not None:
+            sql.append(clause)
+            args.append(value)
+    if before is not None:
+        sql.append("AND (ts, id) < (?, ?)")
+        args.extend(before)
+    sql.append("ORDER BY ts DESC, id DESC LIMIT ?")
+    args.append(limit)
+    return get_conn().execute(" ".join(sql), args).fetchall()
+
+def get_triggers_after(last_id: int, symbols: set | None = None, rule_ids: set | None = None,
+                       tags: set | None = None, limit: int = 500) -> list[Any]:
+    # 按 id 续读触发记录（带规则名称与标签），用于推送流断线续传
+    sql = ["SELECT t.*, r.name, r.tag FROM triggers t LEFT JOIN rules r ON r.id = t.rule_id WHERE t.id > ?"]
+    args = [last_id]
+    for column, values in (("t.symbol", symbols), ("t.rule_id", rule_ids), ("r.tag", tags)):
+        if values:
+            sql.append(f"AND {column} IN ({','.join('?' * len(values))})")
+            args.extend(values)
+    sql.append("ORDER BY t.id LIMIT ?")
+    args.append(limit)
+    return get_conn().execute(" ".join(sql), args).fetchall()
+
+# -------------------------
+# 规则冷却状态
+# -------------------------
+def get_rule_states() -> list[Any]:
+    return get_conn().execute("SELECT * FROM rule_state").fetchall()
+
+def save_rule_states(rows: list[tuple[int, float | None, int]]) -> None:
+    # rows: (规则 id, 冷却到期时间, 边沿状态)；已无状态的记录直接删除
+    with get_conn() as conn:
+        conn.executemany("""INSERT INTO rule_state(rule_id,cooldown_until,last_state,updated_at) VALUES(?,?,?,CURRENT_TIMESTAMP)
+            ON CONFLICT(rule_id) DO UPDATE SET cooldown_until=excluded.cooldown_until,
+            last_state=excluded.last_state, updated_at=excluded.updated_at""", rows)
+        conn.execute("DELETE FROM rule_state WHERE cooldown_until IS NULL AND last_state=0")
+
+# -------------------------
+# Webhook 发件箱
+# -------------------------
+def add_triggers_batch(items: list[tuple[Trigger, str | None, Any, float]]) -> list[int]:
+    # 批量写入触发记录及其发件箱记录，单个事务提交；items: (触发记录, webhook 地址, 负载, 投递延迟)
+    if not items:
+        return []
+    now = time.time()
+    with get_conn() as conn:
+        conn.executemany("INSERT INTO triggers(rule_id,symbol,message) VALUES(?,?,?)",
+                         [(trigger.rule_id, trigger.symbol, trigger.message) for trigger, _, _, _ in items])
+        # 事务持有写锁，自增 id 连续分配
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        trigger_ids = list(range(last_id - len(items) + 1, last_id + 1))
+        conn.executemany("INSERT INTO webhook_outbox(trigger_id,rule_id,symbol,url,payload,next_attempt_at) VALUES(?,?,?,?,?,?)",
+                         [(trigger_id, trigger.rule_id, trigger.symbol, url, json.dumps(payload, ensure_ascii=False), now + delay)
+                          for trigger_id, (trigger, url, payload, delay) in zip(trigger_ids, items) if url])
+    return trigger_ids
+
+def get_outbox_due(now: float, limit: int = 100) -> list[Any]:
+    return get_conn().execute("SELECT * FROM webhook_outbox WHERE status='pending' AND next_attempt_at<=? ORDER BY next_attempt_at LIMIT ?",
+                              (now, limit)).fetchall()
+
+def get_outbox_fresh(url: str, limit: int = 100) -> list[Any]:
+    # 某地址下尚未尝试过投递的记录，用于合并批量发送
+    return get_conn().execute("SELECT * FROM webhook_outbox WHERE url=? AND status='pending' AND attempts=0 ORDER BY id LIMIT ?",
+                              (url, limit)).fetchall()
+
+def get_outbox_pending_rule_ids() -> set[int]:
+    rows = get_conn().execute("SELECT DISTINCT rule_id FROM webhook_outbox WHERE status='pending'").fetchall()
+    return {row[0] for row in rows}
+
+def get_outbox(status: str = "dead", limit: int = 100) -> list[Any]:
+    return get_conn().execute("SELECT * FROM webhook_outbox WHERE status=? ORDER BY id DESC LIMIT ?", (status, limit)).fetchall()
+
+def count_outbox() -> dict[str, int]:
+    rows = get_conn().execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall()
+    return {row[0]: row[1] for row in rows}
+
+def mark_outbox_done(outbox_ids: list[int]) -> None:
+    with get_conn() as conn:
+        conn.executemany("UPDATE webhook_outbox SET status='done',attempts=attempts+1,last_error=NULL,updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                         [(outbox_id,) for outbox_id in outbox_ids])
+
+def mark_outbox_failed(failures: list[tuple[int, str, float | None]]) -> None:
+    # failures: (id, 错误信息, 下次重试时间)，下次重试时间为 None 表示放弃（死信）
+    with get_conn() as conn:
+        for outbox_id, error, next_attempt_at in failures:
+            if next_attempt_at is None:
+                conn.execute("UPDATE webhook_outbox SET status='dead',attempts=attempts+1,last_error=?,updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                             (error, outbox_id))
+            else:
+                conn.execute("UPDATE webhook_outbox SET attempts=attempts+1,last_error=?,next_attempt_at=?,updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                             (error, next_attempt_at, outbox_id))
+
+def defer_outbox_url(url: str, until: float) -> None:
+    # 地址故障期间，推迟该地址所有待投递记录，避免反复冲击
+    with get_conn() as conn:
+        conn.execute("UPDATE webhook_outbox SET next_attempt_at=MAX(next_attempt_at,?) WHERE url=? AND status='pending'",
+                     (until, url))
+
+def retry_outbox(outbox_id: int) -> bool:
+    # 死信重新投递，记录不存在或不是死信时返回 False
+    with get_conn() as conn:
+        cur = conn.execute("UPDATE webhook_outbox SET status='pending',attempts=0,next_attempt_at=?,updated_at=CURRENT_TIMESTAMP WHERE id=? AND status='dead'",
+                           (time.time(), outbox_id))
+    return cur.rowcount > 0
@@ -0,0 +1,107 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-25 14:11:38
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-25 14:11:38
+FilePath: /mss_diting/app/diting/market_calendar.py
+Description: 交易时段日历与市场状态缓存
+
+按市场（HK / US / SH / SZ）的本地时区与交易时段（含午休）判断是否开市，
+休市期间计算下一次开盘时间；市场状态查询结果按 TTL 缓存，节省 OpenD 请求。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import os, time
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+from pathlib import Path
+from typing import Iterable
+from dotenv import load_dotenv
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+MARKET_STATE_TTL = float(os.getenv("MARKET_STATE_TTL", "300"))  # 市场状态缓存时间，单位秒
+
+# 各市场时区与连续竞价时段（本地时间）
+MARKET_SESSIONS = {
+    "HK": ("Asia/Hong_Kong", [(dtime(9, 30), dtime(12, 0)), (dtime(13, 0), dtime(16, 0))]),
+    "US": ("America/New_York", [(dtime(9, 30), dtime(16, 0))]),
+    "SH": ("Asia/Shanghai", [(dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0))]),
+    "SZ": ("Asia/Shanghai", [(dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0))]),
+}
+
+def market_of(symbol: str) -> str:
+    # Futu 代码格式为 市场.代码，如 HK.00700
+    return symbol.split(".", 1)[0].upper()
+
+def group_by_market(symbols: Iterable[str]) -> dict[str, list[str]]:
+    groups = dict()
+    for symbol in symbols:
+        groups.setdefault(market_of(symbol), []).append(symbol)
+    return groups
+
+# ----------------- 交易日历 -----------------
+class MarketCalendar:
+    def __init__(self, sessions: dict = MARKET_SESSIONS):
+        self.sessions = {market: (ZoneInfo(tz), periods) for market, (tz, periods) in sessions.items()}
+
+    def is_open(self, market: str, now: datetime | None = None) -> bool:
+        """按日历判断是否在交易时段内（不含节假日，节假日由市场状态确认）；未知市场视为开市"""
+        if market not in self.sessions:
+            return True
+        tz, periods = self.sessions[market]
+        local = (now or datetime.now(tz)).astimezone(tz)
+        if local.weekday() >= 5:
+            return False
+        current = local.time()
+        return any(start <= current < end for start, end in periods)
+
+    def next_open(self, market: str, now: datetime | None = None) -> datetime | None:
+        """下一个交易时段的开始时间，已在交易时段内或未知市场返回 None"""
+        if market not in self.sessions or self.is_open(market, now):
+            return None
+        tz, periods = self.sessions[market]
+        local = (now or datetime.now(tz)).astimezone(tz)
+        for days in range(8):
+            day = local.date() + timedelta(days=days)
+            if day.weekday() >= 5:
+                continue
+            for start, _ in periods:
+                candidate = datetime.combine(day, start, tzinfo=tz)
+                if candidate > local:
+                    return candidate
+        return None
+
+    def seconds_until_open(self, markets: Iterable[str], now: datetime | None = None) -> float:
+        """距离任一市场开盘的秒数，已有市场开盘返回 0"""
+        now = now or datetime.now(ZoneInfo("UTC"))
+        waits = []
+        for market in markets:
+            if self.is_open(market, now):
+                return 0.0
+            opening = self.next_open(market, now)
+            if opening is not None:
+                waits.append((opening - now).total_seconds())
+        return max(0.0, min(waits)) if waits else 0.0
+
+
+# ----------------- 市场状态缓存 -----------------
+class MarketStateCache:
+    def __init__(self, ttl: float = MARKET_STATE_TTL):
+        self.ttl = ttl
+        self._states = dict()  # 市场 -> (是否开市, 过期时间)
+
+    def get(self, market: str) -> bool | None:
+        state = self._states.get(market)
+        if state is None or state[1] < time.monotonic():
+            return None
+        return state[0]
+
+    def set(self, market: str, is_open: bool):
+        self._states[market] = (is_open, time.monotonic() + self.ttl)
+
+    def clear(self):
+        self._states.clear()
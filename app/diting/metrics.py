@@ -0,0 +1,168 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-23 09:15:40
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-23 09:15:40
+FilePath: /mss_diting/app/diting/metrics.py
+Description: 运行指标
+
+固定分桶直方图与计数器，记录一次只是一次二分查找和两次加法，不加锁（并发下允许极少量计数丢失）；
+按 Prometheus 文本格式输出，并提供按分桶估算分位数的摘要。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os
+from bisect import bisect_left
+from pathlib import Path
+from dotenv import load_dotenv
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"  # 是否记录运行指标
+
+# 常用分桶：耗时（秒）与数量
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# ----------------- 指标 -----------------
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: float = 1):
+        if registry.enabled:
+            self.value += n
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float, n: int = 1):
+        """记录 n 次取值 value（批量求值按平均耗时一次记入）"""
+        if registry.enabled:
+            self.counts[bisect_left(self.bounds, value)] += n
+            self.sum += value * n
+            self.count += n
+
+    def quantile(self, q: float) -> float | None:
+        # 在所在分桶内线性插值，落在 +Inf 桶时返回最大的有限边界
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                low = self.bounds[i - 1] if i else 0.0
+                return low + (self.bounds[i] - low) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Family:
+    """同名指标按标签取值区分，labels() 返回的子指标可缓存在调用方，避免每次查找"""
+    def __init__(self, kind: str, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self._children = dict()
+
+    def labels(self, *values) -> Counter | Histogram:
+        child = self._children.get(values)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+            self._children[values] = child
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if self.kind == "counter":
+                lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(self._le(), child.counts):
+                cumulative += n
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {child.count}")
+        return lines
+
+    def _le(self) -> list[str]:
+        return [_number(b) for b in self.buckets] + ["+Inf"]
+
+    def summary(self) -> dict:
+        key = lambda values: ",".join(str(v) for v in values) or "all"
+        if self.kind == "counter":
+            return {key(v): child.value for v, child in self._children.items()}
+        return {key(v): child.summary() for v, child in self._children.items() if child.count}
+
+# ----------------- 注册表 -----------------
+class Registry:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._families = dict()
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Family:
+        return self._families.setdefault(name, Family("counter", name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Family:
+        return self._families.setdefault(name, Family("histogram", name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """各指标的次数、均值与估算分位数，供状态查询"""
+        return {name: s for name, family in self._families.items() if (s := family.summary())}
+
+
+# 初始化注册表
+registry = Registry()
+
+# ----------------- 指标定义 -----------------
+QUOTE_FETCH_SECONDS = registry.histogram("diting_quote_fetch_seconds", "行情拉取单次请求耗时", ("engine",))
+QUOTES_PER_CYCLE = registry.histogram("diting_quotes_per_cycle", "每批行情条数", ("engine",), COUNT_BUCKETS)
+RULE_EVAL_SECONDS = registry.histogram("diting_rule_eval_seconds", "每个标的的规则求值耗时（按批次平均）", ("engine",))
+TRIGGERS_FIRED = registry.counter("diting_triggers_fired_total", "规则触发次数")
+TRIGGER_WRITE_SECONDS = registry.histogram("diting_trigger_write_seconds", "触发记录批量写入 SQLite 耗时")
+TRIGGER_WRITE_ROWS = registry.counter("diting_trigger_write_rows_total", "写入 SQLite 的触发记录条数")
+WEBHOOK_SECONDS = registry.histogram("diting_webhook_seconds", "webhook 投递耗时（含排队）", ("host",))
+WEBHOOK_ERRORS = registry.counter("diting_webhook_errors_total", "webhook 投递失败次数", ("host",))
+LOOP_CYCLE_SECONDS = registry.histogram("diting_loop_cycle_seconds", "每轮轮询耗时（含休市休眠）", ("engine",))
+LOOP_LAG_SECONDS = registry.histogram("diting_loop_lag_seconds", "轮询实际间隔超出 QUOTE_INTERVAL 的时长", ("engine",))
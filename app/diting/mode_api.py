@@ -9,21 +9,149 @@ Description: API模式
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
 
-import sqlite3
+import os, json, base64, sqlite3, threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
 from loguru import logger
-from fastapi import FastAPI
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from .db_sqlite import *
 from .quote_manager import manager
+from .metrics import registry
+from .trigger_stream import broadcaster, TriggerFilter
 
 
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+API_PAGE_LIMIT = int(os.getenv("API_PAGE_LIMIT", "100"))  # 列表接口默认每页条数
+API_PAGE_MAX = int(os.getenv("API_PAGE_MAX", "1000"))  # 列表接口每页条数上限
+API_RULES_CACHE = int(os.getenv("API_RULES_CACHE", "32"))  # 规则列表响应缓存的条目数，0 表示不缓存
+
+# ---------- 分页与编码 ----------
+def _encode_cursor(*values) -> str:
+    # 游标对客户端不透明，内容为上一页最后一条的排序键
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail=f"无效的分页游标: {cursor}")
+    return values
+
+def _parse_time(value: str | None, name: str) -> str | None:
+    # 接受 ISO 8601（可带时区），统一转为与 ts 字段一致的 UTC 文本，未带时区按 UTC
+    if not value:
+        return None
+    try:
+        t = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的时间 {name}: {value}")
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc)
+    return t.strftime("%Y-%m-%d %H:%M:%S")
+
+def _encode_rows(rows: Iterable, size: int = 200) -> Iterable[bytes]:
+    # 按批编码 JSON 数组，结果集再大也不在内存中拼出完整响应
+    yield b"["
+    chunk, first = [], True
+    for row in rows:
+        chunk.append(json.dumps(dict(row), ensure_ascii=False))
+        if len(chunk) >= size:
+            yield (("" if first else ",") + ",".join(chunk)).encode()
+            chunk, first = [], False
+    if chunk:
+        yield (("" if first else ",") + ",".join(chunk)).encode()
+    yield b"]"
+
+def _page_response(request: Request, rows: list, limit: int, cursor_of) -> StreamingResponse:
+    # 多取一条判断是否还有下一页，下一页游标放在 X-Next-Cursor 与 Link 头中，响应体仍为数组
+    headers = dict()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = cursor_of(rows[-1])
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return StreamingResponse(_encode_rows(rows), media_type="application/json", headers=headers)
+
+def _triggers_page(request: Request, limit: int, cursor: str | None, **filters) -> StreamingResponse:
+    before = tuple(_decode_cursor(cursor, 2)) if cursor else None
+    rows = get_triggers_page(before=before, limit=limit + 1, **filters)
+    return _page_response(request, rows, limit, lambda row: _encode_cursor(row["ts"], row["id"]))
+
+# ---------- 规则列表缓存 ----------
+class _RulesCache:
+    """规则列表响应按 (规则变更序号, 查询参数) 缓存，规则有任何变更时序号递增，旧条目自然失效"""
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+
+    def get(self, key: tuple) -> tuple[bytes, str | None] | None:
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is not None:
+                self._bodies.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: tuple[bytes, str | None]):
+        # entry: (响应体, 下一页游标)
+        if not self.size:
+            return
+        with self._lock:
+            self._bodies[key] = entry
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.size:
+                self._bodies.popitem(last=False)
+
+    def collect(self, key: tuple, chunks: Iterable[bytes]) -> Iterable[bytes]:
+        # 边输出边收集，完整输出后写入缓存
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(key, (b"".join(parts), None))
+
+
+# 初始化规则列表缓存
+rules_cache = _RulesCache(API_RULES_CACHE)
+
 # ---------- FastAPI ----------
 api = FastAPI(title="Diting MCP+FastAPI Mixed Service")
 
 @api.get("/rules")
-def list_rules_api():
-    rows = get_rules()
-    return rows
+def list_rules_api(request: Request, symbol: str | None = None, tag: str | None = None, only_valid: bool = True,
+                   cursor: str | None = None, limit: int | None = Query(default=None, ge=1, le=API_PAGE_MAX),
+                   if_none_match: str | None = Header(default=None)):
+    # 不带 limit 时流式返回游标之后的全部规则；ETag 由规则变更序号与查询参数生成，未变化时返回 304
+    after_id = _decode_cursor(cursor, 1)[0] if cursor else 0
+    key = (get_rule_change_seq(), symbol, tag, only_valid, after_id, limit)
+    etag = f'W/"{base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    cached = rules_cache.get(key)
+    if cached is None and limit is None:
+        return StreamingResponse(rules_cache.collect(key, _encode_rows(iter_rules(symbol, tag, only_valid, after_id))),
+                                 media_type="application/json", headers=headers)
+    if cached is None:
+        rows = get_rules_page(symbol, tag, only_valid, after_id, limit + 1)
+        next_cursor = _encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+        cached = (b"".join(_encode_rows(rows[:limit])), next_cursor)
+        rules_cache.put(key, cached)
+    body, next_cursor = cached
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return Response(body, media_type="application/json", headers=headers)
 
 @api.get("/rules/symbol/{symbol}")
 def get_rules_by_symbol_api(symbol: str, only_valid: bool = True):
@@ -54,21 +182,65 @@ def delete_rule_by_id_api(rule_id: int):
     return {"status":"ok"}  
 
 @api.get("/triggers")
-def list_triggers_api():
-    rows = get_triggers()
-    return rows
+def list_triggers_api(request: Request, symbol: str | None = None, rule_id: int | None = None, tag: str | None = None,
+                      since: str | None = None, until: str | None = None, cursor: str | None = None,
+                      limit: int = Query(default=API_PAGE_LIMIT, ge=1, le=API_PAGE_MAX)):
+    # 按时间倒序，时间范围为 [since, until)；翻页使用响应头 X-Next-Cursor 中的游标
+    return _triggers_page(request, limit, cursor, symbol=symbol, rule_id=rule_id, tag=tag,
+                          since=_parse_time(since, "since"), until=_parse_time(until, "until"))
+
+@api.get("/triggers/stream")
+async def stream_triggers_api(request: Request, symbol: str | None = None, rule_id: str | None = None,
+                              tag: str | None = None, last_id: int | None = None,
+                              last_event_id: str | None = Header(default=None)):
+    # Server-Sent Events 推送触发记录，过滤条件可逗号分隔多个；断线重连时按 Last-Event-ID 续传
+    trigger_filter = TriggerFilter.parse(symbol, rule_id, tag)
+    if last_id is None and last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event in broadcaster.stream(trigger_filter, last_id):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield f"id: {event['id']}\nevent: trigger\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @api.get("/triggers/symbol/{symbol}")
-def get_triggers_by_symbol_api(symbol: str):
-    rows = get_triggers_by_symbol(symbol)
-    return rows
+def get_triggers_by_symbol_api(request: Request, symbol: str, since: str | None = None, until: str | None = None,
+                               cursor: str | None = None, limit: int = Query(default=API_PAGE_LIMIT, ge=1, le=API_PAGE_MAX)):
+    return _triggers_page(request, limit, cursor, symbol=symbol,
+                          since=_parse_time(since, "since"), until=_parse_time(until, "until"))
 
 @api.get("/triggers/rule/{rule_id}")
-def get_triggers_by_rule_api(rule_id: int):
-    rows = get_triggers_by_rule_id(rule_id)
-    return rows
+def get_triggers_by_rule_api(request: Request, rule_id: int, since: str | None = None, until: str | None = None,
+                             cursor: str | None = None, limit: int = Query(default=API_PAGE_LIMIT, ge=1, le=API_PAGE_MAX)):
+    return _triggers_page(request, limit, cursor, rule_id=rule_id,
+                          since=_parse_time(since, "since"), until=_parse_time(until, "until"))
+
+@api.get("/outbox/dead")
+def list_dead_outbox_api(limit: int = Query(default=API_PAGE_LIMIT, ge=1, le=API_PAGE_MAX)):
+    # 放弃投递的 webhook（死信），最新的在前
+    return [dict(row) for row in get_outbox("dead", limit)]
+
+@api.post("/outbox/{outbox_id}/retry")
+def retry_outbox_api(outbox_id: int):
+    if not retry_outbox(outbox_id):
+        raise HTTPException(status_code=404, detail=f"死信不存在: {outbox_id}")
+    logger.info(f"死信重新投递，ID={outbox_id}")
+    return {"status":"ok"}
 
 @api.post("/engine/status")
 def engine_status_api():
     status = manager.status()
     return status
+
+@api.get("/metrics", response_class=PlainTextResponse)
+def metrics_api():
+    # Prometheus 文本格式
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -14,6 +14,7 @@ from mcp.server.fastmcp import FastMCP
 from mcp.types import Tool
 
 from .quote_manager import manager
+from .metrics import registry
 from .db_sqlite import *
 
 mcp = FastMCP("quote-service")
@@ -24,12 +25,14 @@ mcp = FastMCP("quote-service")
 def mcp_add_rule(name: str, symbol: str, 
                  brokers: str, rule_json: str,
                  webhook_url: str, tag: str,
-                 note: str="", enabled: bool=True):
+                 note: str="", enabled: bool=True,
+                 cooldown: int | None=None, trigger_mode: str="level"):
     """通过 MCP 添加规则"""
     return add_rule(Rule(name=name, symbol=symbol, 
                          brokers=brokers, rule_json=rule_json,
                          webhook_url=webhook_url, tag=tag, 
-                         note=note, enabled=enabled))
+                         note=note, enabled=enabled,
+                         cooldown=cooldown, trigger_mode=trigger_mode))
 
 @mcp.tool()
 def mcp_list_rules():
@@ -41,7 +44,19 @@ def mcp_list_triggers():
     """通过 MCP 获取触发日志"""
     return get_triggers()
 
+@mcp.tool()
+def mcp_list_dead_webhooks(limit: int = 100):
+    """通过 MCP 列出放弃投递的 webhook（死信）"""
+    return [dict(row) for row in get_outbox("dead", limit)]
+
+@mcp.tool()
+def mcp_retry_webhook(outbox_id: int):
+    """通过 MCP 重新投递一条死信"""
+    return {"status": "ok" if retry_outbox(outbox_id) else "not_found"}
+
 @mcp.tool()
 async def get_engine_status() -> str:
-    """获取所有行情引擎的运行状态"""
-    return json.dumps(manager.status(), ensure_ascii=False)
+    """获取所有行情引擎的运行状态，附带运行指标摘要（次数、均值与估算分位数）"""
+    status = manager.status()
+    status["metrics"] = registry.summary()
+    return json.dumps(status, ensure_ascii=False)
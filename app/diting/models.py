@@ -9,6 +9,7 @@ Description: 数据模型
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
 
+from typing import Literal
 from pydantic import BaseModel
 
 class Rule(BaseModel):
@@ -21,6 +22,8 @@ class Rule(BaseModel):
     tag: str
     note: str = ""
     enabled: bool = True
+    cooldown: int | None = None  # 冷却时长，单位秒，为空使用默认值
+    trigger_mode: Literal["level", "edge"] = "level"  # level 成立即触发 / edge 由不成立变为成立时触发
     updated_at: str | None = None
 
 class Trigger(BaseModel):
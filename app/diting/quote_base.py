@@ -10,69 +10,313 @@ Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
 '''
 
 
-import os, asyncio, json, requests
+import os, time, asyncio, json
 from abc import ABC, abstractmethod
 from loguru import logger
-from typing import List
+from typing import Callable, List
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
 from .models import *
-from .db_sqlite import add_trigger, get_rules
-from .quote_rule import eval_rule
+from .db_sqlite import (get_rules, get_rule_changes, get_rule_change_seq, claim_rule_change_seq, ack_rule_changes,
+                        get_outbox_pending_rule_ids)
+from .quote_rule import get_compiled_rule, prune_compiled_rules, discard_compiled_rule, rule_indicators
+from .quote_batch import QuoteBatch
+from .quote_vector import VectorRuleSet
+from .quote_index import ThresholdIndex
+from .quote_dag import RuleDag, merge_dag_stats
+from .quote_indicator import SymbolIndicators
+from .quote_cooldown import CooldownManager
+from .webhook_outbox import outbox
+from .trigger_writer import trigger_writer
+from .metrics import QUOTES_PER_CYCLE, RULE_EVAL_SECONDS, TRIGGERS_FIRED, LOOP_CYCLE_SECONDS, LOOP_LAG_SECONDS
 
 
 # 加载环境变量
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
 QUOTE_INTERVAL = int(os.getenv("QUOTE_INTERVAL", "60"))  # 行情轮询间隔，单位秒
-COOLING_CYCLE = int(os.getenv("COOLING_CYCLE", "10"))  # 规则冷却周期，单位次数
+COOLING_CYCLE = int(os.getenv("COOLING_CYCLE", "10"))  # 规则兜底同步与冷却状态快照周期，单位次数
+COOLDOWN_SECONDS = int(os.getenv("COOLDOWN_SECONDS", str(COOLING_CYCLE * QUOTE_INTERVAL)))  # 规则未设置冷却时长时的默认值，单位秒
+RULE_EVAL_MODE = os.getenv("RULE_EVAL_MODE", "scalar")  # 规则求值模式：scalar 逐条 / vector 批量向量化
+
+# brokers 中表示不限券商的取值
+ANY_BROKER = {"", "*", "all"}
+
+def parse_brokers(brokers: str | None) -> set | None:
+    """规则的 brokers 字段按逗号分隔、不区分大小写，返回 None 表示不限券商"""
+    names = {b.strip().lower() for b in (brokers or "").split(",")}
+    names.discard("")
+    if not names or names & ANY_BROKER:
+        return None
+    return names
 
 # ----------------- 引擎基类 -----------------
 class BaseQuoteEngine(ABC):
     def __init__(self, name: str):
         self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
         self._task = None
         self._running = False
         self._symbols = set()
         self._rules = dict()
+        self._vector_rules = None  # 批量模式下的向量化规则集
+        self._fallback_rules = dict()  # 批量模式下无法向量化的规则
+        self._indexes = dict()  # 逐条模式下每个标的的阈值索引
+        self._dags = dict()  # 逐条模式下每个标的的规则 DAG
+        self._indicators = dict()  # 标的 -> 指标状态，仅包含有指标规则的标的
+        self._rules_by_id = dict()  # 规则 id -> 规则，用于接收投递结果
+        self.cooldowns = CooldownManager()  # 规则冷却计时，状态快照到数据库
+        self.outbox = outbox  # webhook 发件箱
+        self.trigger_writer = trigger_writer  # 触发记录异步写入，引擎只负责入队
         self._update_counter = 0
         self._updated = "1970-01-01 00:00:00"  # 上次规则更新的时间
+        self._change_seq = 0  # 已同步的规则变更序号
+        self.track_changes = True  # 是否登记同步进度，已登记的引擎都同步过的变更日志才会清理
+        self._sync_scheduled = False  # 是否已安排一次规则同步
+        self.shards = None  # 分片模式下由分片进程池求值，本引擎只负责拉取行情
+        self.recorder = None  # 行情录制器，启用时每个批次入队录制
+        self.hub = None  # 多券商汇聚层，启用时行情发布到汇聚层统一求值
+        self.broker = name.lower()  # 只加载 brokers 包含本券商的规则，None 表示加载全部规则
+        self.sources = set()  # 已注册的券商（小写），由管理者在启动前设置
+        self._unrouted = set()  # 已告警过的、限定券商均未注册的规则 id
+        self._restricted = dict()  # 标的 -> 该标的规则限定的券商集合，仅包含有限定券商规则的标的
+        self._eval_source = None  # 当前批次行情的来源券商，汇聚层据此按规则的 brokers 过滤
+        self._eval_primaries = None  # 当前批次为非主来源补充求值时，标的 -> 主来源
+        # 运行指标，子指标在此取好，热路径上不再按标签查找
+        self._m_quotes = QUOTES_PER_CYCLE.labels(name)
+        self._m_eval = RULE_EVAL_SECONDS.labels(name)
+        self._m_cycle = LOOP_CYCLE_SECONDS.labels(name)
+        self._m_lag = LOOP_LAG_SECONDS.labels(name)
+
+    def _warn_unrouted(self, row, brokers: set):
+        # 限定的券商均未注册的规则不会被任何引擎求值，每条规则告警一次（汇聚模式下由汇聚层告警）
+        known = self.sources or ({self.broker} if self.broker else set())
+        if self.hub is None and known and not brokers & known and row["id"] not in self._unrouted:
+            self._unrouted.add(row["id"])
+            logger.warning(f"[{self.name}] 规则 {row['name']} 限定的券商 {sorted(brokers)} "
+                           f"均未注册（已注册 {sorted(known)}），不会被求值")
+
+    def _prepare_rule(self, row, pending_ids: set) -> dict | None:
+        brokers = parse_brokers(row["brokers"])
+        if brokers is not None:
+            self._warn_unrouted(row, brokers)
+            if self.broker is not None and self.broker not in brokers:
+                return None
+        rule = dict(row)
+        try:
+            # 将 rule_json 从字符串转换为字典，并编译为闭包（规则未变化时复用缓存）
+            rule["rule_json"], rule["_eval"] = get_compiled_rule(
+                rule["id"], rule["updated_at"], row["rule_json"])
+        except (ValueError, KeyError) as e:
+            logger.error(f"[{self.name}] 规则编译失败，跳过: {rule['name']} {e}")
+            return None
+        # 冷却时长与触发模式；冷却、边沿状态沿用冷却管理器中的记录
+        rule["_cooldown"] = COOLDOWN_SECONDS if row["cooldown"] is None else row["cooldown"]
+        rule["_mode"] = row["trigger_mode"] or "level"
+        rule["_brokers"] = parse_brokers(row["brokers"])
+        rule["_invoked"] = self.cooldowns.is_cooling(rule["id"])
+        old = self._rules_by_id.get(rule["id"])
+        rule["_last"] = old["_last"] if old is not None else self.cooldowns.restored_last(rule["id"])
+        # 发件箱中仍有待投递记录的规则保持待定
+        rule["_pending"] = rule["id"] in pending_ids
+        return rule
+
+    def _build_symbol(self, symbol: str):
+        # 重建单个标的的求值结构，规则对象（及其冷却状态）保持不变
+        rules = self._rules.get(symbol)
+        restricted = {frozenset(r["_brokers"]) for r in rules or () if r["_brokers"] is not None}
+        if restricted:
+            self._restricted[symbol] = restricted
+        else:
+            self._restricted.pop(symbol, None)
+        if not rules:
+            self._rules.pop(symbol, None)
+            self._dags.pop(symbol, None)
+            self._indexes.pop(symbol, None)
+            self._indicators.pop(symbol, None)
+            return
+        self._build_indicators(symbol, set().union(*(rule_indicators(r["rule_json"]) for r in rules)))
+        if RULE_EVAL_MODE == "vector":
+            return
+        # 同一标的的规则合并为 DAG，相同条件每次行情只求值一次
+        dag = self._dags[symbol] = RuleDag()
+        for rule in rules:
+            rule["_eval"] = dag.add(rule["rule_json"])
+        self._indexes[symbol] = ThresholdIndex(rules)
+
+    def _build_indicators(self, symbol: str, specs: set):
+        # 指标集合不变时保留状态；变化时新建缓冲区并沿用已有历史
+        old = self._indicators.get(symbol)
+        if not specs:
+            self._indicators.pop(symbol, None)
+        elif old is None or old.specs != specs:
+            self._indicators[symbol] = SymbolIndicators(specs, old)
+
+    def _build_vector(self):
+        if RULE_EVAL_MODE != "vector":
+            return
+        # 边沿触发需要每次的求值结果，不参与向量化
+        rules = [r for rules in self._rules.values() for r in rules]
+        self._vector_rules = VectorRuleSet([r for r in rules if r["_mode"] == "level"])
+        self._fallback_rules = dict()
+        for rule in self._vector_rules.fallback + [r for r in rules if r["_mode"] != "level"]:
+            self._fallback_rules.setdefault(rule["symbol"], []).append(rule)
+        logger.info(f"[{self.name}] 向量化规则 {len(self._vector_rules)} 条，逐条求值 {len(self._vector_rules.fallback)} 条")
+
+    def _update_symbols(self):
+        symbols = set(self._rules.keys())
+        added, removed = symbols - self._symbols, self._symbols - symbols
+        self._symbols = symbols
+        if added or removed:
+            self._on_symbols_changed(added, removed)
+
+    def _on_symbols_changed(self, added: set, removed: set):
+        """标的集合变化时调用，子类可据此订阅或退订行情"""
+        pass
 
     def _load_symbols_rules(self):
         last_update = self._updated
         self._updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 先登记变更序号，加载期间发生的变更会在下次增量同步时重放
+        self._change_seq = claim_rule_change_seq(self.name) if self.track_changes else get_rule_change_seq()
+        if not self._rules_by_id and not self.delegated:
+            # 首次加载，恢复重启前的冷却与边沿状态
+            self.cooldowns.restore(self.now())
 
         # 加载所有规则
         self._rules = dict()
+        self._rules_by_id = dict()
+        self._dags = dict()
+        self._indexes = dict()
+        self._restricted = dict()
+        rule_ids = set()
+        pending_ids = get_outbox_pending_rule_ids()
         for row in get_rules(only_valid=True):
-            rule = dict(row)
-            # 将 rule_json 从字符串转换为字典
-            rule["rule_json"] = json.loads(row["rule_json"])
-            # 给触发标记一个初始值
-            rule["_invoked"] = False
+            rule_ids.add(row["id"])
+            rule = self._prepare_rule(row, pending_ids)
+            if rule is None:
+                continue
+            self._rules_by_id[rule["id"]] = rule
             if rule["symbol"] in self._rules.keys():
                 self._rules[rule["symbol"]].append(rule)
             else:
                 self._rules[rule["symbol"]] = [rule]
-        self._symbols = set(self._rules.keys())
+        prune_compiled_rules(rule_ids)
+
+        for symbol in list(self._rules.keys()):
+            self._build_symbol(symbol)
+        for symbol in list(self._indicators.keys()):
+            if symbol not in self._rules:
+                del self._indicators[symbol]
+        self._build_vector()
+        self._update_symbols()
+        if self._dags:
+            logger.info(f"[{self.name}] 规则 DAG 去重: {merge_dag_stats(list(self._dags.values()))}")
         logger.info(f"[{self.name}] 更新规则与标的@ {last_update}")
 
-    
-            
+    def _sync_rules(self) -> int:
+        """增量同步：只处理上次同步后变更（新增、修改、停用、删除）的规则，返回变更数量"""
+        changes, seq = get_rule_changes(self._change_seq)
+        if not changes:
+            return 0
+
+        touched = set()
+        pending_ids = None
+        for row in changes:
+            rule_id = row["change_rule_id"]
+            rule = None
+            if row["id"] is not None and row["enabled"]:
+                if pending_ids is None:
+                    pending_ids = get_outbox_pending_rule_ids()
+                rule = self._prepare_rule(row, pending_ids)
+            else:
+                # 已删除或已停用
+                discard_compiled_rule(rule_id)
+                self.cooldowns.cancel(rule_id)
+            old = self._rules_by_id.pop(rule_id, None)
+            if old is not None:
+                touched.add(old["symbol"])
+                self._rules[old["symbol"]] = [r for r in self._rules[old["symbol"]] if r["id"] != rule_id]
+            if rule is None:
+                continue
+            self._rules_by_id[rule_id] = rule
+            self._rules.setdefault(rule["symbol"], []).append(rule)
+            touched.add(rule["symbol"])
+
+        for symbol in touched:
+            self._build_symbol(symbol)
+        self._build_vector()
+        self._update_symbols()
+        self._change_seq = seq
+        if self.track_changes:
+            ack_rule_changes(self.name, seq)
+        logger.info(f"[{self.name}] 增量同步规则 {len(changes)} 条，涉及标的 {touched}")
+        return len(changes)
+
+    def on_rule_changed(self, rule_id: int, op: str):
+        """规则变更通知（需在引擎事件循环内调用），同一批变更合并为一次同步"""
+        if self._running and not self._sync_scheduled:
+            self._sync_scheduled = True
+            asyncio.get_running_loop().call_soon(self._apply_rule_changes)
+
+    def _apply_rule_changes(self):
+        self._sync_scheduled = False
+        try:
+            self._sync_rules()
+        except Exception as e:
+            logger.warning(f"[{self.name}] 规则同步异常: {e}")
+
+    def now(self) -> float:
+        """冷却计时所用的时钟，回放时为行情时间"""
+        return time.time()
+
+    def _expire_cooldowns(self):
+        # 冷却到期的规则清除已触发标记，并让阈值索引在下次行情时重新求值（投递中的规则不受影响）
+        for rule_id in self.cooldowns.expire(self.now()):
+            rule = self._rules_by_id.get(rule_id)
+            if rule is None:
+                continue
+            rule["_invoked"] = False
+            index = self._indexes.get(rule["symbol"])
+            if index is not None:
+                index.rearm(rule)
+
+    @property
+    def delegated(self) -> bool:
+        """求值交给汇聚层或分片进程时，本引擎的规则状态不是实际状态"""
+        return self.hub is not None or self.shards is not None
+
+    def _snapshot_cooldowns(self):
+        # 冷却与边沿状态由实际求值的引擎快照，避免用空状态覆盖
+        if not self.delegated:
+            self.cooldowns.snapshot(self._rules_by_id.values())
+
+    def _start_cooldown(self, rule: dict):
+        if self.cooldowns.start(rule["id"], rule["_cooldown"], self.now()):
+            rule["_invoked"] = True  # 标记为已触发
+
     async def _safe_loop(self):
         logger.info(f"[{self.name}] 开始运行...")
+        last = None
         while self._running:
+            started = time.monotonic()
+            if last is not None:
+                self._m_lag.observe(max(0.0, started - last - QUOTE_INTERVAL))
+            last = started
             try:
                 self._update_counter += 1
-                # 冷却周期到期，进行更新
+                # 规则变更由事件推送，这里的同步只作兜底；冷却状态定期快照
                 if self._update_counter >= COOLING_CYCLE:
                     self._update_counter = 0
-                    self._load_symbols_rules()
+                    self._sync_rules()
+                    self._snapshot_cooldowns()
+                self._expire_cooldowns()
                 await self.loop()
             except Exception as e:
                 logger.warning(f"[{self.name}] 异常: {e}")
+            self._m_cycle.observe(time.monotonic() - started)
             await asyncio.sleep(QUOTE_INTERVAL)
         logger.info(f"[{self.name}] 运行已停止")
 
@@ -85,11 +329,20 @@ class BaseQuoteEngine(ABC):
         if not self._running:
             logger.info(f"[{self.name}] 开始运行...")
             self._load_symbols_rules()  # 初始加载规则
+            self.outbox.subscribe(self._on_delivery)
+            self.trigger_writer.subscribe(self._on_triggers_written)
             self._running = True
+            self._loop = loop
             self._task = loop.create_task(self._safe_loop())
 
     def stop(self):
         self._running = False
+        try:
+            self._snapshot_cooldowns()
+        except Exception as e:
+            logger.warning(f"[{self.name}] 冷却状态快照失败: {e}")
+        self.outbox.unsubscribe(self._on_delivery)
+        self.trigger_writer.unsubscribe(self._on_triggers_written)
         if self._task:
             logger.info(f"[{self.name}] 尝试停止...")
             self._task.cancel()
@@ -97,46 +350,179 @@ class BaseQuoteEngine(ABC):
     def is_running(self):
         return self._running and not self._task.done() if self._task else False
 
-    def eval_rules_trigger(self, rules: List[dict], quote: QuoteOHLC):
-        # 评估规则是否触发
-        ohlc = quote.model_dump()
+    def status(self) -> dict:
+        status = {
+            "running": self.is_running(),
+            "symbols": len(self._symbols),
+            "rules": sum(len(rules) for rules in self._rules.values()),
+            "eval_mode": RULE_EVAL_MODE,
+        }
+        if self._dags:
+            status["dag"] = merge_dag_stats(list(self._dags.values()))
+        if self._indicators:
+            status["indicators"] = {
+                "symbols": len(self._indicators),
+                "bytes": sum(state.nbytes for state in self._indicators.values()),
+            }
+        return status
+
+    @staticmethod
+    def make_trigger(rule: dict, symbol: str, ohlc: dict) -> tuple[Trigger, dict]:
+        # 触发记录与 webhook 负载
+        TRIGGERS_FIRED.labels().inc()
+        trigger = Trigger(
+            rule_id=rule['id'],
+            symbol=symbol,
+            message=f"规则触发: {rule['name']} {symbol} @ {ohlc}",
+        )
+        payload = {
+            "name": rule['name'],
+            "symbol": symbol,
+            "ohlc": ohlc,
+            "tag": rule['tag'],
+        }
+        return trigger, payload
+
+    def fire_rule(self, rule: dict, symbol: str, ohlc: dict):
+        # 规则触发：记录触发日志并调用 webhook
+        logger.info(f"规则触发: {rule['name']} {symbol} @ {ohlc}")
+        trigger, payload = self.make_trigger(rule, symbol, ohlc)
+        # 触发记录与 webhook + tag 异步同事务写入发件箱，投递完成前规则处于待定状态，不会重复触发
+        rule['_pending'] = True
+        self.trigger_writer.submit(trigger, rule['webhook_url'], payload, self.outbox.delay_for(rule['webhook_url']))
+
+    def _on_triggers_written(self, written: list, ok: bool):
+        # 写入线程回调：写入失败或没有 webhook 时不会有投递结果，转交到事件循环按投递结果处理
+        # （失败释放待定状态以便再次触发，没有 webhook 的写入成功即进入冷却）
+        if self._loop is None:
+            return
+        for _, trigger, url in written:
+            if not ok or not url:
+                self._loop.call_soon_threadsafe(self._on_delivery, trigger.rule_id, ok)
+
+    def _on_delivery(self, rule_id: int, ok: bool):
+        # 发件箱投递成功进入冷却，进入死信则允许再次触发
+        rule = self._rules_by_id.get(rule_id)
+        if rule is None:
+            return
+        rule['_pending'] = False
+        if ok:
+            self._start_cooldown(rule)
+
+    @staticmethod
+    def is_cooling(rule: dict) -> bool:
+        # 已触发（冷却中）或 webhook 投递中的规则不再重复触发
+        return rule.get("_invoked", False) or rule.get("_pending", False)
+
+    def should_fire(self, rule: dict, matched: bool) -> bool:
+        # level：成立且不在冷却中即触发；edge：由不成立变为成立且不在冷却中才触发
+        if rule["_mode"] == "edge":
+            rising = matched and not rule["_last"]
+            rule["_last"] = matched
+            return rising and not self.is_cooling(rule)
+        return matched and not self.is_cooling(rule)
+
+    def eval_rules_snapshot(self, rules: List[dict], symbol: str, ohlc: dict):
+        # 评估规则是否触发；调试日志延迟格式化，级别高于 DEBUG 时没有格式化开销
         for rule in rules:
-            if rule.get("_invoked", False):
+            if rule["_mode"] == "edge":
+                # 边沿触发冷却中也要求值，保持状态连续
+                if self.should_fire(rule, rule["_eval"](ohlc)):
+                    self.fire_rule(rule, symbol, ohlc)
+                continue
+            if self.is_cooling(rule):
                 # 规则在冷却周期内，跳过
-                logger.debug(f"规则冷却中，跳过: {rule['name']} {quote.symbol} @ {ohlc}")
+                logger.debug("规则冷却中，跳过: {} {} @ {}", rule['name'], symbol, ohlc)
                 continue
-            if eval_rule(rule["rule_json"], ohlc):
-                logger.info(f"规则触发: {rule['name']} {quote.symbol} @ {ohlc}")
-                trigger = Trigger(
-                    rule_id=rule['id'],
-                    symbol=quote.symbol,
-                    message=f"规则触发: {rule['name']} {quote.symbol} @ {ohlc}",
-                )
-                add_trigger(trigger)
-                # 这里可以添加调用 webhook + tag 的逻辑
-                try:
-                    payload = {
-                        "name": rule['name'],
-                        "symbol": quote.symbol,
-                        "ohlc": ohlc,
-                        "tag": rule['tag'],
-                    }
-                    headers = {'Content-Type': 'application/json'}
-                    response = requests.post(rule['webhook_url'], data=json.dumps(payload), headers=headers, timeout=5)
-                    if response.status_code == 200:
-                        logger.info(f"Webhook 调用成功: {rule['webhook_url']}")
-                        rule['_invoked'] = True  # 标记为已触发
-                    else:
-                        logger.error(f"Webhook 调用失败: {rule['webhook_url']} 状态码: {response.status_code}")
-                except Exception as e:
-                    logger.error(f"Webhook 调用异常: {e}")
+            if rule["_eval"](ohlc):
+                self.fire_rule(rule, symbol, ohlc)
             else:
-                logger.debug(f"规则未触发: {rule['name']} {quote.symbol} @ {ohlc}")
+                logger.debug("规则未触发: {} {} @ {}", rule['name'], symbol, ohlc)
+
+    def eval_rules_trigger(self, rules: List[dict], quote: QuoteOHLC):
+        self.eval_rules_snapshot(rules, quote.symbol, quote.model_dump())
 
+    def _source_filter(self, symbol: str) -> Callable[[dict], bool] | None:
+        """按行情来源过滤规则，只有汇聚层或分片求值且标的有限定券商的规则时才需要"""
+        if self._eval_source is None or symbol not in self._restricted:
+            return None
+        source = self._eval_source
+        primary = self._eval_primaries.get(symbol, source) if self._eval_primaries else source
+        def allowed(rule: dict) -> bool:
+            # 不限券商的规则只用主来源；限定券商的规则优先用主来源，主来源不在其中时用其限定的来源
+            brokers = rule["_brokers"]
+            if brokers is None:
+                return source == primary
+            return source in brokers and (source == primary or primary not in brokers)
+        return allowed
+
+    def _update_indicators(self, symbol: str, ohlc: dict):
+        # 非主来源补充求值的行情不记入指标历史
+        state = self._indicators.get(symbol)
+        if state is not None and not (self._eval_primaries and symbol in self._eval_primaries):
+            state.update(ohlc)
+
+    def eval_symbol(self, symbol: str, ohlc: dict):
+        # 复合规则全量求值，阈值规则只求值取值区间被跨越的部分
+        self._update_indicators(symbol, ohlc)
+        index = self._indexes[symbol]
+        allowed = self._source_filter(symbol)
+        self.eval_rules_snapshot(index.compound if allowed is None else list(filter(allowed, index.compound)), symbol, ohlc)
+        for rule in index.candidates(ohlc):
+            if allowed is not None and not allowed(rule):
+                # 来源不符，留待下一条行情继续参与
+                index.rearm(rule)
+                continue
+            matched = rule["_eval"](ohlc)
+            if self.should_fire(rule, matched):
+                self.fire_rule(rule, symbol, ohlc)
+            index.settle(rule, matched)
 
-    def check_rules(self, quotes: List[QuoteOHLC]):
-        # 检查每个行情数据是否触发对应规则
-        for quote in quotes:
-            if quote.symbol in self._symbols:
-                self.eval_rules_trigger(self._rules[quote.symbol], quote)
-                
\ No newline at end of file
+    def check_rules_batch(self, batch: QuoteBatch):
+        # 批量模式：一次向量化求值得到所有触发的 (规则, 标的)
+        for rule, i in self._vector_rules.evaluate(batch):
+            allowed = self._source_filter(batch.symbols[i])
+            if allowed is not None and not allowed(rule):
+                continue
+            if self.is_cooling(rule):
+                logger.debug("规则冷却中，跳过: {} {}", rule['name'], batch.symbols[i])
+                continue
+            self.fire_rule(rule, batch.symbols[i], batch.snapshot(i))
+
+        # 无法向量化的规则逐条求值
+        for symbol, rules in self._fallback_rules.items():
+            i = batch.index_of(symbol)
+            if i >= 0:
+                ohlc = batch.snapshot(i)
+                self._update_indicators(symbol, ohlc)
+                allowed = self._source_filter(symbol)
+                self.eval_rules_snapshot(rules if allowed is None else list(filter(allowed, rules)), symbol, ohlc)
+
+    def check_rules(self, quotes: QuoteBatch | List[QuoteOHLC], source: str | None = None, primaries: dict | None = None):
+        """source 为行情来源券商（汇聚层求值时给出），primaries 为非主来源补充求值时各标的的主来源"""
+        batch = quotes if isinstance(quotes, QuoteBatch) else QuoteBatch.from_quotes(quotes)
+        self._m_quotes.observe(len(batch))
+        if self.recorder is not None:
+            self.recorder.record(self.name, batch)
+        if self.hub is not None:
+            self.hub.publish(self.name, batch)
+            return
+        if self.shards is not None:
+            # 不经汇聚层时行情来源即本券商，分片加载全部规则，据此按 brokers 过滤
+            self.shards.dispatch(batch, source or self.broker, primaries)
+            return
+        started = time.perf_counter()
+        self._expire_cooldowns()
+        self._eval_source, self._eval_primaries = source, primaries
+        try:
+            if self._vector_rules is not None:
+                self.check_rules_batch(batch)
+            else:
+                # 检查每个行情数据是否触发对应规则
+                for ohlc in batch.snapshots():
+                    if ohlc["symbol"] in self._symbols:
+                        self.eval_symbol(ohlc["symbol"], ohlc)
+        finally:
+            self._eval_source, self._eval_primaries = None, None
+        if len(batch):
+            self._m_eval.observe((time.perf_counter() - started) / len(batch), len(batch))
@@ -0,0 +1,102 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-11 10:05:12
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-11 10:05:12
+FilePath: /mss_diting/app/diting/quote_batch.py
+Description: 列式行情批次
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import numpy as np
+import pandas as pd
+from typing import Iterable, Iterator, List
+
+from .models import QuoteOHLC
+
+
+# 批次中的行情字段，与 QuoteOHLC 保持一致
+QUOTE_FIELDS = ("open", "high", "low", "close", "pct_chg", "pct_amp", "volume")
+FIELD_DTYPES = {field: np.float64 for field in QUOTE_FIELDS}
+FIELD_DTYPES["volume"] = np.int64
+
+def safe_pct(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # numerator / denominator * 100 - 100，分母为 0 或缺失时记为 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    valid = (denominator != 0) & np.isfinite(denominator) & np.isfinite(numerator)
+    ratio = np.divide(numerator, denominator, out=np.ones_like(numerator), where=valid)
+    return ratio * 100 - 100
+
+# ----------------- 列式行情批次 -----------------
+class QuoteBatch:
+    """一次轮询的全部行情，每个字段一列 NumPy 数组"""
+    __slots__ = ("symbols", "columns", "_index")
+
+    def __init__(self, symbols: List[str], columns: dict[str, np.ndarray]):
+        self.symbols = symbols
+        self.columns = columns
+        self._index = None
+
+    @classmethod
+    def from_quotes(cls, quotes: List[QuoteOHLC]) -> "QuoteBatch":
+        symbols = [q.symbol for q in quotes]
+        columns = {field: np.fromiter((getattr(q, field) for q in quotes),
+                                      dtype=FIELD_DTYPES[field], count=len(quotes))
+                   for field in QUOTE_FIELDS}
+        return cls(symbols, columns)
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Iterable[dict]) -> "QuoteBatch":
+        snapshots = list(snapshots)
+        symbols = [ohlc["symbol"] for ohlc in snapshots]
+        columns = {field: np.fromiter((ohlc[field] for ohlc in snapshots),
+                                      dtype=FIELD_DTYPES[field], count=len(snapshots))
+                   for field in QUOTE_FIELDS}
+        return cls(symbols, columns)
+
+    @classmethod
+    def from_dataframe(cls, data: pd.DataFrame) -> "QuoteBatch":
+        """由 Futu get_stock_quote / 推送的 DataFrame 整列转换，不逐行构造对象"""
+        last = data["last_price"].to_numpy(dtype=np.float64)
+        high = data["high_price"].to_numpy(dtype=np.float64)
+        low = data["low_price"].to_numpy(dtype=np.float64)
+        columns = {
+            "open": data["open_price"].to_numpy(dtype=np.float64),
+            "high": high,
+            "low": low,
+            "close": last,
+            "pct_chg": safe_pct(last, data["prev_close_price"].to_numpy(dtype=np.float64)),
+            "pct_amp": safe_pct(high, low),
+            "volume": data["volume"].to_numpy(dtype=np.int64),
+        }
+        return cls(data["code"].tolist(), columns)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def index_of(self, symbol: str) -> int:
+        # 标的到行号的映射按需构建，不存在返回 -1
+        if self._index is None:
+            self._index = {s: i for i, s in enumerate(self.symbols)}
+        return self._index.get(symbol, -1)
+
+    def take(self, indices: np.ndarray) -> "QuoteBatch":
+        # 按行号取子批次，各列整列切片
+        return QuoteBatch([self.symbols[i] for i in indices],
+                          {field: column[indices] for field, column in self.columns.items()})
+
+    def snapshot(self, i: int) -> dict:
+        # 单行快照，格式与 QuoteOHLC.model_dump() 相同
+        ohlc = {"symbol": self.symbols[i]}
+        for field in QUOTE_FIELDS:
+            ohlc[field] = self.columns[field][i].item()
+        return ohlc
+
+    def snapshots(self) -> Iterator[dict]:
+        # 逐行快照，整列转换为 Python 列表后组装，比逐个取元素快
+        keys = ("symbol",) + QUOTE_FIELDS
+        columns = [self.columns[field].tolist() for field in QUOTE_FIELDS]
+        for values in zip(self.symbols, *columns):
+            yield dict(zip(keys, values))
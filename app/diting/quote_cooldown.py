@@ -0,0 +1,88 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-20 10:35:51
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-20 10:35:51
+FilePath: /mss_diting/app/diting/quote_cooldown.py
+Description: 规则冷却
+
+每条规则按自身冷却时长计时，到期时间存放在最小堆中（重复冷却的旧条目惰性丢弃），
+每次求值前只需查看堆顶；冷却与边沿状态定期快照到 SQLite，重启后恢复，避免重复触发。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import heapq
+from typing import Iterable, List
+
+from .db_sqlite import get_rule_states, save_rule_states
+
+
+# ----------------- 冷却管理 -----------------
+class CooldownManager:
+    def __init__(self, persist: bool = True):
+        self.persist = persist  # 回放等场景不读写数据库
+        self._heap = []         # (到期时间, 规则 id)
+        self._until = dict()    # 规则 id -> 到期时间，以此为准
+        self._last = dict()     # 启动时恢复的边沿状态，规则加载时取走
+        self._dirty = set()     # 冷却状态有变化、待快照的规则 id
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+    def is_cooling(self, rule_id: int) -> bool:
+        return rule_id in self._until
+
+    def restored_last(self, rule_id: int) -> bool:
+        return self._last.pop(rule_id, False)
+
+    def start(self, rule_id: int, duration: float, now: float) -> bool:
+        """开始冷却，时长为 0 时不冷却"""
+        if duration <= 0:
+            return False
+        until = now + duration
+        self._until[rule_id] = until
+        heapq.heappush(self._heap, (until, rule_id))
+        self._dirty.add(rule_id)
+        return True
+
+    def cancel(self, rule_id: int):
+        if self._until.pop(rule_id, None) is not None:
+            self._dirty.add(rule_id)
+
+    def expire(self, now: float) -> List[int]:
+        """弹出已到期的规则 id，未到期时只比较堆顶"""
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            until, rule_id = heapq.heappop(heap)
+            if self._until.get(rule_id) == until:
+                del self._until[rule_id]
+                self._dirty.add(rule_id)
+                expired.append(rule_id)
+        return expired
+
+    def restore(self, now: float):
+        """从快照恢复未到期的冷却与边沿状态"""
+        if not self.persist:
+            return
+        for row in get_rule_states():
+            until = row["cooldown_until"]
+            if until is not None and until > now:
+                self._until[row["rule_id"]] = until
+                heapq.heappush(self._heap, (until, row["rule_id"]))
+            if row["last_state"]:
+                self._last[row["rule_id"]] = True
+
+    def snapshot(self, rules: Iterable[dict]):
+        """写回冷却有变化的规则，以及全部边沿触发规则的当前状态"""
+        if not self.persist:
+            return
+        rows = []
+        for rule in rules:
+            rule_id = rule["id"]
+            if rule_id in self._dirty or rule["_mode"] == "edge":
+                rows.append((rule_id, self._until.get(rule_id), int(rule["_last"])))
+        self._dirty.clear()
+        if rows:
+            save_rule_states(rows)
@@ -0,0 +1,128 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-13 09:31:45
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-13 09:31:45
+FilePath: /mss_diting/app/diting/quote_dag.py
+Description: 规则公共子表达式去重
+
+同一标的下所有规则的条件节点做哈希合并（hash-consing），形成共享的 DAG，
+每个不同的条件在一次行情中只求值一次，结果按行情快照缓存。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import json
+from typing import Callable, List
+
+from .quote_rule import OPS, FIELD_ALIASES, has_indicator, compile_indicator_condition
+
+
+# ----------------- 规则 DAG -----------------
+class RuleDag:
+    def __init__(self):
+        self._keys = dict()     # 节点签名 -> 节点 id
+        self._nodes = []        # 节点 id -> 求值函数 (snapshot, memo) -> bool
+        self._snapshot = None   # 当前缓存对应的行情快照
+        self._memo = []
+        self.total = 0          # 未去重前的节点总数
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def _intern(self, key: tuple, build: Callable[[int], Callable]) -> int:
+        node = self._keys.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._keys[key] = node
+            self._nodes.append(build(node))
+        return node
+
+    def _add(self, rule: dict) -> int:
+        self.total += 1
+        # 含指标的条件节点，以规范化的 JSON 作为签名
+        if has_indicator(rule):
+            cond = compile_indicator_condition(rule)
+
+            def build(node: int):
+                def leaf(snapshot: dict, memo: list) -> bool:
+                    result = memo[node]
+                    if result is None:
+                        result = memo[node] = cond(snapshot)
+                    return result
+                return leaf
+            return self._intern(("indicator", json.dumps(rule, sort_keys=True)), build)
+
+        # 条件节点
+        if "field" in rule:
+            field = FIELD_ALIASES.get(rule["field"], rule["field"])
+            op_name, value = rule["op"], rule["value"]
+            op = OPS[op_name]
+
+            def build(node: int):
+                def leaf(snapshot: dict, memo: list) -> bool:
+                    result = memo[node]
+                    if result is None:
+                        result = memo[node] = op(snapshot[field], value)
+                    return result
+                return leaf
+            return self._intern(("field", field, op_name, type(value), value), build)
+
+        # 逻辑节点
+        logic = rule["logic"].upper()
+        children = [self._add(cond) for cond in rule.get("conditions", [])]
+        if logic == "NOT":
+            if len(children) != 1:
+                raise ValueError("NOT must have exactly one condition")
+        elif logic in ("AND", "OR"):
+            # AND/OR 与子节点顺序、重复无关，规范化后可合并更多节点
+            children = sorted(set(children))
+        else:
+            raise ValueError(f"Invalid logic: {logic}")
+        funcs = tuple(self._nodes[child] for child in children)
+
+        def build(node: int):
+            if logic == "NOT":
+                inner = funcs[0]
+                def _not(snapshot: dict, memo: list) -> bool:
+                    result = memo[node]
+                    if result is None:
+                        result = memo[node] = not inner(snapshot, memo)
+                    return result
+                return _not
+
+            expect = logic == "OR"  # 短路的取值：OR 遇真即真，AND 遇假即假
+            def _logic(snapshot: dict, memo: list) -> bool:
+                result = memo[node]
+                if result is None:
+                    result = not expect
+                    for func in funcs:
+                        if func(snapshot, memo) == expect:
+                            result = expect
+                            break
+                    memo[node] = result
+                return result
+            return _logic
+        return self._intern((logic, tuple(children)), build)
+
+    def add(self, rule: dict) -> Callable[[dict], bool]:
+        """将规则并入 DAG，返回该规则的求值函数"""
+        func = self._nodes[self._add(rule)]
+
+        def evaluate(snapshot: dict) -> bool:
+            # 新的行情快照到达时清空缓存
+            if snapshot is not self._snapshot:
+                self._snapshot = snapshot
+                self._memo = [None] * len(self._nodes)
+            return func(snapshot, self._memo)
+        return evaluate
+
+
+def merge_dag_stats(dags: List[RuleDag]) -> dict:
+    total = sum(dag.total for dag in dags)
+    distinct = sum(len(dag) for dag in dags)
+    return {
+        "nodes_total": total,
+        "nodes_distinct": distinct,
+        "dedup_ratio": round(1 - distinct / total, 4) if total else 0.0,
+    }
@@ -9,16 +9,20 @@ Description: Futu行情引擎
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
 
-import asyncio, os
+import asyncio, os, time, threading
+from itertools import islice
 import pandas as pd
 from pathlib import Path
 from loguru import logger
 from dotenv import load_dotenv
-from futu import OpenQuoteContext, SubType, MarketState
+from futu import OpenQuoteContext, SubType, MarketState, StockQuoteHandlerBase, RET_OK
 
 from .quote_base import BaseQuoteEngine
 from .db_sqlite import get_rules
-from .models import QuoteOHLC
+from .quote_batch import QuoteBatch
+from .webhook import TokenBucket
+from .market_calendar import MarketCalendar, MarketStateCache, group_by_market, market_of
+from .metrics import QUOTE_FETCH_SECONDS
 
 
 # 加载环境变量
@@ -27,43 +31,271 @@ load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
 FUTU_API_HOST = os.getenv("FUTU_API_HOST", "127.0.0.1")
 FUTU_API_PORT = int(os.getenv("FUTU_API_PORT", "21111"))
 QUOTE_INTERVAL = int(os.getenv("QUOTE_INTERVAL", "60"))  # 行情轮询间隔，单位秒
+FUTU_PUSH = os.getenv("FUTU_PUSH", "1") == "1"  # 是否启用实时推送，轮询作为兜底
+MARKET_MAX_SLEEP = int(os.getenv("MARKET_MAX_SLEEP", "1800"))  # 休市期间单次最长休眠，单位秒
+FUTU_SUB_CHUNK = int(os.getenv("FUTU_SUB_CHUNK", "100"))  # 单次订阅/退订的标的数
+FUTU_QUOTE_CHUNK = int(os.getenv("FUTU_QUOTE_CHUNK", "200"))  # 单次拉取行情的标的数，快照接口上限400
+FUTU_REQ_RATE = float(os.getenv("FUTU_REQ_RATE", "2"))  # 每秒请求数，快照接口限频为30秒60次
+FUTU_REQ_BURST = int(os.getenv("FUTU_REQ_BURST", "10"))  # 请求突发上限
+FUTU_SUB_QUOTA = int(os.getenv("FUTU_SUB_QUOTA", "0"))  # 本引擎可用的订阅额度上限，0 表示以服务端剩余额度为准
+FUTU_UNSUB_DELAY = int(os.getenv("FUTU_UNSUB_DELAY", "60"))  # 订阅满该秒数后才能退订（Futu 限制）
+FUTU_ROTATE_SIZE = int(os.getenv("FUTU_ROTATE_SIZE", "400"))  # 超出订阅额度的标的每轮轮转拉取的数量
+
+def chunked(items: list, size: int):
+    it = iter(items)
+    while chunk := list(islice(it, max(size, 1))):
+        yield chunk
+
+# ----------------- 实时报价推送 -----------------
+class FutuQuoteHandler(StockQuoteHandlerBase):
+    def __init__(self, engine: "FutuEngine"):
+        super().__init__()
+        self._engine = engine
+
+    def on_recv_rsp(self, rsp_pb):
+        # 注意：该回调在 Futu 的独立子线程中
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret != RET_OK:
+            logger.error(f"[{self._engine.name}] 实时报价推送异常: {data}")
+            return ret, data
+        self._engine.on_quote_push(data)
+        return RET_OK, data
+
+
+# ----------------- 额度与限频调度 -----------------
+class FutuScheduler:
+    """订阅额度与请求频率调度：分批订阅、限频拉取、超额标的跨周期轮转"""
+    def __init__(self, name: str):
+        self.name = name
+        self._bucket = TokenBucket(FUTU_REQ_RATE, FUTU_REQ_BURST)
+        self._subscribed = dict()  # 标的 -> 订阅时间
+        self._overflow = list()  # 超出订阅额度、改用快照轮转拉取的标的
+        self._cursor = 0
+        self._remain = None  # 服务端剩余订阅额度
+        self._dirty = True
+        self._lock = asyncio.Lock()  # 规则变更触发的即时同步与轮询周期内的同步不能交错
+        self._stats = {"requests": 0, "failed": 0, "refreshed": 0, "requested": 0}
+        self._m_fetch = QUOTE_FETCH_SECONDS.labels(name)
+
+    def reset(self):
+        self._subscribed.clear()
+        self._overflow = list()
+        self._cursor = 0
+        self._remain = None
+        self._dirty = True
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def _refresh_quota(self, ctx: OpenQuoteContext):
+        ret, data = ctx.query_subscription(is_all_conn=True)
+        if ret == RET_OK and isinstance(data, dict):
+            self._remain = int(data.get("remain", 0))
+        else:
+            logger.warning(f"[{self.name}] 查询订阅额度失败: {data}")
+
+    async def _call(self, fn, *args, metric=None):
+        await self._bucket.acquire()
+        self._stats["requests"] += 1
+        started = time.perf_counter()
+        ret, data = fn(*args)
+        if metric is not None:
+            metric.observe(time.perf_counter() - started)
+        if ret != RET_OK:
+            self._stats["failed"] += 1
+        return ret, data
+
+    async def sync(self, ctx: OpenQuoteContext, wanted: set):
+        """使订阅集合与规则标的保持一致，额度不足的标的转入轮转"""
+        async with self._lock:
+            if self._dirty:
+                self._dirty = False
+                await self._sync(ctx, wanted)
+
+    async def _sync(self, ctx: OpenQuoteContext, wanted: set):
+        now = time.monotonic()
+
+        # 不再被规则使用的标的：订阅满最短时长后退订，否则留待下个周期
+        stale = [s for s in self._subscribed if s not in wanted]
+        ready = [s for s in stale if now - self._subscribed[s] >= FUTU_UNSUB_DELAY]
+        if len(ready) < len(stale):
+            self._dirty = True
+        for chunk in chunked(ready, FUTU_SUB_CHUNK):
+            ret, err = await self._call(ctx.unsubscribe, chunk, [SubType.QUOTE])
+            if ret == RET_OK:
+                for s in chunk:
+                    self._subscribed.pop(s, None)
+                logger.info(f"[{self.name}] 退订标的 {chunk}")
+            else:
+                self._dirty = True
+                logger.warning(f"[{self.name}] 退订异常: {err}")
+
+        # 在剩余额度内分批订阅新增标的
+        pending = sorted(s for s in wanted if s not in self._subscribed)
+        if pending:
+            self._refresh_quota(ctx)
+            budget = len(pending) if self._remain is None else self._remain
+            if FUTU_SUB_QUOTA > 0:
+                budget = min(budget, FUTU_SUB_QUOTA - len(self._subscribed))
+            for chunk in chunked(pending[:max(budget, 0)], FUTU_SUB_CHUNK):
+                ret, err = await self._call(ctx.subscribe, chunk, [SubType.QUOTE])
+                if ret != RET_OK:
+                    logger.error(f"[{self.name}] 实时订阅异常: {err}")
+                    break
+                stamp = time.monotonic()
+                for s in chunk:
+                    self._subscribed[s] = stamp
+                logger.info(f"[{self.name}] 实时订阅标的 {chunk}")
+
+        overflow = sorted(s for s in wanted if s not in self._subscribed)
+        if overflow and overflow != self._overflow:
+            logger.warning(f"[{self.name}] 订阅额度不足，{len(overflow)} 个标的改为轮转拉取快照")
+        self._overflow = overflow
+        self._cursor = self._cursor % len(overflow) if overflow else 0
+
+    def rotation(self, candidates: set) -> list:
+        """本周期轮转拉取的超额标的，游标跨周期前进"""
+        window = [s for s in self._overflow if s in candidates]
+        if len(window) <= FUTU_ROTATE_SIZE:
+            return window
+        start = self._cursor % len(window)
+        picked = (window[start:] + window[:start])[:FUTU_ROTATE_SIZE]
+        self._cursor = start + FUTU_ROTATE_SIZE
+        return picked
+
+    async def fetch(self, ctx: OpenQuoteContext, symbols: list):
+        """分批限频拉取行情：已订阅标的走报价接口，其余走快照接口"""
+        subscribed = [s for s in symbols if s in self._subscribed]
+        snapshot = self.rotation(set(symbols))
+        self._stats["requested"] = len(subscribed) + len(snapshot)
+        self._stats["refreshed"] = 0
+        for fn, codes in ((ctx.get_stock_quote, subscribed), (ctx.get_market_snapshot, snapshot)):
+            for chunk in chunked(codes, FUTU_QUOTE_CHUNK):
+                ret, data = await self._call(fn, chunk, metric=self._m_fetch)
+                if ret == RET_OK and isinstance(data, pd.DataFrame) and not data.empty:
+                    self._stats["refreshed"] += len(data)
+                    yield data
+                else:
+                    logger.error(f"[{self.name}] 拉取行情失败: {data}")
+
+    def status(self) -> dict:
+        return {
+            "subscribed": len(self._subscribed),
+            "overflow": len(self._overflow),
+            "quota_remain": self._remain,
+            **self._stats,
+        }
+
 
 class FutuEngine(BaseQuoteEngine):
     def __init__(self):
         super().__init__("FUTU")
         self._symbols = set()
         self._ctx = None
-    
-    def _subscribe(self):
-        if self._symbols and self._ctx:
-            sub_list = list(self._symbols)
-            ret, err = self._ctx.subscribe(sub_list, [SubType.QUOTE])
-            if ret == 0:
-                logger.info(f"[{self.name}] 实时订阅标的 {sub_list}")
-            else:
-                logger.error(f"[{self.name}] 实时订阅异常: {err}")
-        else:
-            logger.warning(f"[{self.name}] 没有标的可供订阅")
-    
+        self._push_lock = threading.Lock()
+        self._push_latest = dict()  # 待求值的推送行情，每个标的只保留最新一条
+        self._push_scheduled = False  # 是否已安排求值
+        self._push_seen = dict()  # 标的 -> 最近一次收到推送的时间
+        self._calendar = MarketCalendar()
+        self._market_states = MarketStateCache()
+        self._symbols_changed: asyncio.Event | None = None  # 休市休眠期间标的变化时提前唤醒
+        self._scheduler = FutuScheduler(self.name)
+        self._sync_task: asyncio.Task | None = None
+
+    def _on_symbols_changed(self, added: set, removed: set):
+        # 规则变更导致标的增减时立即调整订阅；未完成的部分（如未满最短订阅时长）由轮询周期兜底
+        self._scheduler.mark_dirty()
+        if self._symbols_changed is not None:
+            self._symbols_changed.set()
+        if self._running and self._ctx is not None:
+            self._sync_task = self._loop.create_task(self._sync_subscriptions())
+
+    async def _sync_subscriptions(self):
+        try:
+            await self._scheduler.sync(self._ctx, self._symbols)
+        except Exception as e:
+            logger.warning(f"[{self.name}] 订阅调整异常: {e}")
+
     def start(self, loop: asyncio.AbstractEventLoop):
         if self._running:
             logger.warning(f"[{self.name}] 已经在运行")
             return
         super().start(loop)
         self._ctx = OpenQuoteContext(host=FUTU_API_HOST, port=FUTU_API_PORT)
+        if FUTU_PUSH:
+            self._ctx.set_handler(FutuQuoteHandler(self))
+        self._scheduler.reset()
         logger.info(f"[{self.name}] Loaded {self._symbols} from rules")
-        self._subscribe()
 
     def stop(self):
         if not self._running:
             logger.warning(f"[{self.name}] 未运行")
             return
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
         if self._ctx:
             self._ctx.close()
             self._ctx = None
         super().stop()
         logger.info(f"[{self.name}] 停止运行")
 
+    def status(self) -> dict:
+        status = super().status()
+        status["scheduler"] = self._scheduler.status()
+        return status
+
+    def _is_trading(self, market: str) -> bool:
+        # 推送线程内不查询市场状态：交易日历开市且缓存的市场状态未确认休市即可
+        return self._calendar.is_open(market) and self._market_states.get(market) is not False
+
+    def on_quote_push(self, data: pd.DataFrame):
+        """Futu 推送线程回调：与轮询相同只求值交易时段内的行情，每个标的只保留最新一条，交给引擎事件循环求值"""
+        if not self._running or self._loop is None:
+            return
+        try:
+            snapshots = list(QuoteBatch.from_dataframe(data).snapshots())
+        except Exception as e:
+            logger.warning(f"[{self.name}] 推送行情转换异常: {e}")
+            return
+        trading = dict()
+        for ohlc in snapshots:
+            market = market_of(ohlc["symbol"])
+            if market not in trading:
+                trading[market] = self._is_trading(market)
+        snapshots = [ohlc for ohlc in snapshots if trading[market_of(ohlc["symbol"])]]
+        if not snapshots:
+            return
+        now = time.monotonic()
+        with self._push_lock:
+            for ohlc in snapshots:
+                self._push_latest[ohlc["symbol"]] = ohlc
+                self._push_seen[ohlc["symbol"]] = now
+            if self._push_scheduled:
+                # 上一批尚未处理，新行情已合并进去
+                return
+            self._push_scheduled = True
+        self._loop.call_soon_threadsafe(self._drain_push)
+
+    def _drain_push(self):
+        with self._push_lock:
+            latest, self._push_latest = self._push_latest, dict()
+            self._push_scheduled = False
+        if latest:
+            try:
+                self.check_rules(QuoteBatch.from_snapshots(latest.values()))
+            except Exception as e:
+                logger.warning(f"[{self.name}] 推送行情处理异常: {e}")
+
+    async def _sleep_until_changed(self, seconds: float):
+        if self._symbols_changed is None:
+            self._symbols_changed = asyncio.Event()
+        self._symbols_changed.clear()
+        try:
+            await asyncio.wait_for(self._symbols_changed.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
     async def loop(self):
         # 动态加载规则对应的股票列表并进行订阅
         if not self._symbols:
@@ -75,36 +307,42 @@ class FutuEngine(BaseQuoteEngine):
             logger.error(f"[{self.name}] 行情上下文未初始化")
             await asyncio.sleep(QUOTE_INTERVAL*2)
             return
-        
-        # 检查是否是开市时间
-        symbols = []
-        ret, market_status = self._ctx.get_market_state(list(self._symbols))
-        if ret == 0 and isinstance(market_status, pd.DataFrame) and not market_status.empty:
-            # 获取所有股票的市场状态
-            for _, row in market_status.iterrows():
-                if row['market_state'] == MarketState.MORNING or row['market_state'] == MarketState.AFTERNOON:
-                    symbols.append(row['code'])
+
+        # 订阅与规则标的对齐（分批、限频、受额度约束）
+        await self._scheduler.sync(self._ctx, self._symbols)
+
+        # 按交易日历筛选开市的市场，全部休市时休眠到最近一次开盘
+        markets = group_by_market(self._symbols)
+        open_markets = [m for m in markets if self._calendar.is_open(m)]
+        if not open_markets:
+            wait = min(max(self._calendar.seconds_until_open(markets.keys()), QUOTE_INTERVAL), MARKET_MAX_SLEEP)
+            logger.info(f"[{self.name}] 当前非交易时间 {list(markets)}，休眠 {wait:.0f} 秒")
+            await self._sleep_until_changed(wait)
+            return
+
+        # 市场状态按市场缓存，每个市场只查询一个标的（节假日、临时休市以此为准）
+        unknown = [m for m in open_markets if self._market_states.get(m) is None]
+        if unknown:
+            ret, market_status = self._ctx.get_market_state([markets[m][0] for m in unknown])
+            if ret == 0 and isinstance(market_status, pd.DataFrame) and not market_status.empty:
+                for code, state in zip(market_status['code'], market_status['market_state']):
+                    self._market_states.set(market_of(code), state in (MarketState.MORNING, MarketState.AFTERNOON))
+            else:
+                logger.error(f"[{self.name}] 查询市场状态失败: {market_status}")
+        symbols = [s for m in open_markets if self._market_states.get(m) for s in markets[m]]
         if not symbols:
             logger.warning(f"[{self.name}] 当前非交易时间 {self._symbols}")
-            await asyncio.sleep(QUOTE_INTERVAL*2)
+            await self._sleep_until_changed(QUOTE_INTERVAL*2)
             return
 
-        ret, data = self._ctx.get_stock_quote(symbols)
-        if ret == 0 and isinstance(data, pd.DataFrame) and not data.empty:
-            logger.debug(f"[{self.name}] 拉取行情 {len(data)} 条")
+        # 最近一个轮询周期内收到过推送的标的无需再轮询（仅已订阅标的会有推送）
+        if FUTU_PUSH:
+            now = time.monotonic()
+            symbols = [s for s in symbols if now - self._push_seen.get(s, 0) > QUOTE_INTERVAL]
+            if not symbols:
+                logger.debug(f"[{self.name}] 全部标的均有实时推送，跳过轮询")
+                return
 
-            quotes = []
-            for _, row in data.iterrows():
-                quotes.append(QuoteOHLC(
-                    symbol=row['code'],
-                    open=row['open_price'],
-                    high=row['high_price'],
-                    low=row['low_price'],
-                    close=row['last_price'],
-                    pct_chg=row['last_price'] / row['prev_close_price'] * 100 - 100,
-                    pct_amp=row['high_price'] / row['low_price'] * 100 - 100,
-                    volume=int(row['volume'])
-                ))
-            self.check_rules(quotes)
-        else:
-            logger.error(f"[{self.name}] 拉取行情失败: {data}")
+        async for data in self._scheduler.fetch(self._ctx, symbols):
+            logger.debug(f"[{self.name}] 拉取行情 {len(data)} 条")
+            self.check_rules(QuoteBatch.from_dataframe(data))
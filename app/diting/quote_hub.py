@@ -0,0 +1,162 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-21 14:18:27
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-21 14:18:27
+FilePath: /mss_diting/app/diting/quote_hub.py
+Description: 多券商行情汇聚
+
+各券商引擎只负责拉取 brokers 中包含自己的规则所需的标的，行情统一发布到汇聚层；
+汇聚层按标的维护最新行情，内容相同的重复行情直接丢弃，每个标的只采用一个主来源，
+主来源过期时切换，并按谁先送达新行情定期改选最快的来源；规则在汇聚层只求值一次。
+限定了 brokers 的规则只用其限定来源的行情：主来源在其中时用主来源，否则用其限定来源的行情补充求值。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, time
+import numpy as np
+from pathlib import Path
+from loguru import logger
+from dotenv import load_dotenv
+
+from .quote_base import BaseQuoteEngine, QUOTE_INTERVAL
+from .quote_batch import QuoteBatch
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+HUB_STALE = float(os.getenv("HUB_STALE", str(QUOTE_INTERVAL * 2)))  # 来源超过该秒数没有行情视为过期
+HUB_DEDUP_DEPTH = int(os.getenv("HUB_DEDUP_DEPTH", "8"))  # 每个标的保留的最近行情指纹数
+HUB_ELECT_EVERY = int(os.getenv("HUB_ELECT_EVERY", "20"))  # 每累计多少次先后比较改选一次主来源
+
+# 行情指纹使用的字段
+FINGERPRINT_FIELDS = ("open", "high", "low", "close", "volume")
+
+def _remember(table: dict, key, value):
+    table[key] = value
+    if len(table) > HUB_DEDUP_DEPTH:
+        del table[next(iter(table))]
+
+# ----------------- 单标的来源状态 -----------------
+class _Feed:
+    __slots__ = ("primary", "seen", "recent", "held", "wins", "updated")
+
+    def __init__(self):
+        self.primary = None     # 主来源
+        self.seen = dict()      # 来源 -> 最近一次收到行情的时间
+        self.recent = dict()    # 已采用的行情指纹 -> (最先送达的来源, 已送达的来源)
+        self.held = dict()      # 非主来源先送达、尚未采用的行情指纹 -> 来源
+        self.wins = dict()      # 来源 -> 先于其他来源送达的次数
+        self.updated = 0.0      # 最近一次采用行情的时间
+
+    def credit(self, source: str):
+        self.wins[source] = self.wins.get(source, 0) + 1
+        if sum(self.wins.values()) >= HUB_ELECT_EVERY:
+            now = time.monotonic()
+            fresh = {s: n for s, n in self.wins.items() if now - self.seen.get(s, 0) <= HUB_STALE}
+            if fresh:
+                self.primary = max(fresh, key=fresh.get)
+            self.wins.clear()
+
+# ----------------- 汇聚层 -----------------
+class QuoteHub(BaseQuoteEngine):
+    def __init__(self):
+        super().__init__("HUB")
+        self.broker = None  # 汇聚层加载全部规则
+        self._feeds = dict()  # 标的 -> _Feed
+        self._sources = dict()  # 来源 -> {published, accepted, duplicate, held, fallback, last}
+        self._stale_count = 0  # 上次检查时的过期标的数，只在增加时告警
+
+    def _needs_fallback(self, symbol: str, source: str, primary: str) -> bool:
+        # 标的有限定了该来源、却不包含主来源的规则时，非主来源的行情也要求值
+        return any(source in brokers and primary not in brokers for brokers in self._restricted.get(symbol, ()))
+
+    async def loop(self):
+        # 行情由各券商引擎发布，这里只做过期检查
+        stale = self.stale_symbols()
+        if len(stale) > self._stale_count:
+            logger.warning(f"[{self.name}] {len(stale)} 个标的行情过期: {stale[:10]}")
+        self._stale_count = len(stale)
+
+    def _source(self, source: str) -> dict:
+        stats = self._sources.get(source)
+        if stats is None:
+            stats = self._sources[source] = {"published": 0, "accepted": 0, "duplicate": 0, "held": 0, "fallback": 0, "last": 0.0}
+        return stats
+
+    def publish(self, source: str, batch: QuoteBatch):
+        """券商引擎发布一批行情，仲裁后只对采用的行情求值"""
+        now = time.monotonic()
+        stats = self._source(source)
+        stats["published"] += len(batch)
+        stats["last"] = now
+        columns = [batch.columns[field].tolist() for field in FINGERPRINT_FIELDS]
+        broker = source.lower()
+        accepted, fallback = [], dict()
+        for i, (symbol, *values) in enumerate(zip(batch.symbols, *columns)):
+            feed = self._feeds.get(symbol)
+            if feed is None:
+                feed = self._feeds[symbol] = _Feed()
+            feed.seen[source] = now
+            fp = tuple(values)
+
+            known = feed.recent.get(fp)
+            if known is not None and source not in known[1]:
+                # 其他来源已送达相同行情；同一来源重复送达视为新一轮行情，照常求值
+                stats["duplicate"] += 1
+                known[1].add(source)
+                feed.credit(known[0])
+                continue
+
+            primary = feed.primary
+            if primary is None or primary == source or now - feed.seen.get(primary, 0) > HUB_STALE:
+                if primary is not None and primary != source:
+                    logger.warning(f"[{self.name}] {symbol} 主来源 {primary} 过期，切换到 {source}")
+                feed.primary = source
+                leader = feed.held.pop(fp, None)
+                if leader is not None and leader != source:
+                    feed.credit(leader)
+                if known is None:
+                    _remember(feed.recent, fp, (leader or source, {source, leader or source}))
+                feed.updated = now
+                accepted.append(i)
+            else:
+                # 非主来源的新行情暂不采用，记录先后用于改选
+                stats["held"] += 1
+                _remember(feed.held, fp, source)
+                if self._needs_fallback(symbol, broker, primary.lower()):
+                    fallback[i] = primary.lower()
+
+        stats["accepted"] += len(accepted)
+        if len(accepted) == len(batch):
+            self.check_rules(batch, broker)
+        elif accepted:
+            self.check_rules(batch.take(np.array(accepted, dtype=np.int64)), broker)
+        if fallback:
+            stats["fallback"] += len(fallback)
+            self.check_rules(batch.take(np.array(list(fallback), dtype=np.int64)), broker,
+                             {batch.symbols[i]: primary for i, primary in fallback.items()})
+
+    def stale_symbols(self) -> list:
+        now = time.monotonic()
+        return [s for s in self._symbols
+                if (feed := self._feeds.get(s)) is not None and now - feed.updated > HUB_STALE]
+
+    def status(self) -> dict:
+        status = super().status()
+        now = time.monotonic()
+        primaries = dict()
+        for feed in self._feeds.values():
+            if feed.primary is not None:
+                primaries[feed.primary] = primaries.get(feed.primary, 0) + 1
+        status["sources"] = {
+            source: {**{k: v for k, v in stats.items() if k != "last"},
+                     "age": round(now - stats["last"], 3),
+                     "primary_of": primaries.get(source, 0)}
+            for source, stats in self._sources.items()
+        }
+        stale = self.stale_symbols()
+        status["stale"] = {"count": len(stale), "symbols": stale[:20]}
+        return status
@@ -0,0 +1,136 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-12 14:22:08
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-12 14:22:08
+FilePath: /mss_diting/app/diting/quote_index.py
+Description: 阈值区间索引
+
+单字段阈值规则（如 close > 320）按字段、运算符排序存放阈值，
+新行情到达时只二分查找本次取值跨越的区间，结果不可能变化的规则直接跳过。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List
+
+from .quote_rule import FIELD_ALIASES
+
+
+RANGE_OPS = {">", ">=", "<", "<="}
+POINT_OPS = {"=", "!="}
+
+# ----------------- 单字段索引 -----------------
+class _FieldIndex:
+    def __init__(self):
+        self._ranges = dict()   # op -> (有序阈值列表, 对应规则列表)
+        self._points = dict()   # op -> {阈值: [规则]}
+        self._prev = None       # 上一次的字段取值
+
+    def add(self, op: str, value: float, rule: dict):
+        if op in RANGE_OPS:
+            thresholds, rules = self._ranges.setdefault(op, ([], []))
+            i = bisect_right(thresholds, value)
+            thresholds.insert(i, value)
+            rules.insert(i, rule)
+        else:
+            self._points.setdefault(op, dict()).setdefault(value, []).append(rule)
+
+    def reset(self):
+        self._prev = None
+
+    def _satisfied(self, value: float) -> Iterable[dict]:
+        # 没有上一次取值时，返回当前取值下成立的全部规则
+        for op, (thresholds, rules) in self._ranges.items():
+            if op == ">":
+                yield from rules[:bisect_left(thresholds, value)]
+            elif op == ">=":
+                yield from rules[:bisect_right(thresholds, value)]
+            elif op == "<":
+                yield from rules[bisect_right(thresholds, value):]
+            else:
+                yield from rules[bisect_left(thresholds, value):]
+        for op, table in self._points.items():
+            if op == "=":
+                yield from table.get(value, ())
+            else:
+                for threshold, rules in table.items():
+                    if threshold != value:
+                        yield from rules
+
+    def _all(self) -> Iterable[dict]:
+        for _, rules in self._ranges.values():
+            yield from rules
+        for table in self._points.values():
+            for rules in table.values():
+                yield from rules
+
+    def crossed(self, value: float) -> Iterable[dict]:
+        """返回取值从上一次变化到 value 时，结果可能发生变化的规则"""
+        prev, self._prev = self._prev, value
+        if value != value:
+            # NaN 无法比较大小，全部交给求值决定
+            self._prev = None
+            return self._all()
+        if prev is None:
+            return self._satisfied(value)
+        if prev == value:
+            return ()
+
+        lo, hi = (prev, value) if prev < value else (value, prev)
+        result = []
+        for thresholds, rules in self._ranges.values():
+            result.extend(rules[bisect_left(thresholds, lo):bisect_right(thresholds, hi)])
+        for table in self._points.values():
+            result.extend(table.get(prev, ()))
+            result.extend(table.get(value, ()))
+        return result
+
+
+# ----------------- 单标的阈值索引 -----------------
+class ThresholdIndex:
+    def __init__(self, rules: List[dict]):
+        self.compound = []      # 复合规则，每次全量求值
+        self._fields = dict()   # field -> _FieldIndex
+        self._active = dict()   # 上次求值成立但尚未完成触发的规则 id -> 规则
+        self.size = 0           # 纳入索引的阈值规则数量
+
+        for rule in rules:
+            # 边沿触发依赖每次的求值结果，不能跳过，归入复合规则
+            if rule.get("_mode", "level") == "level" and self.is_threshold(rule["rule_json"]):
+                node = rule["rule_json"]
+                field = FIELD_ALIASES.get(node["field"], node["field"])
+                self._fields.setdefault(field, _FieldIndex()).add(node["op"], node["value"], rule)
+                self.size += 1
+            else:
+                self.compound.append(rule)
+
+    @staticmethod
+    def is_threshold(node: dict) -> bool:
+        # 指标条件依赖历史，取值跨越区间不能由当前快照判断，归入复合规则
+        return "field" in node and isinstance(node["field"], str) and isinstance(node["value"], (int, float))
+
+    def reset(self):
+        """丢弃历史取值，下次求值按当前取值重新找出全部成立的规则"""
+        self._active.clear()
+        for index in self._fields.values():
+            index.reset()
+
+    def rearm(self, rule: dict):
+        """冷却结束等场景，让规则在下次求值时重新参与"""
+        self._active[rule["id"]] = rule
+
+    def candidates(self, ohlc: dict) -> List[dict]:
+        result = dict(self._active)
+        for field, index in self._fields.items():
+            for rule in index.crossed(ohlc[field]):
+                result[rule["id"]] = rule
+        return list(result.values())
+
+    def settle(self, rule: dict, matched: bool):
+        # 成立但尚未完成触发（如 webhook 失败）的规则下次继续参与求值
+        if matched and not rule.get("_invoked", False):
+            self._active[rule["id"]] = rule
+        else:
+            self._active.pop(rule["id"], None)
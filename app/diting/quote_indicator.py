@@ -0,0 +1,104 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-16 10:12:36
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-16 10:12:36
+FilePath: /mss_diting/app/diting/quote_indicator.py
+Description: 逐标的指标状态
+
+每个标的、每个字段一个定长 NumPy 环形缓冲区，长度统一取所有指标的最大窗口，
+规则变更重建时各字段的历史等长，可完整重放；
+sma 维护滚动和、ema 维护当前值、roc 直接读取 N 笔之前的取值，每笔行情 O(1) 更新。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import numpy as np
+from typing import Iterable
+
+
+# ----------------- 单标的指标 -----------------
+class SymbolIndicators:
+    def __init__(self, specs: Iterable[tuple[str, str, int]], previous: "SymbolIndicators | None" = None):
+        self.specs = frozenset(specs)
+        # 各字段缓冲区等长，重建时不会因某个字段窗口较短而截断其他字段的历史
+        size = max((window for _, _, window in self.specs), default=1)
+        self._buffers = {field: np.zeros(size, dtype=np.float64) for _, field, _ in self.specs}
+        self._count = 0  # 已写入的行情笔数
+        self._resync_every = size
+
+        # (合成字段名, 字段, 窗口) 及对应的增量状态
+        self._sma = [(f"sma({f},{w})", f, w) for name, f, w in sorted(self.specs) if name == "sma"]
+        self._sums = [0.0] * len(self._sma)
+        self._ema = [(f"ema({f},{w})", f, w, 2 / (w + 1)) for name, f, w in sorted(self.specs) if name == "ema"]
+        self._emas = [0.0] * len(self._ema)
+        self._roc = [(f"roc({f},{w})", f, w) for name, f, w in sorted(self.specs) if name == "roc"]
+
+        if previous is not None:
+            self._replay(previous)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def history(self, field: str) -> np.ndarray:
+        """按时间顺序返回字段的已缓存取值"""
+        buf = self._buffers.get(field)
+        if buf is None:
+            return np.empty(0, dtype=np.float64)
+        size = len(buf)
+        n = min(self._count, size)
+        start = (self._count - n) % size
+        return np.roll(buf, -start)[:n]
+
+    def _replay(self, previous: "SymbolIndicators"):
+        # 规则变更后沿用旧缓冲区中的历史，只重放所有字段都具备的部分
+        history = {field: previous.history(field) for field in self._buffers}
+        n = min((len(values) for values in history.values()), default=0)
+        for i in range(n):
+            self.update({field: values[len(values) - n + i] for field, values in history.items()})
+
+    def _resync(self):
+        # 周期性按缓冲区重算滚动和，消除浮点累积误差，摊销后仍为 O(1)
+        for i, (_, field, window) in enumerate(self._sma):
+            buf = self._buffers[field]
+            idx = (self._count - 1 - np.arange(min(window, self._count))) % len(buf)
+            self._sums[i] = float(buf[idx].sum())
+
+    def update(self, ohlc: dict):
+        """写入一笔行情，并把已就绪的指标值写回快照"""
+        count = self._count
+        values = {field: float(ohlc[field]) for field in self._buffers}
+
+        # 先读取即将被覆盖或窗口外的旧值，再写入新值
+        for i, (key, field, window) in enumerate(self._sma):
+            buf = self._buffers[field]
+            x = values[field]
+            if count >= window:
+                self._sums[i] += x - float(buf[(count - window) % len(buf)])
+            else:
+                self._sums[i] += x
+        rocs = list()
+        for key, field, window in self._roc:
+            if count >= window:
+                prev = float(self._buffers[field][(count - window) % len(self._buffers[field])])
+                rocs.append((key, (values[field] / prev * 100 - 100) if prev else 0.0))
+        for i, (key, field, window, alpha) in enumerate(self._ema):
+            x = values[field]
+            self._emas[i] = x if count == 0 else self._emas[i] + alpha * (x - self._emas[i])
+
+        for field, buf in self._buffers.items():
+            buf[count % len(buf)] = values[field]
+        self._count = count = count + 1
+        if count % self._resync_every == 0:
+            self._resync()
+
+        # 历史不足窗口的指标不写入，引用它的条件不成立
+        for i, (key, field, window) in enumerate(self._sma):
+            if count >= window:
+                ohlc[key] = self._sums[i] / window
+        for i, (key, field, window, alpha) in enumerate(self._ema):
+            if count >= window:
+                ohlc[key] = self._emas[i]
+        for key, value in rocs:
+            ohlc[key] = value
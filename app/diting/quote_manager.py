@@ -15,39 +15,125 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from .quote_base import BaseQuoteEngine
+from .webhook import dispatcher
+from .webhook_outbox import outbox
+from .trigger_writer import trigger_writer
+from .rule_events import rule_bus
+from .quote_shard import ShardPool
+from .quote_recorder import recorder
+from .quote_hub import QuoteHub
+from .trigger_stream import broadcaster
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+ENGINE_SHARDS = int(os.getenv("ENGINE_SHARDS", "0"))  # 规则求值分片进程数，0 表示在引擎线程内求值
+QUOTE_FANIN = os.getenv("QUOTE_FANIN", "auto")  # 多券商汇聚：auto 多于一个引擎时启用 / 1 启用 / 0 关闭
 
 # ---------- 管理者 ----------
 class QuoteManager:
     def __init__(self):
         self.engines = {}
         self.loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self.shards: ShardPool | None = None
+        self.hub: QuoteHub | None = None
+        rule_bus.subscribe(self._on_rule_changed)
 
     def register(self, engine: BaseQuoteEngine):
         self.engines[engine.name] = engine
 
+    def _on_rule_changed(self, rule_id: int, op: str):
+        # 规则写入发生在 API / MCP 线程，转交到引擎所在的事件循环
+        if self.loop is None or self.loop.is_closed():
+            return
+        for e in self.engines.values():
+            self.loop.call_soon_threadsafe(e.on_rule_changed, rule_id, op)
+        if self.shards is not None:
+            self.loop.call_soon_threadsafe(self.shards.on_rule_changed, rule_id, op)
+        if self.hub is not None:
+            self.loop.call_soon_threadsafe(self.hub.on_rule_changed, rule_id, op)
+
     def start_all(self):
         if self.loop is None:
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
             logger.info("Event loop created for QuoteManager")
-        
+
+        dispatcher.start(self.loop)
+        outbox.start(self.loop)
+        trigger_writer.subscribe(outbox.on_triggers_written)
+        trigger_writer.subscribe(broadcaster.on_triggers_written)
+        trigger_writer.start()
+        recorder.start()
+        if ENGINE_SHARDS > 0:
+            # 分片模式：引擎只拉取行情，按标的哈希分发到各分片进程求值
+            self.shards = ShardPool(ENGINE_SHARDS)
+            self.shards.start(self.loop)
+        sources = {e.broker for e in self.engines.values()}
+        if QUOTE_FANIN == "1" or (QUOTE_FANIN == "auto" and len(self.engines) > 1):
+            # 汇聚模式：各券商引擎只拉取行情，汇聚层仲裁后统一求值（分片时由汇聚层分发）
+            self.hub = QuoteHub()
+            self.hub.shards = self.shards
+            self.hub.sources = sources
+            self.hub.start(self.loop)
         for e in self.engines.values():
+            e.hub = self.hub
+            e.shards = self.shards if self.hub is None else None
+            e.recorder = recorder if recorder.enabled else None
+            e.sources = sources
             e.start(self.loop)
         
-        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
 
     def stop_all(self):
         for e in self.engines.values():
             e.stop()
-        
+        if self.hub is not None:
+            self.hub.stop()
+            self.hub = None
+        if self.shards is not None and self.loop and self.loop.is_running():
+            # 分片退出前回传的触发仍需写入
+            try:
+                asyncio.run_coroutine_threadsafe(self.shards.aclose(), self.loop).result(timeout=15)
+            except Exception as e:
+                logger.warning(f"分片进程关闭异常: {e}")
+            self.shards = None
+        # 停止前把队列中的触发记录与行情全部落盘
+        trigger_writer.stop()
+        recorder.stop()
+
         if self.loop and self.loop.is_running():
-            self.loop.stop()
+            # 事件循环运行在后台线程，需要在该线程内关闭分发器并停止循环
+            try:
+                asyncio.run_coroutine_threadsafe(outbox.aclose(), self.loop).result(timeout=5)
+                asyncio.run_coroutine_threadsafe(dispatcher.aclose(), self.loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Webhook 分发器关闭异常: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            if self._thread:
+                self._thread.join(timeout=5)
+                self._thread = None
             self.loop.close()
             self.loop = None
             logger.info("Event loop closed for QuoteManager")
 
     def status(self):
-        return {name: eng.is_running() for name, eng in self.engines.items()}
+        status = {
+            "engines": {name: eng.status() for name, eng in self.engines.items()},
+            "webhook": dispatcher.status(),
+            "outbox": outbox.status(),
+            "trigger_writer": trigger_writer.status(),
+            "recorder": recorder.status(),
+            "stream": broadcaster.status(),
+        }
+        if self.shards is not None:
+            status["shards"] = self.shards.status()
+        if self.hub is not None:
+            status["hub"] = self.hub.status()
+        return status
 
 
 # 初始化管理者
@@ -0,0 +1,174 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-18 11:26:05
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-18 11:26:05
+FilePath: /mss_diting/app/diting/quote_recorder.py
+Description: 行情录制
+
+引擎只把行情批次放入队列，后台线程合并后以 NumPy 结构化数组追加写入按日轮转的文件；
+文件是连续的 .npy 记录，可用 iter_records 流式读取，也可直接交给 ReplayEngine 回放。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, time, queue, threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator
+from loguru import logger
+from dotenv import load_dotenv
+
+from .quote_batch import QuoteBatch, QUOTE_FIELDS, FIELD_DTYPES
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+QUOTE_RECORD_DIR = os.getenv("QUOTE_RECORD_DIR", "")  # 行情录制目录，为空则不录制
+QUOTE_RECORD_QUEUE = int(os.getenv("QUOTE_RECORD_QUEUE", "10000"))  # 待写入批次上限，满时丢弃而不阻塞引擎
+QUOTE_RECORD_FLUSH = float(os.getenv("QUOTE_RECORD_FLUSH", "1"))  # 合并写入的最长等待时间，单位秒
+
+RECORD_SUFFIX = ".qrec"
+RECORD_DTYPE = np.dtype([("ts", np.float64), ("symbol", "S24")] +
+                        [(field, FIELD_DTYPES[field]) for field in QUOTE_FIELDS])
+
+def batch_to_records(ts: float, batch: QuoteBatch) -> np.ndarray:
+    records = np.empty(len(batch), dtype=RECORD_DTYPE)
+    records["ts"] = ts
+    records["symbol"] = np.asarray(batch.symbols, dtype="S24")
+    for field in QUOTE_FIELDS:
+        records[field] = batch.columns[field]
+    return records
+
+def iter_records(path: str) -> Iterator[np.ndarray]:
+    """逐条读取录制文件中的记录块，末尾未写完整的记录块会被忽略"""
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield np.load(f, allow_pickle=False)
+            except EOFError:
+                return
+            except ValueError as e:
+                logger.warning(f"录制文件 {path} 末尾记录不完整，已忽略: {e}")
+                return
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    data = pd.DataFrame({name: records[name] for name in RECORD_DTYPE.names if name != "symbol"})
+    data.insert(1, "symbol", np.char.decode(records["symbol"], "ascii"))
+    return data
+
+# ----------------- 录制器 -----------------
+class QuoteRecorder:
+    def __init__(self, root: str = QUOTE_RECORD_DIR):
+        self.root = Path(root) if root else None
+        self._queue = queue.Queue(maxsize=QUOTE_RECORD_QUEUE)
+        self._thread = None
+        self._files = dict()  # 文件路径 -> 打开的文件
+        self._current = dict()  # 引擎 -> 当天文件路径
+        self._rows = 0
+        self._bytes = 0
+        self._dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="quote-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"行情录制已启动: {self.root}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        self._current.clear()
+        logger.info("行情录制已停止")
+
+    def record(self, engine: str, batch: QuoteBatch):
+        """引擎线程调用，只入队不做任何转换"""
+        if self._thread is None or not len(batch):
+            return
+        try:
+            self._queue.put_nowait((engine, time.time(), batch))
+        except queue.Full:
+            self._dropped += 1
+
+    def _path(self, engine: str, ts: float) -> Path:
+        # 按引擎、按自然日轮转
+        return self.root / f"{engine.lower()}-{datetime.fromtimestamp(ts):%Y%m%d}{RECORD_SUFFIX}"
+
+    def _open(self, engine: str, path: Path):
+        # 日期切换后关闭该引擎前一天的文件
+        current = self._current.get(engine)
+        if current is not None and current != path:
+            self._files.pop(current).close()
+        f = self._files.get(path)
+        if f is None:
+            f = self._files[path] = open(path, "ab")
+            self._current[engine] = path
+        return f
+
+    def _write(self, items: list):
+        groups = dict()
+        for engine, ts, batch in items:
+            key = (engine, self._path(engine, ts))
+            groups.setdefault(key, []).append(batch_to_records(ts, batch))
+        for (engine, path), chunks in groups.items():
+            records = np.concatenate(chunks)
+            f = self._open(engine, path)
+            start = f.tell()
+            np.save(f, records, allow_pickle=False)
+            f.flush()
+            self._rows += len(records)
+            self._bytes += f.tell() - start
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=QUOTE_RECORD_FLUSH)
+            except queue.Empty:
+                continue
+            # 等待窗口内到达的批次合并为一个记录块
+            items, deadline = [], time.monotonic() + QUOTE_RECORD_FLUSH
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if items:
+                try:
+                    self._write(items)
+                except Exception as e:
+                    logger.error(f"行情录制写入失败，丢弃 {len(items)} 批: {e}")
+                    self._dropped += len(items)
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue": self._queue.qsize(),
+            "rows": self._rows,
+            "bytes": self._bytes,
+            "dropped": self._dropped,
+            "files": [str(p) for p in self._files],
+        }
+
+
+# 初始化录制器
+recorder = QuoteRecorder()
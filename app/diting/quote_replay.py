@@ -0,0 +1,190 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-17 15:08:42
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-17 15:08:42
+FilePath: /mss_diting/app/diting/quote_replay.py
+Description: 离线行情回放
+
+按文件顺序分块读取历史行情（CSV / Parquet / 录制文件），不受 QUOTE_INTERVAL 节流，
+以最快速度走与实盘相同的规则求值和冷却流程（冷却按行情时间计时）；触发结果写入本地汇点，不连接 OpenD、不发送 webhook。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, json, time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterator, List
+from loguru import logger
+from dotenv import load_dotenv
+
+from .quote_base import BaseQuoteEngine, QUOTE_INTERVAL
+from .quote_cooldown import CooldownManager
+from .quote_batch import QuoteBatch, QUOTE_FIELDS, FIELD_DTYPES, safe_pct
+from .quote_recorder import RECORD_SUFFIX, iter_records, records_to_frame
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 为可选格式
+    pq = None
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+REPLAY_CHUNK = int(os.getenv("REPLAY_CHUNK", "100000"))  # 每次读取的行数
+
+# 时间列，相同时间的行属于同一轮行情
+TIME_COLUMNS = ("ts", "time", "data_time", "timestamp")
+
+def frame_to_batch(data: pd.DataFrame) -> QuoteBatch:
+    """Futu 原始列（code / last_price ...）或 QuoteOHLC 列（symbol / close ...）转换为批次"""
+    if "code" in data.columns:
+        return QuoteBatch.from_dataframe(data)
+    columns = dict()
+    for field in QUOTE_FIELDS:
+        if field in data.columns:
+            columns[field] = data[field].to_numpy(dtype=FIELD_DTYPES[field])
+    if "pct_amp" not in columns:
+        columns["pct_amp"] = safe_pct(columns["high"], columns["low"])
+    if "pct_chg" not in columns:
+        columns["pct_chg"] = np.zeros(len(data), dtype=np.float64)
+    return QuoteBatch(data["symbol"].astype(str).tolist(), columns)
+
+def cycle_starts(data: pd.DataFrame) -> np.ndarray:
+    # 每一轮行情的起始行号：有时间列时按时间变化切分，否则在标的重复出现时切分
+    for col in TIME_COLUMNS:
+        if col in data.columns:
+            ts = data[col].to_numpy()
+            return np.concatenate(([0], np.flatnonzero(ts[1:] != ts[:-1]) + 1))
+    symbols = data["code" if "code" in data.columns else "symbol"].tolist()
+    starts, seen = [0], set()
+    for i, symbol in enumerate(symbols):
+        if symbol in seen:
+            starts.append(i)
+            seen = set()
+        seen.add(symbol)
+    return np.array(starts, dtype=np.int64)
+
+def cycle_times(data: pd.DataFrame, starts: np.ndarray) -> np.ndarray | None:
+    # 每一轮的行情时间（秒），用作冷却计时的时钟；没有时间列时返回 None
+    for col in TIME_COLUMNS:
+        if col in data.columns:
+            values = data[col].iloc[starts]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_datetime(values).astype("int64") / 1e9
+            return values.to_numpy(dtype=np.float64)
+    return None
+
+def read_chunks(path: str, chunk: int = REPLAY_CHUNK) -> Iterator[pd.DataFrame]:
+    """分块读取，内存占用与文件大小无关"""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk)
+    elif suffix == RECORD_SUFFIX:
+        # 录制文件本身按记录块追加，逐块读取
+        for records in iter_records(path):
+            yield records_to_frame(records)
+    elif suffix in (".parquet", ".pq"):
+        if pq is None:
+            raise ValueError("读取 Parquet 需要安装 pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"不支持的回放文件: {path}")
+
+# ----------------- 本地汇点 -----------------
+class ReplaySink:
+    """代替触发记录写入与 webhook，统计触发并可写入 JSONL"""
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8") if path else None
+        self.count = 0
+        self.by_rule = dict()  # 规则名 -> 触发次数
+
+    def write(self, cycle: int, trigger, payload: dict):
+        self.count += 1
+        self.by_rule[payload["name"]] = self.by_rule.get(payload["name"], 0) + 1
+        if self._file:
+            self._file.write(json.dumps({"cycle": cycle, "rule_id": trigger.rule_id, **payload}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+# ----------------- 回放引擎 -----------------
+class ReplayEngine(BaseQuoteEngine):
+    def __init__(self, sink: ReplaySink | None = None):
+        super().__init__("REPLAY")
+        self.sink = sink or ReplaySink()
+        self.cooldowns = CooldownManager(persist=False)
+        self.track_changes = False  # 回放只加载一次规则，不登记变更同步进度，以免阻塞实盘引擎清理变更日志
+        self._cycle = 0
+        self._events = 0
+        self._clock = 0.0  # 回放时钟：行情时间，没有时间列时按轮次 × QUOTE_INTERVAL 推算
+        self.broker = None  # 回放不区分券商
+
+    async def loop(self):
+        # 回放由 replay() 同步驱动，不进入轮询循环
+        pass
+
+    def fire_rule(self, rule: dict, symbol: str, ohlc: dict):
+        # 触发直接写入汇点并视为投递成功，冷却流程与实盘一致
+        logger.debug("[{}] 规则触发: {} {} @ {}", self.name, rule['name'], symbol, ohlc)
+        trigger, payload = self.make_trigger(rule, symbol, ohlc)
+        rule['_pending'] = True
+        self.sink.write(self._cycle, trigger, payload)
+        self._on_delivery(rule['id'], True)
+
+    def now(self) -> float:
+        return self._clock
+
+    def _run_cycle(self, batch: QuoteBatch, ts: float | None = None):
+        self._cycle += 1
+        self._events += len(batch)
+        self._clock = ts if ts is not None else self._cycle * QUOTE_INTERVAL
+        self.check_rules(batch)
+
+    def replay(self, paths: List[str], chunk: int = REPLAY_CHUNK) -> dict:
+        """依次回放文件，返回事件数、触发数与吞吐"""
+        self._load_symbols_rules()
+        # 回放不关心发件箱中遗留的待投递记录
+        for rule in self._rules_by_id.values():
+            rule["_pending"] = False
+
+        started = time.perf_counter()
+        for path in paths:
+            logger.info(f"[{self.name}] 回放 {path}")
+            carry = None
+            for data in read_chunks(path, chunk):
+                if carry is not None:
+                    data = pd.concat([carry, data], ignore_index=True)
+                starts = cycle_starts(data)
+                times = cycle_times(data, starts)
+                # 整块一次转换为列式批次，每轮取切片视图；最后一轮可能跨块，留到下一块一起处理
+                batch = frame_to_batch(data.iloc[:starts[-1]])
+                for k, (begin, end) in enumerate(zip(starts[:-1], starts[1:])):
+                    self._run_cycle(QuoteBatch(batch.symbols[begin:end],
+                                               {f: col[begin:end] for f, col in batch.columns.items()}),
+                                    None if times is None else float(times[k]))
+                carry = data.iloc[starts[-1]:]
+            if carry is not None and len(carry):
+                times = cycle_times(carry, np.array([0]))
+                self._run_cycle(frame_to_batch(carry), None if times is None else float(times[0]))
+        elapsed = time.perf_counter() - started
+        self.sink.close()
+
+        stats = {
+            "files": len(paths),
+            "events": self._events,
+            "cycles": self._cycle,
+            "triggers": self.sink.count,
+            "elapsed_s": round(elapsed, 3),
+            "events_per_s": round(self._events / elapsed) if elapsed > 0 else None,
+            "by_rule": self.sink.by_rule,
+        }
+        logger.info(f"[{self.name}] 回放完成: 行情 {self._events} 条，触发 {self.sink.count} 次，{stats['events_per_s']} 条/秒")
+        return stats
@@ -8,7 +8,8 @@ Description: JSON 规则处理
 
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
-import operator
+import json, operator
+from typing import Callable
 from jsonschema import validate, ValidationError
 
 # -------------------------
@@ -28,18 +29,39 @@ VALID_LOGICS = {"AND", "OR", "NOT"}
 # 白名单（行情字段）
 VALID_FIELDS = {"open", "high", "low", "close", "volume", "amplitude", "pct_change"}
 
+# 规则字段到行情快照字段的映射（QuoteOHLC 中为 pct_amp / pct_chg）
+FIELD_ALIASES = {"amplitude": "pct_amp", "pct_change": "pct_chg"}
+
+# 指标：sma/avg 简单均值，ema 指数均值，roc 相对 N 笔之前的变化百分比
+VALID_INDICATORS = {"sma", "avg", "ema", "roc"}
+INDICATOR_ALIASES = {"avg": "sma"}
+MAX_WINDOW = 1000  # 指标窗口上限，决定每个标的环形缓冲区的最大长度
+
 # -------------------------
 # JSON Schema 定义
 # -------------------------
+# 指标表达式，如 {"indicator": "sma", "field": "close", "window": 20, "mul": 1.05}
+INDICATOR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "indicator": {"type": "string", "enum": list(VALID_INDICATORS)},
+        "field": {"type": "string", "enum": list(VALID_FIELDS)},
+        "window": {"type": "integer", "minimum": 1, "maximum": MAX_WINDOW},
+        "mul": {"type": "number"}
+    },
+    "required": ["indicator", "field", "window"],
+    "additionalProperties": False
+}
+
 RULE_SCHEMA = {
     "type": "object",
     "anyOf": [
-        # 条件节点
+        # 条件节点，field / value 均可为指标表达式
         {
             "properties": {
-                "field": {"type": "string", "enum": list(VALID_FIELDS)},
+                "field": {"anyOf": [{"type": "string", "enum": list(VALID_FIELDS)}, INDICATOR_SCHEMA]},
                 "op": {"type": "string", "enum": list(OPS.keys())},
-                "value": {"type": ["number", "string", "boolean"]}
+                "value": {"anyOf": [{"type": ["number", "string", "boolean"]}, INDICATOR_SCHEMA]}
             },
             "required": ["field", "op", "value"],
             "additionalProperties": False
@@ -66,13 +88,62 @@ def validate_rule(rule: dict) -> bool:
         raise ValueError(f"Invalid rule: {e.message}")
     return True
 
+# -------------------------
+# 指标表达式
+# -------------------------
+def indicator_spec(ind: dict) -> tuple[str, str, int]:
+    """指标规范化为 (指标, 快照字段, 窗口)"""
+    name = INDICATOR_ALIASES.get(ind["indicator"], ind["indicator"])
+    return name, FIELD_ALIASES.get(ind["field"], ind["field"]), int(ind["window"])
+
+def indicator_key(ind: dict) -> str:
+    # 指标值写入行情快照时使用的合成字段名，如 sma(close,20)
+    name, field, window = indicator_spec(ind)
+    return f"{name}({field},{window})"
+
+def has_indicator(rule: dict) -> bool:
+    return "field" in rule and (isinstance(rule["field"], dict) or isinstance(rule["value"], dict))
+
+def rule_indicators(rule: dict) -> set[tuple[str, str, int]]:
+    """规则树中用到的全部指标"""
+    if "field" in rule:
+        return {indicator_spec(x) for x in (rule["field"], rule["value"]) if isinstance(x, dict)}
+    specs = set()
+    for cond in rule.get("conditions", []):
+        specs |= rule_indicators(cond)
+    return specs
+
+def _operand(operand, is_field: bool) -> Callable[[dict], object]:
+    # 条件一侧的取值：指标（可带倍数）、行情字段或常量，指标未就绪时为 None
+    if isinstance(operand, dict):
+        key, mul = indicator_key(operand), operand.get("mul", 1)
+        if mul == 1:
+            return lambda snapshot: snapshot.get(key)
+        return lambda snapshot: None if (v := snapshot.get(key)) is None else v * mul
+    if is_field:
+        field = FIELD_ALIASES.get(operand, operand)
+        return lambda snapshot: snapshot[field]
+    return lambda snapshot: operand
+
+def compile_indicator_condition(rule: dict) -> Callable[[dict], bool]:
+    """含指标的条件节点，任一侧指标未就绪（历史不足窗口）时不成立"""
+    op = OPS[rule["op"]]
+    left, right = _operand(rule["field"], True), _operand(rule["value"], False)
+
+    def cond(snapshot: dict) -> bool:
+        a, b = left(snapshot), right(snapshot)
+        return a is not None and b is not None and op(a, b)
+    return cond
+
 # -------------------------
 # 规则执行函数
 # -------------------------
 def eval_rule(rule: dict, snapshot: dict) -> bool:
     # 条件节点
+    if has_indicator(rule):
+        return compile_indicator_condition(rule)(snapshot)
     if "field" in rule:
-        field = rule["field"]
+        field = FIELD_ALIASES.get(rule["field"], rule["field"])
         op = OPS[rule["op"]]
         value = rule["value"]
         return op(snapshot[field], value)
@@ -93,3 +164,82 @@ def eval_rule(rule: dict, snapshot: dict) -> bool:
     else:
         raise ValueError("Invalid rule format")
     return False
+
+# -------------------------
+# 规则编译函数
+# -------------------------
+def compile_rule(rule: dict) -> Callable[[dict], bool]:
+    """将规则树编译为短路求值的闭包，只在加载时遍历一次"""
+    # 条件节点
+    if has_indicator(rule):
+        return compile_indicator_condition(rule)
+    if "field" in rule:
+        field = FIELD_ALIASES.get(rule["field"], rule["field"])
+        op = OPS[rule["op"]]
+        value = rule["value"]
+        return lambda snapshot: op(snapshot[field], value)
+
+    # 逻辑节点
+    elif "logic" in rule:
+        logic = rule["logic"].upper()
+        conds = tuple(compile_rule(cond) for cond in rule.get("conditions", []))
+
+        if logic == "NOT":
+            if len(conds) != 1:
+                raise ValueError("NOT must have exactly one condition")
+            inner = conds[0]
+            return lambda snapshot: not inner(snapshot)
+        elif logic not in ("AND", "OR"):
+            raise ValueError(f"Invalid logic: {logic}")
+        elif not conds:
+            result = logic == "AND"
+            return lambda snapshot: result
+        elif len(conds) == 1:
+            return conds[0]
+        elif len(conds) == 2:
+            left, right = conds
+            if logic == "AND":
+                return lambda snapshot: left(snapshot) and right(snapshot)
+            return lambda snapshot: left(snapshot) or right(snapshot)
+
+        if logic == "AND":
+            def _and(snapshot: dict) -> bool:
+                for cond in conds:
+                    if not cond(snapshot):
+                        return False
+                return True
+            return _and
+
+        def _or(snapshot: dict) -> bool:
+            for cond in conds:
+                if cond(snapshot):
+                    return True
+            return False
+        return _or
+    else:
+        raise ValueError("Invalid rule format")
+
+# -------------------------
+# 编译缓存，按规则 id 与 updated_at 失效
+# -------------------------
+_COMPILED_RULES: dict[int, tuple] = dict()
+
+def get_compiled_rule(rule_id: int, updated_at: str, rule_json: str) -> tuple[dict, Callable[[dict], bool]]:
+    """返回 (规则字典, 编译后的闭包)，规则未变化时直接复用缓存"""
+    cached = _COMPILED_RULES.get(rule_id)
+    if cached is not None and cached[0] == updated_at and cached[1] == rule_json:
+        return cached[2], cached[3]
+
+    rule = json.loads(rule_json)
+    compiled = compile_rule(rule)
+    _COMPILED_RULES[rule_id] = (updated_at, rule_json, rule, compiled)
+    return rule, compiled
+
+def prune_compiled_rules(rule_ids: set[int]) -> None:
+    """清理已不存在（删除或停用）规则的编译缓存"""
+    for rule_id in list(_COMPILED_RULES.keys()):
+        if rule_id not in rule_ids:
+            del _COMPILED_RULES[rule_id]
+
+def discard_compiled_rule(rule_id: int) -> None:
+    _COMPILED_RULES.pop(rule_id, None)
@@ -0,0 +1,272 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-15 09:40:18
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-15 09:40:18
+FilePath: /mss_diting/app/diting/quote_shard.py
+Description: 多进程分片求值
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, time, zlib, asyncio
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from pathlib import Path
+from loguru import logger
+from dotenv import load_dotenv
+
+from .quote_base import BaseQuoteEngine
+from .quote_batch import QuoteBatch
+from .webhook_outbox import outbox
+from .trigger_writer import trigger_writer
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+QUOTE_INTERVAL = int(os.getenv("QUOTE_INTERVAL", "60"))  # 行情轮询间隔，单位秒
+SHARD_STALE = int(os.getenv("SHARD_STALE", str(QUOTE_INTERVAL * 3)))  # 分片超过该秒数未上报状态视为异常
+
+def shard_of(symbol: str, shards: int) -> int:
+    # 标的按 CRC32 哈希分片，进程间结果稳定
+    return zlib.crc32(symbol.encode()) % shards
+
+# ----------------- 分片工作进程 -----------------
+class ShardEngine(BaseQuoteEngine):
+    """工作进程内的引擎：只加载本分片标的的规则，行情由主进程经管道送达"""
+    def __init__(self, shard: int, shards: int, conn: Connection):
+        super().__init__(f"SHARD-{shard}")
+        self.shard = shard
+        self.shards_total = shards
+        self._conn = conn
+        self._evaluated = 0
+        self.broker = None  # 行情来源已由主进程确定，分片加载本分片的全部规则
+
+    def _prepare_rule(self, row, pending_ids: set) -> dict | None:
+        if shard_of(row["symbol"], self.shards_total) != self.shard:
+            return None
+        return super()._prepare_rule(row, pending_ids)
+
+    def fire_rule(self, rule: dict, symbol: str, ohlc: dict):
+        # 触发记录由主进程统一写入发件箱，这里只回传触发信息
+        logger.info(f"[{self.name}] 规则触发: {rule['name']} {symbol} @ {ohlc}")
+        rule['_pending'] = True
+        info = {k: rule[k] for k in ("id", "name", "tag", "webhook_url")}
+        self._conn.send(("trigger", info, symbol, ohlc))
+
+    def _release(self, rule_id: int):
+        # 触发记录写入失败，释放待定状态
+        rule = self._rules_by_id.get(rule_id)
+        if rule is not None:
+            rule['_pending'] = False
+
+    def on_message(self):
+        try:
+            while self._conn.poll():
+                msg = self._conn.recv()
+                kind = msg[0]
+                if kind == "quotes":
+                    batch = QuoteBatch(msg[1], msg[2])
+                    self._evaluated += len(batch)
+                    self.check_rules(batch, msg[3], msg[4])
+                elif kind == "rule":
+                    self.on_rule_changed(msg[1], msg[2])
+                elif kind == "delivery":
+                    self._on_delivery(msg[1], msg[2])
+                elif kind == "released":
+                    self._release(msg[1])
+                elif kind == "stop":
+                    self._loop.stop()
+                    return
+        except (EOFError, OSError):
+            # 主进程已退出
+            logger.warning(f"[{self.name}] 与主进程的管道已断开")
+            self._loop.stop()
+        except Exception as e:
+            logger.warning(f"[{self.name}] 消息处理异常: {e}")
+
+    def report(self):
+        status = self.status()
+        status["evaluated"] = self._evaluated
+        self._conn.send(("status", status))
+
+    async def loop(self):
+        # 行情由主进程推送，这里只定期上报状态
+        self.report()
+
+
+def run_shard(shard: int, shards: int, conn: Connection):
+    """分片工作进程入口"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    engine = ShardEngine(shard, shards, conn)
+    engine.start(loop)
+    loop.add_reader(conn.fileno(), engine.on_message)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        loop.remove_reader(conn.fileno())
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        conn.close()
+
+# ----------------- 主进程分片池 -----------------
+class ShardPool:
+    def __init__(self, shards: int):
+        self.name = "SHARDS"
+        self.shards = shards
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._procs = list()
+        self._conns = list()
+        self._shard_cache = dict()  # 标的 -> 分片
+        self._owner = dict()  # 规则 id -> 分片，用于回传投递结果
+        self._status = [dict() for _ in range(shards)]
+        self._reported = [0.0] * shards
+        self._sent = [0] * shards
+        self._triggers = [0] * shards
+        self._closing = False
+
+    def shard_of(self, symbol: str) -> int:
+        shard = self._shard_cache.get(symbol)
+        if shard is None:
+            shard = self._shard_cache[symbol] = shard_of(symbol, self.shards)
+        return shard
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        # 主进程中有事件循环线程与 Futu 线程，使用 spawn 避免 fork 复制锁状态
+        ctx = mp.get_context("spawn")
+        for i in range(self.shards):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=run_shard, args=(i, self.shards, child_conn),
+                               name=f"diting-shard-{i}", daemon=True)
+            proc.start()
+            child_conn.close()
+            self._procs.append(proc)
+            self._conns.append(parent_conn)
+            loop.add_reader(parent_conn.fileno(), self._on_message, i)
+        outbox.subscribe(self._on_delivery)
+        trigger_writer.subscribe(self._on_triggers_written)
+        logger.info(f"[{self.name}] 启动 {self.shards} 个分片进程")
+
+    async def aclose(self):
+        """通知分片退出并等待，期间仍接收分片回传的触发"""
+        outbox.unsubscribe(self._on_delivery)
+        trigger_writer.unsubscribe(self._on_triggers_written)
+        self._closing = True
+        for i in range(len(self._conns)):
+            self._send(i, ("stop",))
+        for proc in self._procs:
+            await asyncio.to_thread(proc.join, 5)
+            if proc.is_alive():
+                logger.warning(f"[{self.name}] 分片进程 {proc.name} 未退出，强制终止")
+                proc.terminate()
+        for conn in self._conns:
+            self._loop.remove_reader(conn.fileno())
+            conn.close()
+        self._procs, self._conns = list(), list()
+        logger.info(f"[{self.name}] 分片进程已全部退出")
+
+    def _send(self, shard: int, msg: tuple):
+        try:
+            self._conns[shard].send(msg)
+            return True
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"[{self.name}] 分片 {shard} 管道异常: {e}")
+            return False
+
+    def _broadcast(self, msg: tuple):
+        for i in range(len(self._conns)):
+            self._send(i, msg)
+
+    def dispatch(self, batch: QuoteBatch, source: str | None = None, primaries: dict | None = None):
+        """按标的分片拆分行情批次并发送，行情来源一并送达以便分片按规则的 brokers 过滤"""
+        if not self._conns or not len(batch):
+            return
+        shards = np.fromiter((self.shard_of(s) for s in batch.symbols), dtype=np.int64, count=len(batch))
+        for i in range(self.shards):
+            rows = np.flatnonzero(shards == i)
+            if len(rows):
+                part = batch.take(rows)
+                part_primaries = {s: primaries[s] for s in part.symbols} if primaries else None
+                if self._send(i, ("quotes", part.symbols, part.columns, source, part_primaries)):
+                    self._sent[i] += len(rows)
+
+    def on_rule_changed(self, rule_id: int, op: str):
+        # 规则变更通知所有分片，由各分片自行增量同步
+        self._broadcast(("rule", rule_id, op))
+
+    def _on_message(self, shard: int):
+        conn = self._conns[shard]
+        try:
+            while conn.poll():
+                msg = conn.recv()
+                if msg[0] == "trigger":
+                    self._on_trigger(shard, *msg[1:])
+                elif msg[0] == "status":
+                    self._status[shard] = msg[1]
+                    self._reported[shard] = time.monotonic()
+        except (EOFError, OSError):
+            if not self._closing:
+                logger.error(f"[{self.name}] 分片 {shard} 异常退出")
+            self._loop.remove_reader(conn.fileno())
+
+    def _on_trigger(self, shard: int, rule: dict, symbol: str, ohlc: dict):
+        self._triggers[shard] += 1
+        self._owner[rule["id"]] = shard
+        trigger, payload = BaseQuoteEngine.make_trigger(rule, symbol, ohlc)
+        trigger_writer.submit(trigger, rule["webhook_url"], payload, outbox.delay_for(rule["webhook_url"]))
+
+    def _on_delivery(self, rule_id: int, ok: bool):
+        # 重启前遗留的发件箱记录不知道属于哪个分片，广播给所有分片
+        shard = self._owner.pop(rule_id, None)
+        if shard is None:
+            self._broadcast(("delivery", rule_id, ok))
+        else:
+            self._send(shard, ("delivery", rule_id, ok))
+
+    def _on_triggers_written(self, written: list, ok: bool):
+        # 写入线程回调，转交到事件循环再写管道；没有 webhook 的触发写入成功即按投递成功处理
+        if self._loop is None:
+            return
+        for _, trigger, url in written:
+            if not ok:
+                self._loop.call_soon_threadsafe(self._release, trigger.rule_id)
+            elif not url:
+                self._loop.call_soon_threadsafe(self._on_delivery, trigger.rule_id, True)
+
+    def _release(self, rule_id: int):
+        shard = self._owner.pop(rule_id, None)
+        if shard is None:
+            self._broadcast(("released", rule_id))
+        else:
+            self._send(shard, ("released", rule_id))
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        workers = list()
+        for i, proc in enumerate(self._procs):
+            age = now - self._reported[i] if self._reported[i] else None
+            workers.append({
+                "shard": i,
+                "pid": proc.pid,
+                "alive": proc.is_alive(),
+                "healthy": proc.is_alive() and age is not None and age < SHARD_STALE,
+                "last_report": age,
+                "quotes_sent": self._sent[i],
+                "triggers": self._triggers[i],
+                **self._status[i],
+            })
+        return {
+            "shards": self.shards,
+            "healthy": sum(1 for w in workers if w["healthy"]),
+            "symbols": sum(w.get("symbols", 0) for w in workers),
+            "rules": sum(w.get("rules", 0) for w in workers),
+            "triggers": sum(self._triggers),
+            "workers": workers,
+        }
@@ -0,0 +1,158 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-22 09:36:14
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-22 09:36:14
+FilePath: /mss_diting/app/diting/quote_sim.py
+Description: 模拟行情引擎
+
+不连接 OpenD，按规则标的生成随机游走行情，以固定频率送入与实盘相同的求值、触发和投递流程，
+用于压测与联调；也可以不启动定时任务，由调用方 tick() 同步驱动。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, time, asyncio
+import numpy as np
+from pathlib import Path
+from typing import Iterable
+from loguru import logger
+from dotenv import load_dotenv
+
+from .quote_base import BaseQuoteEngine
+from .quote_batch import QuoteBatch, safe_pct
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+SIM_RATE = float(os.getenv("SIM_RATE", "1"))  # 每秒生成几轮行情，每轮覆盖全部标的
+SIM_VOLATILITY = float(os.getenv("SIM_VOLATILITY", "0.002"))  # 每轮价格变动的标准差（比例）
+SIM_SEED = int(os.getenv("SIM_SEED", "7"))  # 随机数种子，相同种子生成相同行情
+
+# ----------------- 随机游走 -----------------
+class RandomWalk:
+    """每个标的一条几何随机游走，开盘价、最高、最低与成交量随之累积"""
+    def __init__(self, volatility: float = SIM_VOLATILITY, seed: int = SIM_SEED):
+        self.volatility = volatility
+        self._rng = np.random.default_rng(seed)
+        self.symbols = []
+        self._prev = np.empty(0)
+        self._open = np.empty(0)
+        self._high = np.empty(0)
+        self._low = np.empty(0)
+        self._close = np.empty(0)
+        self._volume = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def resize(self, symbols: Iterable[str]):
+        # 标的变化时保留已有标的的走势，新标的随机取初始价格
+        symbols = sorted(symbols)
+        old = {s: i for i, s in enumerate(self.symbols)}
+        keep = np.array([old.get(s, -1) for s in symbols], dtype=np.int64)
+        fresh = keep < 0
+        start = self._rng.uniform(5, 500, len(symbols))
+
+        def carry(values: np.ndarray, default: np.ndarray) -> np.ndarray:
+            out = default.copy()
+            out[~fresh] = values[keep[~fresh]]
+            return out
+
+        self._prev = carry(self._prev, start)
+        self._open = carry(self._open, start)
+        self._high = carry(self._high, start)
+        self._low = carry(self._low, start)
+        self._close = carry(self._close, start)
+        self._volume = carry(self._volume, np.zeros(len(symbols), dtype=np.int64))
+        self.symbols = symbols
+
+    def step(self) -> QuoteBatch:
+        n = len(self.symbols)
+        self._close = self._close * np.exp(self._rng.normal(0, self.volatility, n))
+        self._high = np.maximum(self._high, self._close)
+        self._low = np.minimum(self._low, self._close)
+        self._volume = self._volume + self._rng.integers(0, 10_000, n)
+        return QuoteBatch(self.symbols, {
+            "open": self._open.copy(),
+            "high": self._high.copy(),
+            "low": self._low.copy(),
+            "close": self._close.copy(),
+            "pct_chg": safe_pct(self._close, self._prev),
+            "pct_amp": safe_pct(self._high, self._low),
+            "volume": self._volume.copy(),
+        })
+
+# ----------------- 模拟引擎 -----------------
+class SimulatedEngine(BaseQuoteEngine):
+    def __init__(self, name: str = "SIM", rate: float = SIM_RATE,
+                 volatility: float = SIM_VOLATILITY, seed: int = SIM_SEED):
+        super().__init__(name)
+        self.rate = rate
+        self._walk = RandomWalk(volatility, seed)
+        self._ticker = None
+        self._ticks = 0
+        self._events = 0
+        self._late = 0  # 未能按时生成的轮次
+        self._busy = 0.0  # 生成与求值累计耗时，单位秒
+
+    def _on_symbols_changed(self, added: set, removed: set):
+        self._walk.resize(self._symbols)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._running:
+            return
+        super().start(loop)
+        if self.rate > 0:
+            self._ticker = loop.create_task(self._tick_loop())
+
+    def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        super().stop()
+
+    async def loop(self):
+        # 行情由定时任务生成，这里只保留基类的兜底同步
+        pass
+
+    def tick(self) -> int:
+        """生成一轮行情并求值，返回行情条数"""
+        if not len(self._walk):
+            return 0
+        started = time.perf_counter()
+        batch = self._walk.step()
+        self.check_rules(batch)
+        self._busy += time.perf_counter() - started
+        self._ticks += 1
+        self._events += len(batch)
+        return len(batch)
+
+    async def _tick_loop(self):
+        period = 1 / self.rate
+        deadline = time.monotonic()
+        while self._running:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning(f"[{self.name}] 模拟行情异常: {e}")
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # 落后于计划时不补发，从当前时间重新计时
+                self._late += 1
+                deadline = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def status(self) -> dict:
+        status = super().status()
+        status["simulator"] = {
+            "rate": self.rate,
+            "ticks": self._ticks,
+            "events": self._events,
+            "late": self._late,
+            "busy_s": round(self._busy, 3),
+        }
+        return status
@@ -0,0 +1,130 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-11 10:40:26
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-11 10:40:26
+FilePath: /mss_diting/app/diting/quote_vector.py
+Description: 基于 NumPy 的批量规则求值
+
+所有规则的条件节点按 (字段, 运算符) 分组，对整批行情做一次向量比较；
+逻辑节点按层级自底向上，用计数合并子节点的布尔结果。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import numpy as np
+from typing import List, Tuple
+
+from .quote_batch import QuoteBatch, QUOTE_FIELDS
+from .quote_rule import OPS, FIELD_ALIASES
+
+
+# ----------------- 向量化规则集 -----------------
+class VectorRuleSet:
+    def __init__(self, rules: List[dict]):
+        self.rules = []         # 可向量化的规则
+        self.fallback = []      # 无法向量化的规则（如字符串比较），逐条求值
+        self._symbols = []      # 规则涉及的标的
+        self._leaves = dict()   # (field, op) -> [节点 id, 标的序号, 阈值]
+        self._levels = dict()   # 层级 -> logic -> [父节点 id, 子节点 id, 子节点所属父节点序号]
+        self._n_nodes = 0
+
+        sym_slots = dict()
+        roots, rule_slots = [], []
+        for rule in rules:
+            if not self._vectorizable(rule["rule_json"]):
+                self.fallback.append(rule)
+                continue
+            slot = sym_slots.setdefault(rule["symbol"], len(sym_slots))
+            root, _ = self._add_node(rule["rule_json"], slot)
+            self.rules.append(rule)
+            roots.append(root)
+            rule_slots.append(slot)
+        self._symbols = list(sym_slots.keys())
+        self._roots = np.array(roots, dtype=np.int64)
+        self._rule_slots = np.array(rule_slots, dtype=np.int64)
+
+        # 将构建期的列表转换为数组
+        for key, (ids, slots, values) in self._leaves.items():
+            self._leaves[key] = (np.array(ids, dtype=np.int64),
+                                 np.array(slots, dtype=np.int64),
+                                 np.array(values, dtype=np.float64))
+        for level in self._levels.values():
+            for logic, (parents, children, owners) in level.items():
+                level[logic] = (np.array(parents, dtype=np.int64),
+                                np.array(children, dtype=np.int64),
+                                np.array(owners, dtype=np.int64))
+
+    @staticmethod
+    def _vectorizable(rule: dict) -> bool:
+        if "field" in rule:
+            # 指标条件依赖逐标的历史，回退到逐条求值
+            if not isinstance(rule["field"], str):
+                return False
+            field = FIELD_ALIASES.get(rule["field"], rule["field"])
+            return field in QUOTE_FIELDS and isinstance(rule["value"], (int, float))
+        if rule["logic"].upper() == "NOT" and len(rule.get("conditions", [])) != 1:
+            raise ValueError("NOT must have exactly one condition")
+        return all(VectorRuleSet._vectorizable(cond) for cond in rule.get("conditions", []))
+
+    def _add_node(self, rule: dict, slot: int) -> Tuple[int, int]:
+        # 返回 (节点 id, 节点高度)，条件节点高度为 0
+        if "field" in rule:
+            node = self._n_nodes
+            self._n_nodes += 1
+            field = FIELD_ALIASES.get(rule["field"], rule["field"])
+            ids, slots, values = self._leaves.setdefault((field, rule["op"]), ([], [], []))
+            ids.append(node)
+            slots.append(slot)
+            values.append(float(rule["value"]))
+            return node, 0
+
+        children = [self._add_node(cond, slot) for cond in rule.get("conditions", [])]
+        height = 1 + max((h for _, h in children), default=0)
+        node = self._n_nodes
+        self._n_nodes += 1
+        level = self._levels.setdefault(height, dict())
+        parents, child_ids, owners = level.setdefault(rule["logic"].upper(), ([], [], []))
+        owner = len(parents)
+        parents.append(node)
+        for child, _ in children:
+            child_ids.append(child)
+            owners.append(owner)
+        return node, height
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, batch: QuoteBatch) -> List[Tuple[dict, int]]:
+        """对整批行情求值，返回触发的 (规则, 行号) 列表"""
+        if not self.rules or not len(batch):
+            return []
+
+        # 标的序号 -> 批次行号，缺失为 -1
+        rows = np.fromiter((batch.index_of(s) for s in self._symbols),
+                           dtype=np.int64, count=len(self._symbols))
+        present = rows >= 0
+        values = np.zeros(self._n_nodes, dtype=bool)
+
+        # 条件节点：每个 (字段, 运算符) 一次向量比较
+        for (field, op), (ids, slots, thresholds) in self._leaves.items():
+            leaf_rows = rows[slots]
+            column = batch.columns[field][leaf_rows]
+            values[ids] = OPS[op](column, thresholds) & present[slots]
+
+        # 逻辑节点：按高度自底向上，统计每个父节点为真的子节点数量
+        for height in sorted(self._levels.keys()):
+            for logic, (parents, children, owners) in self._levels[height].items():
+                if logic == "NOT":
+                    values[parents] = ~values[children]
+                    continue
+                n = len(parents)
+                trues = np.bincount(owners, weights=values[children], minlength=n)
+                if logic == "AND":
+                    totals = np.bincount(owners, minlength=n)
+                    values[parents] = trues == totals
+                else:
+                    values[parents] = trues > 0
+
+        fired = np.flatnonzero(values[self._roots] & present[self._rule_slots])
+        return [(self.rules[i], int(rows[self._rule_slots[i]])) for i in fired]
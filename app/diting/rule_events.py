@@ -0,0 +1,47 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-22 10:08:52
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-22 10:08:52
+FilePath: /mss_diting/app/diting/rule_events.py
+Description: 进程内规则变更事件总线
+
+API / MCP 写入规则后发布事件，行情管理器转发给各引擎立即生效。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import threading
+from typing import Callable
+from loguru import logger
+
+
+# ----------------- 事件总线 -----------------
+class RuleEventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, listener: Callable[[int, str], None]):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[int, str], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def publish(self, rule_id: int, op: str):
+        """发布规则变更，op 为 add / update / delete / purge；在写入方线程内同步回调"""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(rule_id, op)
+            except Exception as e:
+                logger.error(f"规则变更事件处理异常: {e}")
+
+
+# 初始化事件总线
+rule_bus = RuleEventBus()
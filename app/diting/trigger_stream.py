@@ -0,0 +1,196 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-24 14:05:33
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-24 14:05:33
+FilePath: /mss_diting/app/diting/trigger_stream.py
+Description: 触发记录实时推送
+
+触发记录落盘后由写入线程广播给订阅者，每个订阅者只有定长缓冲区，写满时丢弃最旧的记录而不阻塞写入线程，
+丢弃的部分随后按 id 从数据库补齐；客户端带上最后收到的 id 重连即可续传。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, asyncio, threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator
+from loguru import logger
+from dotenv import load_dotenv
+
+from .db_sqlite import get_rule, get_triggers_after
+from .rule_events import rule_bus
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "1000"))  # 每个订阅者缓存的触发记录上限，超出后从数据库补齐
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))  # 没有触发时的心跳间隔，单位秒
+STREAM_BACKFILL = int(os.getenv("STREAM_BACKFILL", "500"))  # 补齐时每次从数据库读取的条数
+
+# 推送的触发记录字段，实时推送与数据库补齐保持一致
+EVENT_FIELDS = ("id", "rule_id", "name", "tag", "symbol", "message", "ts")
+
+def _split(value: str | None) -> set | None:
+    items = {v.strip() for v in (value or "").split(",") if v.strip()}
+    return items or None
+
+# ----------------- 订阅过滤 -----------------
+class TriggerFilter:
+    """按标的、规则 id、标签过滤，多个取值逗号分隔，为空表示不限"""
+    def __init__(self, symbols: set | None = None, rule_ids: set | None = None, tags: set | None = None):
+        self.symbols = symbols
+        self.rule_ids = rule_ids
+        self.tags = tags
+
+    @classmethod
+    def parse(cls, symbol: str | None = None, rule_id: str | None = None, tag: str | None = None) -> "TriggerFilter":
+        rule_ids = _split(rule_id)
+        return cls(_split(symbol), {int(r) for r in rule_ids} if rule_ids else None, _split(tag))
+
+    def matches(self, event: dict) -> bool:
+        return ((self.symbols is None or event["symbol"] in self.symbols) and
+                (self.rule_ids is None or event["rule_id"] in self.rule_ids) and
+                (self.tags is None or event["tag"] in self.tags))
+
+# ----------------- 订阅者 -----------------
+class Subscriber:
+    def __init__(self, trigger_filter: TriggerFilter, loop: asyncio.AbstractEventLoop):
+        self.filter = trigger_filter
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._ready = asyncio.Event()
+        self._notified = False
+        self.lagged_from = None  # 缓冲区溢出时被丢弃的最早 id，补齐后清空
+        self.dropped = 0
+
+    def push(self, event: dict):
+        """写入线程调用，只做入队和唤醒"""
+        with self._lock:
+            if len(self._buffer) >= STREAM_BUFFER:
+                dropped = self._buffer.popleft()
+                self.dropped += 1
+                if self.lagged_from is None:
+                    self.lagged_from = dropped["id"]
+            self._buffer.append(event)
+            if self._notified:
+                return
+            self._notified = True
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def get(self, timeout: float) -> tuple[list, int | None]:
+        """等待并取出缓冲区中的全部记录，返回 (记录, 需要补齐的起始 id)；超时返回空列表"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._lock:
+            self._ready.clear()
+            self._notified = False
+            events, self._buffer = list(self._buffer), deque()
+            lagged_from, self.lagged_from = self.lagged_from, None
+        return events, lagged_from
+
+# ----------------- 广播 -----------------
+class TriggerBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._rules = dict()  # 规则 id -> (名称, 标签)，规则变更时失效
+        self._published = 0
+        self._backfilled = 0
+        self._dropped = 0  # 已退订订阅者的丢弃数
+        rule_bus.subscribe(self._on_rule_changed)
+
+    def _on_rule_changed(self, rule_id: int, op: str):
+        self._rules.pop(rule_id, None)
+
+    def _rule_info(self, rule_id: int) -> tuple:
+        info = self._rules.get(rule_id)
+        if info is None:
+            row = get_rule(rule_id)
+            info = self._rules[rule_id] = (row["name"], row["tag"]) if row is not None else (None, None)
+        return info
+
+    def on_triggers_written(self, written: list, ok: bool):
+        """触发记录写入器的回调（写入线程内），只有落盘成功的记录才推送"""
+        if not ok or not self._subscribers:
+            return
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for trigger_id, trigger, _ in written:
+            name, tag = self._rule_info(trigger.rule_id)
+            event = {"id": trigger_id, "rule_id": trigger.rule_id, "name": name, "tag": tag,
+                     "symbol": trigger.symbol, "message": trigger.message, "ts": ts}
+            for subscriber in subscribers:
+                if subscriber.filter.matches(event):
+                    subscriber.push(event)
+            self._published += 1
+
+    def subscribe(self, trigger_filter: TriggerFilter) -> Subscriber:
+        subscriber = Subscriber(trigger_filter, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.discard(subscriber)
+                self._dropped += subscriber.dropped
+
+    async def _backfill(self, trigger_filter: TriggerFilter, after: int) -> AsyncIterator[dict]:
+        f = trigger_filter
+        while True:
+            rows = await asyncio.to_thread(get_triggers_after, after, f.symbols, f.rule_ids, f.tags, STREAM_BACKFILL)
+            for row in rows:
+                self._backfilled += 1
+                yield {field: row[field] for field in EVENT_FIELDS}
+            if len(rows) < STREAM_BACKFILL:
+                return
+            after = rows[-1]["id"]
+
+    async def stream(self, trigger_filter: TriggerFilter, last_id: int | None = None) -> AsyncIterator[dict | None]:
+        """按 id 顺序产出触发记录，空闲时产出 None 作为心跳；last_id 不为空时先从数据库续传"""
+        # 先订阅再续传，续传期间的新记录留在缓冲区，按 id 去重
+        subscriber = self.subscribe(trigger_filter)
+        sent = last_id
+        try:
+            if last_id is not None:
+                async for event in self._backfill(trigger_filter, last_id):
+                    sent = event["id"]
+                    yield event
+            while True:
+                events, lagged_from = await subscriber.get(STREAM_HEARTBEAT)
+                if lagged_from is not None:
+                    logger.warning(f"推送订阅者处理过慢，从数据库补齐 id>{sent if sent is not None else lagged_from - 1}")
+                    async for event in self._backfill(trigger_filter, sent if sent is not None else lagged_from - 1):
+                        sent = event["id"]
+                        yield event
+                if not events and lagged_from is None:
+                    yield None
+                for event in events:
+                    if sent is None or event["id"] > sent:
+                        sent = event["id"]
+                        yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    def status(self) -> dict:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "published": self._published,
+            "backfilled": self._backfilled,
+            "dropped": self._dropped + sum(s.dropped for s in subscribers),
+        }
+
+
+# 初始化广播
+broadcaster = TriggerBroadcaster()
@@ -0,0 +1,183 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-19 16:40:17
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-19 16:40:17
+FilePath: /mss_diting/app/diting/trigger_writer.py
+Description: 触发记录异步批量写入
+
+引擎把触发记录放入队列后立即返回，后台线程按条数或时间阈值
+用 executemany 在单个事务中写入触发记录和发件箱记录。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import os, time, queue, sqlite3, threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, List
+from loguru import logger
+from dotenv import load_dotenv
+
+from .models import Trigger
+from .db_sqlite import add_triggers_batch
+from .metrics import TRIGGER_WRITE_SECONDS, TRIGGER_WRITE_ROWS
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+TRIGGER_FLUSH_SIZE = int(os.getenv("TRIGGER_FLUSH_SIZE", "200"))  # 累计条数达到后写入
+TRIGGER_FLUSH_INTERVAL = float(os.getenv("TRIGGER_FLUSH_INTERVAL", "0.2"))  # 最长等待时间，单位秒
+TRIGGER_WRITE_RETRIES = int(os.getenv("TRIGGER_WRITE_RETRIES", "3"))  # 数据库被锁等临时错误的重试次数
+TRIGGER_RETRY_DELAY = float(os.getenv("TRIGGER_RETRY_DELAY", "0.5"))  # 首次重试间隔，之后逐次加倍，单位秒
+
+def _transient(e: Exception) -> bool:
+    # 锁竞争类错误稍后重试即可成功
+    return isinstance(e, sqlite3.OperationalError) and any(k in str(e) for k in ("locked", "busy"))
+
+# ----------------- 触发记录写入器 -----------------
+class TriggerWriter:
+    def __init__(self, flush_size: int = TRIGGER_FLUSH_SIZE, flush_interval: float = TRIGGER_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._cond = threading.Condition()
+        self._submitted = 0     # 已提交的序号
+        self._processed = 0     # 已处理（写入或放弃）的序号
+        self._flushed = 0       # 上次 flush 确认到的序号
+        self._failed = deque(maxlen=1000)  # 写入失败批次的序号区间 (首, 尾)
+        self._committed = 0     # 已写入的条数
+        self._lost = 0          # 放弃写入的条数
+        self._listeners = []    # 写入完成的订阅者，参数为 ([(触发 id, 触发记录, webhook 地址)], 是否成功)
+        self._batches = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+
+    def subscribe(self, listener: Callable[[List[tuple], bool], None]):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[List[tuple], bool], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="trigger-writer", daemon=True)
+            self._thread.start()
+            logger.info("触发记录写入器启动")
+
+    def stop(self, timeout: float = 5):
+        if self._thread is None:
+            return
+        if not self.flush(timeout):
+            logger.warning("触发记录写入器停止前仍有记录未写入")
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("触发记录写入器已停止")
+
+    def submit(self, trigger: Trigger, url: str | None = None, payload: Any = None, delay: float = 0) -> int:
+        """放入写入队列并立即返回序号，可用 wait(序号) 等待落盘"""
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self._submitted += 1
+            seq = self._submitted
+        self._queue.put((seq, trigger, url, payload, delay))
+        return seq
+
+    def wait(self, seq: int, timeout: float | None = None, since: int = 0) -> bool:
+        """等待指定序号及之前的记录处理完毕，(since, seq] 内的记录全部写入成功才返回 True"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._processed >= seq, timeout):
+                return False
+            return not any(first <= seq and last > since for first, last in self._failed)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """等待目前已提交的记录处理完毕，自上次 flush 以来有记录写入失败时返回 False"""
+        with self._cond:
+            since, seq = self._flushed, self._submitted
+        ok = self.wait(seq, timeout, since)
+        with self._cond:
+            if self._processed >= seq:
+                self._flushed = max(self._flushed, seq)
+        return ok
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # 阻塞等待第一条，随后在时间窗口内尽量攒够一批
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch: List[tuple]):
+        start = time.perf_counter()
+        items = [(trigger, url, payload, delay) for _, trigger, url, payload, delay in batch]
+        ids = None
+        for attempt in range(TRIGGER_WRITE_RETRIES + 1):
+            try:
+                ids = add_triggers_batch(items)
+                break
+            except Exception as e:
+                if attempt < TRIGGER_WRITE_RETRIES and _transient(e):
+                    logger.warning(f"触发记录写入遇到临时错误，第 {attempt + 1} 次重试: {e}")
+                    time.sleep(TRIGGER_RETRY_DELAY * 2 ** attempt)
+                    continue
+                # 放弃本批，不阻塞引擎；回调中释放相关规则以便再次触发
+                logger.error(f"触发记录写入失败，放弃 {len(batch)} 条: {e}")
+                self._errors += 1
+                break
+        elapsed = time.perf_counter() - start
+        self._last_flush_ms = elapsed * 1000
+        TRIGGER_WRITE_SECONDS.labels().observe(elapsed)
+        ok = ids is not None
+        if ok:
+            TRIGGER_WRITE_ROWS.labels().inc(len(batch))
+        self._batches += 1
+        with self._cond:
+            if ok:
+                self._committed += len(batch)
+            else:
+                self._failed.append((batch[0][0], batch[-1][0]))
+                self._lost += len(batch)
+            self._processed = batch[-1][0]
+            self._cond.notify_all()
+
+        written = [(trigger_id, item[1], item[2]) for trigger_id, item in zip(ids if ok else [None] * len(batch), batch)]
+        for listener in self._listeners:
+            try:
+                listener(written, ok)
+            except Exception as e:
+                logger.error(f"触发记录写入回调异常: {e}")
+
+    def status(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue": self._queue.qsize(),
+            "committed": self._committed,
+            "lost": self._lost,
+            "batches": self._batches,
+            "errors": self._errors,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+        }
+
+
+# 初始化写入器
+trigger_writer = TriggerWriter()
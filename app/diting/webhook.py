@@ -0,0 +1,239 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-15 10:18:33
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-15 10:18:33
+FilePath: /mss_diting/app/diting/webhook.py
+Description: 异步 Webhook 分发器
+
+引擎只负责入队，分发器在事件循环上用连接池并发投递，不阻塞行情轮询。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import os, time, asyncio, httpx
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import urlsplit
+from loguru import logger
+from dotenv import load_dotenv
+
+from .metrics import WEBHOOK_SECONDS, WEBHOOK_ERRORS
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "5"))  # 单次调用超时，单位秒
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "8"))  # 并发投递数
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # 待投递队列上限
+WEBHOOK_HOST_RATE = float(os.getenv("WEBHOOK_HOST_RATE", "10"))  # 每个主机每秒最多请求数
+WEBHOOK_HOST_BURST = int(os.getenv("WEBHOOK_HOST_BURST", "20"))  # 每个主机允许的突发请求数
+
+# ----------------- 令牌桶限速 -----------------
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate) if self.rate > 0 else 0.0
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.wait_time())
+
+
+# ----------------- 分发器 -----------------
+DeliveryCallback = Callable[[bool, str | None, list[bool] | None], None]
+
+def parse_batch_results(body: Any, size: int) -> list[bool] | None:
+    # 批量投递的逐条结果：[true, false, ...] / [{"ok": true}, ...] / [{"status": 200}, ...]
+    if isinstance(body, dict):
+        body = body.get("results")
+    if not isinstance(body, list) or len(body) != size:
+        return None
+    results = []
+    for item in body:
+        if isinstance(item, dict):
+            if "ok" in item:
+                item = item["ok"]
+            elif "status" in item:
+                item = item["status"] in (200, "ok", "success")
+        results.append(bool(item))
+    return results
+
+
+class WebhookJob:
+    __slots__ = ("url", "payload", "callback", "batch", "enqueued")
+
+    def __init__(self, url: str, payload: Any, callback: DeliveryCallback | None, batch: int | None = None):
+        self.url = url
+        self.payload = payload
+        self.callback = callback
+        self.batch = batch  # 批量投递的条数，单条投递为 None
+        self.enqueued = time.monotonic()
+
+
+class WebhookDispatcher:
+    def __init__(self, concurrency: int = WEBHOOK_CONCURRENCY, queue_size: int = WEBHOOK_QUEUE_SIZE,
+                 host_rate: float = WEBHOOK_HOST_RATE, host_burst: int = WEBHOOK_HOST_BURST,
+                 timeout: float = WEBHOOK_TIMEOUT):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.timeout = timeout
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._workers = []
+        self._buckets = dict()  # host -> TokenBucket
+        self._latency = deque(maxlen=2048)  # 最近的投递耗时，单位毫秒
+        self._in_flight = 0
+        self._sent = 0
+        self._failed = 0
+        self._dropped = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.loop is not None:
+            return
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency * 2,
+                                max_keepalive_connections=self.concurrency))
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Webhook 分发器启动，并发 {self.concurrency} 队列上限 {self.queue_size}")
+
+    async def aclose(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        self.loop = None
+        logger.info("Webhook 分发器已停止")
+
+    def submit(self, url: str, payload: Any, callback: DeliveryCallback | None = None, batch: int | None = None) -> bool:
+        """提交投递任务，立即返回；结果通过 callback(是否成功, 错误信息, 逐条结果) 通知，队列已满时丢弃并回调失败
+
+        batch 不为空时 payload 为 JSON 数组，响应体若为等长数组则解析为逐条结果
+        """
+        job = WebhookJob(url, payload, callback, batch)
+        if self.loop is None:
+            logger.error(f"Webhook 分发器未启动，丢弃: {url}")
+            self._drop(job)
+            return False
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self.loop:
+            # 来自其他线程的提交转交给分发器所在的事件循环
+            self.loop.call_soon_threadsafe(self._enqueue, job)
+            return True
+        return self._enqueue(job)
+
+    def _enqueue(self, job: WebhookJob) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            logger.error(f"Webhook 队列已满，丢弃: {job.url}")
+            self._drop(job)
+            return False
+
+    def _drop(self, job: WebhookJob):
+        self._dropped += 1
+        if job.callback:
+            job.callback(False, "dropped", None)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._bucket(urlsplit(job.url).netloc).acquire()
+                ok, error, items = await self._deliver(job)
+            finally:
+                self._queue.task_done()
+            if job.callback:
+                try:
+                    job.callback(ok, error, items)
+                except Exception as e:
+                    logger.error(f"Webhook 回调异常: {e}")
+
+    async def _deliver(self, job: WebhookJob) -> tuple[bool, str | None, list[bool] | None]:
+        host = urlsplit(job.url).netloc
+        self._in_flight += 1
+        try:
+            response = await self._client.post(job.url, json=job.payload)
+            if response.status_code == 200:
+                logger.info(f"Webhook 调用成功: {job.url}")
+                self._sent += 1
+                items = None
+                if job.batch is not None:
+                    try:
+                        items = parse_batch_results(response.json(), job.batch)
+                    except ValueError:
+                        pass
+                return True, None, items
+            logger.error(f"Webhook 调用失败: {job.url} 状态码: {response.status_code}")
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            logger.error(f"Webhook 调用异常: {job.url} {e!r}")
+            error = repr(e)
+        finally:
+            self._in_flight -= 1
+            elapsed = time.monotonic() - job.enqueued
+            self._latency.append(elapsed * 1000)
+            WEBHOOK_SECONDS.labels(host).observe(elapsed)
+        self._failed += 1
+        WEBHOOK_ERRORS.labels(host).inc()
+        return False, error, None
+
+    def status(self) -> dict:
+        latency = sorted(self._latency)
+        def percentile(p: float) -> float | None:
+            if not latency:
+                return None
+            return round(latency[min(len(latency) - 1, int(len(latency) * p))], 2)
+        return {
+            "running": self.loop is not None,
+            "queue": self._queue.qsize() if self._queue else 0,
+            "in_flight": self._in_flight,
+            "sent": self._sent,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+        }
+
+
+# 初始化分发器
+dispatcher = WebhookDispatcher()
@@ -0,0 +1,227 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-16 15:02:51
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-16 15:02:51
+FilePath: /mss_diting/app/diting/webhook_outbox.py
+Description: 持久化 Webhook 发件箱
+
+触发记录与待投递的 webhook 同事务写入 SQLite，后台任务持续把到期记录交给分发器，
+分发器回调后再落库结果，慢地址不阻塞其他记录的投递；
+失败按指数退避重试，超过最大次数进入死信，服务重启后继续投递。
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
+'''
+
+import os, json, time, asyncio
+from pathlib import Path
+from typing import Callable
+from loguru import logger
+from dotenv import load_dotenv
+
+from .db_sqlite import get_outbox_due, get_outbox_fresh, mark_outbox_done, mark_outbox_failed, defer_outbox_url, count_outbox
+from .webhook import WebhookDispatcher, dispatcher
+
+
+# 加载环境变量
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".." / ".env")
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "100"))  # 每批投递数量
+OUTBOX_INFLIGHT = int(os.getenv("OUTBOX_INFLIGHT", str(OUTBOX_BATCH * 4)))  # 同时投递中的最大记录数
+OUTBOX_POLL = float(os.getenv("OUTBOX_POLL", "1"))  # 空闲时轮询间隔，单位秒
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))  # 最大投递次数，超过进入死信
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))  # 首次重试间隔，单位秒
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "1800"))  # 最大重试间隔，单位秒
+# 合并投递的地址，逗号分隔，* 表示全部地址
+WEBHOOK_BATCH_URLS = {url.strip() for url in os.getenv("WEBHOOK_BATCH_URLS", "").split(",") if url.strip()}
+WEBHOOK_BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", "0"))  # 合并窗口，单位秒，0 表示按轮询周期合并
+WEBHOOK_BATCH_MAX = int(os.getenv("WEBHOOK_BATCH_MAX", "100"))  # 单次合并的最大条数
+
+def backoff_delay(attempts: int) -> float:
+    # 第 n 次失败后的等待时间：base * 2^(n-1)，不超过上限
+    return min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** max(0, attempts - 1))
+
+# ----------------- 发件箱投递 -----------------
+class WebhookOutbox:
+    def __init__(self, dispatcher: WebhookDispatcher):
+        self.dispatcher = dispatcher
+        self._task = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._listeners = []  # 投递最终结果的订阅者 (rule_id, 是否成功)
+        self._inflight = set()  # 已交给分发器、结果尚未落库的记录 id
+        self._finished = []  # 分发器已回调、待落库的 (地址, 记录, 是否成功, 错误信息, 逐条结果)
+        self._delivered = 0
+        self._retried = 0
+        self._dead = 0
+
+    def subscribe(self, listener: Callable[[int, bool], None]):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[int, bool], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._task is None:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+            logger.info("Webhook 发件箱启动")
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._loop = None
+            # 投递中的记录仍为 pending，重启后重新投递
+            self._inflight.clear()
+            self._finished.clear()
+            logger.info("Webhook 发件箱已停止")
+
+    @staticmethod
+    def is_batch_url(url: str) -> bool:
+        return "*" in WEBHOOK_BATCH_URLS or url in WEBHOOK_BATCH_URLS
+
+    def delay_for(self, url: str) -> float:
+        """新记录的投递延迟，合并投递的地址等待一个合并窗口"""
+        return WEBHOOK_BATCH_WINDOW if self.is_batch_url(url) else 0
+
+    def wake(self):
+        """有新记录写入时唤醒投递任务（需在事件循环线程内调用）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_triggers_written(self, written: list, ok: bool):
+        """触发记录写入器的回调（写入线程内），新记录落盘后唤醒投递任务"""
+        if ok and self._loop is not None:
+            self._loop.call_soon_threadsafe(self.wake)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.settle()
+                await self.drain_once()
+            except Exception as e:
+                logger.warning(f"Webhook 发件箱异常: {e}")
+            # 等待投递结果、新记录唤醒或定时轮询
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _group(self, rows: list) -> list[tuple[str, list]]:
+        # 合并投递的地址按地址分组，并带上同地址窗口内尚未到期的新记录
+        groups, batched, seen = [], dict(), {row["id"] for row in rows} | self._inflight
+        for row in rows:
+            if not self.is_batch_url(row["url"]):
+                groups.append((row["url"], [row]))
+            elif row["url"] in batched:
+                batched[row["url"]].append(row)
+            else:
+                batched[row["url"]] = [row]
+                groups.append((row["url"], batched[row["url"]]))
+        for url, items in batched.items():
+            if len(items) < WEBHOOK_BATCH_MAX:
+                fresh = await asyncio.to_thread(get_outbox_fresh, url, WEBHOOK_BATCH_MAX)
+                items.extend(row for row in fresh if row["id"] not in seen)
+            del items[WEBHOOK_BATCH_MAX:]
+        return groups
+
+    async def drain_once(self) -> int:
+        """把到期记录交给分发器后立即返回，不等待投递结果；返回本次交出的记录数"""
+        capacity = OUTBOX_INFLIGHT - len(self._inflight)
+        if capacity <= 0:
+            return 0
+        rows = await asyncio.to_thread(get_outbox_due, time.time(), min(OUTBOX_BATCH, capacity) + len(self._inflight))
+        rows = [row for row in rows if row["id"] not in self._inflight][:min(OUTBOX_BATCH, capacity)]
+        if not rows:
+            return 0
+        groups = await self._group(rows)
+
+        count = 0
+        for url, items in groups:
+            self._inflight.update(row["id"] for row in items)
+            count += len(items)
+            def done(ok: bool, error: str | None, results: list[bool] | None, url=url, items=items):
+                # 在分发器所在的事件循环中回调，结果交给投递任务落库
+                self._finished.append((url, items, ok, error, results))
+                self.wake()
+            if self.is_batch_url(url):
+                payload = [json.loads(row["payload"]) for row in items]
+                self.dispatcher.submit(url, payload, done, batch=len(items))
+            else:
+                self.dispatcher.submit(url, json.loads(items[0]["payload"]), done)
+        return count
+
+    async def settle(self) -> int:
+        """落库已回调的投递结果，返回处理的记录数"""
+        if not self._finished:
+            return 0
+        finished, self._finished = self._finished, []
+
+        now = time.time()
+        delivered, failures, failed_urls, settled = [], [], dict(), []
+        for url, items, ok, error, results in finished:
+            for i, row in enumerate(items):
+                settled.append(row["id"])
+                # 批量投递整体成功时，按逐条结果判断每条记录
+                item_ok = ok and (results is None or results[i])
+                if item_ok:
+                    delivered.append(row["id"])
+                    self._notify(row["rule_id"], True)
+                    continue
+                item_error = error or "batch item rejected"
+                attempts = row["attempts"] + 1
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    logger.error(f"Webhook 投递放弃（死信）: #{row['id']} {url} {item_error}")
+                    failures.append((row["id"], item_error, None))
+                    self._dead += 1
+                    self._notify(row["rule_id"], False)
+                else:
+                    retry_at = now + backoff_delay(attempts)
+                    failures.append((row["id"], item_error, retry_at))
+                    if not ok:
+                        failed_urls[url] = max(failed_urls.get(url, 0), retry_at)
+                    self._retried += 1
+        self._delivered += len(delivered)
+
+        try:
+            if delivered:
+                await asyncio.to_thread(mark_outbox_done, delivered)
+            if failures:
+                await asyncio.to_thread(mark_outbox_failed, failures)
+            for url, until in failed_urls.items():
+                await asyncio.to_thread(defer_outbox_url, url, until)
+        finally:
+            # 落库后才允许重新领取，落库失败的记录保持 pending，稍后重新投递
+            self._inflight.difference_update(settled)
+        return len(settled)
+
+    def _notify(self, rule_id: int, ok: bool):
+        for listener in self._listeners:
+            try:
+                listener(rule_id, ok)
+            except Exception as e:
+                logger.error(f"Webhook 发件箱回调异常: {e}")
+
+    def status(self) -> dict:
+        try:
+            counts = count_outbox()
+        except Exception:
+            counts = dict()
+        return {
+            "running": self._task is not None,
+            "pending": counts.get("pending", 0),
+            "in_flight": len(self._inflight),
+            "dead": counts.get("dead", 0),
+            "delivered": self._delivered,
+            "retried": self._retried,
+        }
+
+
+# 初始化发件箱
+outbox = WebhookOutbox(dispatcher)
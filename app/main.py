@@ -9,15 +9,16 @@ Description:  diting cli entry point
 Copyright (c) 2025 by ${git_name_email}, All Rights Reserved. 
 '''
 
-import os, click, uvicorn
+import os, sys, json, click, uvicorn
 from pathlib import Path
 from loguru import logger
 from dotenv import load_dotenv
-from diting.db_sqlite import init_db
+from diting.db_sqlite import init_db, close_db
 from diting.mode_api import api as fastapi
 from diting.mode_mcp import mcp as mcpserver
 from diting.quote_manager import manager
 from diting.quote_futu import FutuEngine
+from diting.quote_replay import ReplayEngine, ReplaySink
 
 # 加载环境变量
 BASE_DIR = Path(__file__).resolve().parent
@@ -27,18 +28,34 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "21000"))
 
+LOG_FILE_OPTIONS = dict(rotation="50 MB", retention=5)
+
 # 记录日志到文件，日志文件超过500MB自动轮转
-logger.add(LOG_FILE, level=LOG_LEVEL, rotation="50 MB", retention=5)
+logger.add(LOG_FILE, level=LOG_LEVEL, **LOG_FILE_OPTIONS)
 
 
 @click.command()
 # @click.argument('filename')
 @click.option('--api', is_flag=True, help='启动API服务')
 @click.option('--mcp', is_flag=True, help='启动MCP服务')
+@click.option('--replay', multiple=True, type=click.Path(exists=True), help='回放行情文件（CSV/Parquet/录制文件），可多次指定')
+@click.option('--sink', type=click.Path(), default=None, help='回放触发结果输出的 JSONL 文件')
 # def cli(filename, api, mcp):
-def cli(api, mcp):
+def cli(api, mcp, replay, sink):
     # 初始化数据库
     init_db()
+
+    if replay:
+        # 离线回放：不启动行情引擎与 webhook，触发结果写入本地
+        click.echo(f'回放模式开启')
+        # 逐条求值的调试日志会主导回放耗时，回放只输出 INFO 以上（日志文件同样保留）
+        logger.remove()
+        logger.add(sys.stderr, level="INFO")
+        logger.add(LOG_FILE, level=max(LOG_LEVEL, "INFO", key=lambda name: logger.level(name).no), **LOG_FILE_OPTIONS)
+        stats = ReplayEngine(ReplaySink(sink)).replay(list(replay))
+        click.echo(json.dumps(stats, ensure_ascii=False, indent=2))
+        close_db()
+        return
     
     # 注册多个行情引擎
     manager.register(FutuEngine())
@@ -59,6 +76,7 @@ def cli(api, mcp):
         
     # 关闭所有
     manager.stop_all()
+    close_db()
 
 if __name__ == '__main__':
     cli()
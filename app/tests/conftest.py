@@ -0,0 +1,61 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-28 09:20:41
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-28 09:20:41
+FilePath: /mss_diting/app/tests/conftest.py
+Description: 测试公共夹具
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+import pytest
+
+from diting import db_sqlite
+from diting.models import Rule
+from diting.trigger_writer import trigger_writer
+
+
+def make_rule(name: str, symbol: str = "HK.00700", brokers: str = "futu",
+              rule_json: str = '{"field":"close","op":">","value":1}', **fields) -> Rule:
+    return Rule(name=name, symbol=symbol, brokers=brokers, rule_json=rule_json,
+                webhook_url=fields.pop("webhook_url", ""), tag=fields.pop("tag", "test"), **fields)
+
+
+def random_condition(rng: random.Random, fields=("open", "high", "low", "close", "volume", "amplitude", "pct_change")) -> dict:
+    # 取值落在行情取值范围内，使条件成立与否各占一部分
+    field = rng.choice(fields)
+    value = rng.randint(0, 2000) if field == "volume" else round(rng.uniform(-5, 20), 1)
+    return {"field": field, "op": rng.choice([">", "<", ">=", "<=", "=", "!="]), "value": value}
+
+
+def random_rule(rng: random.Random, depth: int = 3, **kwargs) -> dict:
+    """随机规则树，包含 AND / OR / NOT 与空的逻辑节点"""
+    if depth == 0 or rng.random() < 0.3:
+        return random_condition(rng, **kwargs)
+    logic = rng.choice(["AND", "OR", "NOT"])
+    if logic == "NOT":
+        return {"logic": "NOT", "conditions": [random_rule(rng, depth - 1, **kwargs)]}
+    return {"logic": logic, "conditions": [random_rule(rng, depth - 1, **kwargs) for _ in range(rng.randint(0, 4))]}
+
+
+def random_snapshot(rng: random.Random, symbol: str = "HK.00700") -> dict:
+    # 价格取一位小数，使 = / != 条件也能成立
+    low = round(rng.uniform(0, 10), 1)
+    high = round(low + rng.uniform(0, 10), 1)
+    return {"symbol": symbol, "open": round(rng.uniform(low, high), 1), "high": high, "low": low,
+            "close": round(rng.uniform(low, high), 1), "pct_chg": round(rng.uniform(-5, 5), 1),
+            "pct_amp": round(rng.uniform(0, 20), 1), "volume": rng.randint(0, 2000)}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """每个测试使用独立的临时数据库"""
+    monkeypatch.setattr(db_sqlite, "DB_FILE", str(tmp_path / "diting.db"))
+    db_sqlite.close_db()
+    db_sqlite.init_db()
+    yield
+    # 写入线程持有线程内长连接，先停止再关闭连接，下次提交时重新启动
+    trigger_writer.stop()
+    db_sqlite.close_db()
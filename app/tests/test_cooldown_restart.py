@@ -0,0 +1,70 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-26 10:05:12
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-26 10:05:12
+FilePath: /mss_diting/app/tests/test_cooldown_restart.py
+Description: 分片模式下边沿触发状态跨重启保持
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import os, sys, time, sqlite3, subprocess
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# 每次运行都是独立进程：启动分片模式的模拟引擎，运行数秒后停止
+RUN = '''
+import time
+from loguru import logger
+logger.remove()
+from diting import db_sqlite
+from diting.quote_manager import manager
+from diting.quote_sim import SimulatedEngine
+db_sqlite.init_db()
+manager.register(SimulatedEngine(rate=5))
+manager.start_all()
+time.sleep(4)
+manager.stop_all()
+'''
+
+def start_engine(db_file: Path) -> subprocess.Popen:
+    env = dict(os.environ, DB_FILE=str(db_file), ENGINE_SHARDS="2", QUOTE_FANIN="0",
+               QUOTE_INTERVAL="1", COOLING_CYCLE="1")
+    return subprocess.Popen([sys.executable, "-c", RUN], cwd=APP_DIR, env=env)
+
+
+def query(db_file: Path, sql: str) -> list:
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_edge_state_survives_restart_in_shard_mode(tmp_path):
+    db_file = tmp_path / "diting.db"
+    subprocess.run([sys.executable, "-c", "from diting import db_sqlite; db_sqlite.init_db()"],
+                   cwd=APP_DIR, env=dict(os.environ, DB_FILE=str(db_file)), check=True)
+    with sqlite3.connect(db_file) as conn:
+        # 条件始终成立：首次求值即上升沿，之后保持成立不应再触发
+        conn.execute("""INSERT INTO rules(name,symbol,brokers,rule_json,webhook_url,tag,cooldown,trigger_mode)
+            VALUES('edge','SIM.00000','sim','{"field":"close","op":">","value":0}','','test',0,'edge')""")
+
+    # 运行期间每次快照后边沿状态都应保持为 1，进程随时退出重启都不丢失
+    proc = start_engine(db_file)
+    states = []
+    while proc.poll() is None:
+        if query(db_file, "SELECT COUNT(*) FROM triggers")[0][0]:
+            states.append(query(db_file, "SELECT last_state FROM rule_state"))
+        time.sleep(0.1)
+    assert proc.returncode == 0
+    assert query(db_file, "SELECT COUNT(*) FROM triggers") == [(1,)]
+    # 分片首次快照后，状态不应再被主进程引擎覆盖
+    assert [(1,)] in states
+    assert all(state == [(1,)] for state in states[states.index([(1,)]):])
+
+    proc = start_engine(db_file)
+    assert proc.wait(timeout=60) == 0
+    assert query(db_file, "SELECT COUNT(*) FROM triggers") == [(1,)]
+    assert query(db_file, "SELECT last_state FROM rule_state") == [(1,)]
@@ -0,0 +1,43 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 14:48:05
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 14:48:05
+FilePath: /mss_diting/app/tests/test_db_sqlite.py
+Description: 每个线程复用一个 WAL 模式的长连接
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import threading
+
+from diting import db_sqlite
+from diting.db_sqlite import add_rule, get_conn, get_rule, close_db
+from conftest import make_rule
+
+
+def test_connection_is_reused_per_thread(db):
+    conn = get_conn()
+    assert get_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(get_conn()))
+    thread.start()
+    thread.join()
+    assert others[0] is not conn
+    assert conn in db_sqlite._conns and others[0] in db_sqlite._conns
+
+    close_db()
+    assert not db_sqlite._conns and get_conn() is not conn
+
+
+def test_writes_are_visible_to_other_threads(db):
+    rule_id = add_rule(make_rule("shared"))
+    names = []
+    thread = threading.Thread(target=lambda: names.append(get_rule(rule_id)["name"]))
+    thread.start()
+    thread.join()
+    assert names == ["shared"]
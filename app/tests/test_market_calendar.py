@@ -0,0 +1,58 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 16:45:19
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 16:45:19
+FilePath: /mss_diting/app/tests/test_market_calendar.py
+Description: 交易时段判断、下次开盘时间与市场状态缓存
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from diting.market_calendar import MarketCalendar, MarketStateCache, group_by_market
+
+HK = ZoneInfo("Asia/Hong_Kong")
+NY = ZoneInfo("America/New_York")
+
+
+def test_sessions_include_lunch_break_and_weekend():
+    calendar = MarketCalendar()
+    # 2025-09-26 为周五
+    assert calendar.is_open("HK", datetime(2025, 9, 26, 10, 0, tzinfo=HK))
+    assert not calendar.is_open("HK", datetime(2025, 9, 26, 12, 30, tzinfo=HK))
+    assert not calendar.is_open("HK", datetime(2025, 9, 26, 16, 0, tzinfo=HK))
+    assert not calendar.is_open("HK", datetime(2025, 9, 27, 10, 0, tzinfo=HK))
+    # 按市场本地时区判断，未知市场视为开市
+    assert calendar.is_open("US", datetime(2025, 9, 26, 22, 0, tzinfo=HK))
+    assert calendar.is_open("SIM", datetime(2025, 9, 27, 3, 0, tzinfo=HK))
+
+
+def test_next_open_and_wait():
+    calendar = MarketCalendar()
+    assert calendar.next_open("HK", datetime(2025, 9, 26, 12, 30, tzinfo=HK)) == datetime(2025, 9, 26, 13, 0, tzinfo=HK)
+    # 周五收盘后顺延到下周一
+    assert calendar.next_open("HK", datetime(2025, 9, 26, 16, 30, tzinfo=HK)) == datetime(2025, 9, 29, 9, 30, tzinfo=HK)
+    assert calendar.next_open("HK", datetime(2025, 9, 26, 10, 0, tzinfo=HK)) is None
+
+    now = datetime(2025, 9, 26, 8, 0, tzinfo=NY)
+    assert calendar.seconds_until_open(["HK", "US"], now) == 90 * 60
+    assert calendar.seconds_until_open(["US"], datetime(2025, 9, 26, 10, 0, tzinfo=NY)) == 0
+
+
+def test_state_cache_expires():
+    cache = MarketStateCache(ttl=0.05)
+    assert cache.get("HK") is None
+    cache.set("HK", False)
+    assert cache.get("HK") is False
+    time.sleep(0.06)
+    assert cache.get("HK") is None
+
+
+def test_group_by_market():
+    assert group_by_market(["HK.00700", "us.AAPL", "HK.09988"]) == {"HK": ["HK.00700", "HK.09988"], "US": ["us.AAPL"]}
@@ -0,0 +1,53 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 18:25:33
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 18:25:33
+FilePath: /mss_diting/app/tests/test_metrics.py
+Description: 直方图分桶、分位数估算与 Prometheus 文本输出
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import pytest
+from fastapi.testclient import TestClient
+
+from diting.metrics import Registry, TRIGGERS_FIRED
+from diting.mode_api import api
+
+
+def test_histogram_render_and_quantile():
+    registry = Registry()
+    family = registry.histogram("test_seconds", "测试耗时", ("engine",), buckets=(1, 2, 4))
+    child = family.labels("SIM")
+    assert family.labels("SIM") is child
+    for value in (0.5, 1.5, 1.5, 3):
+        child.observe(value)
+    child.observe(10, n=2)  # 批量记入落在 +Inf 桶
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP test_seconds 测试耗时", "# TYPE test_seconds histogram"]
+    assert lines[2:] == ['test_seconds_bucket{engine="SIM",le="1"} 1', 'test_seconds_bucket{engine="SIM",le="2"} 3',
+                         'test_seconds_bucket{engine="SIM",le="4"} 4', 'test_seconds_bucket{engine="SIM",le="+Inf"} 6',
+                         'test_seconds_sum{engine="SIM"} 26.5', 'test_seconds_count{engine="SIM"} 6']
+    # 第 3 个落在 (1, 2] 桶的第 2 个位置
+    assert child.quantile(0.5) == pytest.approx(2)
+    assert child.quantile(0.99) == 4
+    assert registry.summary()["test_seconds"]["SIM"]["count"] == 6
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = registry.counter("test_total", "测试次数").labels()
+    counter.inc(3)
+    assert registry.render().splitlines()[-1] == "test_total 3"
+    assert registry.counter("test_total", "测试次数").labels() is counter
+
+
+def test_metrics_endpoint():
+    TRIGGERS_FIRED.labels().inc()
+    response = TestClient(api).get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE diting_triggers_fired_total counter" in response.text
@@ -0,0 +1,98 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-26 15:32:40
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-26 15:32:40
+FilePath: /mss_diting/app/tests/test_mode_api.py
+Description: 规则列表接口的游标分页与死信重投
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import pytest
+from fastapi.testclient import TestClient
+
+from diting import db_sqlite
+from diting.mode_api import api, rules_cache
+from diting.models import Trigger
+from conftest import make_rule
+
+
+@pytest.fixture
+def client(db):
+    rules_cache._bodies.clear()
+    for i in range(7):
+        db_sqlite.add_rule(make_rule(f"rule-{i}"))
+    return TestClient(api)
+
+
+def test_rules_cursor_pages(client):
+    first = client.get("/rules", params={"limit": 3})
+    assert [r["name"] for r in first.json()] == ["rule-0", "rule-1", "rule-2"]
+    second = client.get("/rules", params={"limit": 3, "cursor": first.headers["x-next-cursor"]})
+    assert [r["name"] for r in second.json()] == ["rule-3", "rule-4", "rule-5"]
+
+
+def test_rules_cursor_without_limit_streams_rest(client):
+    # 不带 limit 时游标仍然生效，返回游标之后的全部规则
+    first = client.get("/rules", params={"limit": 3})
+    rest = client.get("/rules", params={"cursor": first.headers["x-next-cursor"]})
+    assert rest.status_code == 200
+    assert [r["name"] for r in rest.json()] == ["rule-3", "rule-4", "rule-5", "rule-6"]
+    assert "x-next-cursor" not in rest.headers
+
+
+def test_dead_outbox_list_and_retry(client):
+    trigger_id = db_sqlite.add_triggers_batch([(Trigger(rule_id=1, symbol="HK.00700", message="m"), "http://x", {}, 0)])[0]
+    outbox_id = db_sqlite.get_outbox("pending")[0]["id"]
+    db_sqlite.mark_outbox_failed([(outbox_id, "timeout", None)])
+
+    dead = client.get("/outbox/dead").json()
+    assert [(row["id"], row["trigger_id"], row["last_error"]) for row in dead] == [(outbox_id, trigger_id, "timeout")]
+    assert client.post(f"/outbox/{outbox_id}/retry").status_code == 200
+    assert client.get("/outbox/dead").json() == []
+    assert db_sqlite.count_outbox() == {"pending": 1}
+    # 已重新排队的记录不是死信
+    assert client.post(f"/outbox/{outbox_id}/retry").status_code == 404
+
+
+def test_rules_exact_limit_has_no_next_page(client):
+    full = client.get("/rules", params={"limit": 7})
+    assert len(full.json()) == 7 and "x-next-cursor" not in full.headers
+    first = client.get("/rules", params={"limit": 6})
+    last = client.get("/rules", params={"limit": 6, "cursor": first.headers["x-next-cursor"]})
+    assert [r["name"] for r in last.json()] == ["rule-6"] and "x-next-cursor" not in last.headers
+    assert client.get("/rules", params={"limit": 6, "cursor": "bm90LWpzb24"}).status_code == 400
+
+
+def test_rules_etag_follows_rule_changes(client):
+    first = client.get("/rules", params={"limit": 3})
+    etag = first.headers["etag"]
+    assert client.get("/rules", params={"limit": 3}, headers={"If-None-Match": etag}).status_code == 304
+    db_sqlite.update_rule(1, make_rule("renamed"))
+    changed = client.get("/rules", params={"limit": 3}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()[0]["name"] == "renamed"
+
+
+def test_triggers_cursor_pages_through_equal_ts(client):
+    # 同一事务写入的记录 ts 相同，按 (ts, id) 分页既不重复也不遗漏
+    items = [(Trigger(rule_id=1, symbol="HK.00700" if i % 2 else "HK.09988", message=f"m{i}"), None, None, 0)
+             for i in range(5)]
+    db_sqlite.add_triggers_batch(items)
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        page = client.get("/triggers", params=params)
+        ids.extend(row["id"] for row in page.json())
+        cursor = page.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert ids == [5, 4, 3, 2, 1]
+
+    symbol = client.get("/triggers/symbol/HK.00700", params={"limit": 1})
+    rest = client.get("/triggers/symbol/HK.00700", params={"limit": 1, "cursor": symbol.headers["x-next-cursor"]})
+    assert [row["id"] for row in symbol.json() + rest.json()] == [4, 2]
+    assert "x-next-cursor" not in rest.headers
+    assert client.get("/triggers", params={"until": "2000-01-01T00:00:00+08:00"}).json() == []
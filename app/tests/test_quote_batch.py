@@ -0,0 +1,60 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 16:21:08
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 16:21:08
+FilePath: /mss_diting/app/tests/test_quote_batch.py
+Description: DataFrame 整列转换与逐行构造 QuoteOHLC 结果一致
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+import numpy as np
+import pandas as pd
+import pytest
+
+from diting.models import QuoteOHLC
+from diting.quote_batch import QuoteBatch
+
+
+def quote_frame(rng: random.Random, size: int) -> pd.DataFrame:
+    rows = []
+    for i in range(size):
+        low = rng.uniform(1, 100)
+        high = low + rng.uniform(0, 10)
+        rows.append({"code": f"HK.{i:05d}", "last_price": rng.uniform(low, high), "open_price": rng.uniform(low, high),
+                     "high_price": high, "low_price": low, "prev_close_price": rng.uniform(low, high),
+                     "volume": rng.randint(0, 10 ** 9)})
+    return pd.DataFrame(rows)
+
+
+def test_from_dataframe_matches_per_row_models():
+    data = quote_frame(random.Random(13), 50)
+    # 原先逐行构造 QuoteOHLC 的转换方式
+    expected = [QuoteOHLC(symbol=row["code"], open=row["open_price"], high=row["high_price"], low=row["low_price"],
+                          close=row["last_price"], pct_chg=row["last_price"] / row["prev_close_price"] * 100 - 100,
+                          pct_amp=row["high_price"] / row["low_price"] * 100 - 100, volume=row["volume"]).model_dump()
+                for _, row in data.iterrows()]
+    batch = QuoteBatch.from_dataframe(data)
+    for got, want in zip(batch.snapshots(), expected):
+        assert got == pytest.approx(want)
+    assert batch.snapshot(7) == list(batch.snapshots())[7]
+    assert batch.index_of("HK.00007") == 7 and batch.index_of("HK.99999") == -1
+
+
+def test_from_dataframe_zero_denominator():
+    data = quote_frame(random.Random(14), 2)
+    data.loc[0, "prev_close_price"] = 0
+    data.loc[1, "low_price"] = np.nan
+    batch = QuoteBatch.from_dataframe(data)
+    assert batch.columns["pct_chg"][0] == 0 and batch.columns["pct_amp"][1] == 0
+
+
+def test_take_keeps_rows_aligned():
+    batch = QuoteBatch.from_dataframe(quote_frame(random.Random(15), 10))
+    part = batch.take(np.array([8, 2]))
+    assert part.symbols == ["HK.00008", "HK.00002"]
+    assert part.snapshot(0) == batch.snapshot(8) and part.snapshot(1) == batch.snapshot(2)
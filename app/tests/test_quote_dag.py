@@ -0,0 +1,42 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 11:05:37
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 11:05:37
+FilePath: /mss_diting/app/tests/test_quote_dag.py
+Description: 规则 DAG 去重后与逐条求值一致
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+
+from diting.quote_dag import RuleDag, merge_dag_stats
+from diting.quote_rule import eval_rule
+from conftest import random_rule, random_snapshot
+
+
+def test_dag_matches_eval_rule():
+    rng = random.Random(4)
+    dag = RuleDag()
+    # 字段较少时公共子表达式更多
+    rules = [random_rule(rng, fields=("close", "pct_change")) for _ in range(300)]
+    funcs = [dag.add(rule) for rule in rules]
+    assert len(dag) < dag.total
+    for _ in range(50):
+        snapshot = random_snapshot(rng)
+        for rule, func in zip(rules, funcs):
+            assert func(snapshot) == eval_rule(rule, snapshot), rule
+
+
+def test_dag_merges_reordered_conditions():
+    dag = RuleDag()
+    a = {"field": "close", "op": ">", "value": 1}
+    b = {"field": "amplitude", "op": "<", "value": 5}
+    dag.add({"logic": "AND", "conditions": [a, b]})
+    dag.add({"logic": "and", "conditions": [b, {"field": "pct_amp", "op": "<", "value": 5}, a]})
+    assert len(dag) == 3
+    stats = merge_dag_stats([dag, RuleDag()])
+    assert stats == {"nodes_total": 7, "nodes_distinct": 3, "dedup_ratio": 0.5714}
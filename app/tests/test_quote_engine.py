@@ -0,0 +1,93 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-28 09:32:17
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-28 09:32:17
+FilePath: /mss_diting/app/tests/test_quote_engine.py
+Description: 引擎触发、待定与冷却状态
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio
+import multiprocessing as mp
+from loguru import logger
+
+from diting import db_sqlite
+from diting.quote_shard import ShardEngine, ShardPool
+from diting.quote_sim import SimulatedEngine
+from conftest import make_rule
+
+
+def count_triggers() -> int:
+    return db_sqlite.get_conn().execute("SELECT COUNT(*) FROM triggers").fetchone()[0]
+
+
+def test_rule_without_webhook_cools_down_and_fires_again(db):
+    # 没有 webhook 的规则不会有投递结果，写入成功后应直接进入冷却，冷却结束后再次触发
+    rule_id = db_sqlite.add_rule(make_rule("no-url", symbol="SIM.00000", brokers="sim",
+                                           rule_json='{"field":"close","op":">","value":0}', cooldown=1))
+
+    async def run():
+        engine = SimulatedEngine(rate=0)
+        engine.start(asyncio.get_running_loop())
+        try:
+            rule = engine._rules_by_id[rule_id]
+            engine.tick()
+            assert rule["_pending"]
+            assert await asyncio.to_thread(engine.trigger_writer.flush, 5)
+            await asyncio.sleep(0.05)  # 写入回调经 call_soon_threadsafe 回到事件循环
+            assert not rule["_pending"] and rule["_invoked"]
+
+            engine.tick()  # 冷却中不再触发
+            await asyncio.sleep(1.1)
+            engine._expire_cooldowns()
+            assert not rule["_invoked"]
+            engine.tick()
+            assert await asyncio.to_thread(engine.trigger_writer.flush, 5)
+        finally:
+            engine.stop()
+
+    asyncio.run(run())
+    assert count_triggers() == 2
+
+
+def test_shards_filter_rules_by_engine_broker(db):
+    # 分片加载全部规则，不经汇聚层时也只对本券商行情求值限定了其他券商的规则
+    for name, brokers in (("futu-only", "futu"), ("ib-only", "ib"), ("any", "")):
+        db_sqlite.add_rule(make_rule(name, brokers=brokers, rule_json='{"field":"close","op":">","value":0}'))
+    parent, child = mp.Pipe()
+    pool = ShardPool(1)
+    pool._conns = [parent]
+    shard = ShardEngine(0, 1, child)
+    shard._load_symbols_rules()
+    engine = SimulatedEngine("FUTU", rate=0)
+    engine.shards = pool
+    engine._load_symbols_rules()
+
+    engine.tick()
+    shard.on_message()
+    fired = set()
+    while parent.poll():
+        msg = parent.recv()
+        if msg[0] == "trigger":
+            fired.add(msg[1]["name"])
+    assert fired == {"futu-only", "any"}
+
+
+def test_rule_for_unregistered_broker_warns_once(db):
+    db_sqlite.add_rule(make_rule("ib-only", brokers="ib"))
+    db_sqlite.add_rule(make_rule("futu-only", brokers="futu"))
+    messages = []
+    sink = logger.add(lambda m: messages.append(m.record["message"]), level="WARNING")
+    try:
+        engine = SimulatedEngine("FUTU", rate=0)
+        engine.sources = {"futu", "tiger"}
+        engine._load_symbols_rules()
+        engine._load_symbols_rules()
+    finally:
+        logger.remove(sink)
+    assert [r["name"] for r in engine._rules_by_id.values()] == ["futu-only"]
+    assert len([m for m in messages if "ib-only" in m]) == 1
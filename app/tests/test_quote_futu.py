@@ -0,0 +1,109 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-28 16:22:47
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-28 16:22:47
+FilePath: /mss_diting/app/tests/test_quote_futu.py
+Description: Futu 推送行情的交易时段过滤（不连接 OpenD）
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio
+import pandas as pd
+
+from futu import RET_OK
+
+from diting import quote_futu
+from diting.quote_futu import FutuEngine, FutuScheduler
+
+
+class OnlyOpen:
+    def __init__(self, *markets):
+        self.markets = set(markets)
+
+    def is_open(self, market: str, now=None) -> bool:
+        return market in self.markets
+
+
+def push_frame(*codes) -> pd.DataFrame:
+    return pd.DataFrame({"code": list(codes), "last_price": 10.0, "open_price": 9.0, "high_price": 11.0,
+                         "low_price": 8.0, "prev_close_price": 9.5, "volume": 100})
+
+
+def test_push_outside_trading_hours_is_dropped():
+    engine = FutuEngine()
+    engine._running, engine._loop = True, asyncio.new_event_loop()
+    try:
+        engine._calendar = OnlyOpen("HK", "US")
+        engine._market_states.set("US", False)  # 日历开市但市场状态为休市（如节假日）
+        engine.on_quote_push(push_frame("HK.00700", "US.AAPL", "SH.600000"))
+        assert set(engine._push_latest) == {"HK.00700"}
+        assert set(engine._push_seen) == {"HK.00700"}
+    finally:
+        engine._loop.close()
+
+
+class FakeContext:
+    """记录订阅与拉取请求的 OpenD 连接"""
+    def __init__(self, remain: int):
+        self.remain = remain
+        self.calls = []
+
+    def query_subscription(self, is_all_conn=True):
+        return RET_OK, {"remain": self.remain}
+
+    def subscribe(self, codes, sub_types):
+        self.calls.append(("subscribe", codes))
+        self.remain -= len(codes)
+        return RET_OK, None
+
+    def unsubscribe(self, codes, sub_types):
+        self.calls.append(("unsubscribe", codes))
+        return RET_OK, None
+
+    def get_stock_quote(self, codes):
+        self.calls.append(("quote", codes))
+        return RET_OK, push_frame(*codes)
+
+    def get_market_snapshot(self, codes):
+        self.calls.append(("snapshot", codes))
+        return RET_OK, push_frame(*codes)
+
+
+def test_scheduler_chunks_subscriptions_and_rotates_overflow(monkeypatch):
+    monkeypatch.setattr(quote_futu, "FUTU_SUB_CHUNK", 2)
+    monkeypatch.setattr(quote_futu, "FUTU_QUOTE_CHUNK", 2)
+    monkeypatch.setattr(quote_futu, "FUTU_ROTATE_SIZE", 1)
+    monkeypatch.setattr(quote_futu, "FUTU_UNSUB_DELAY", 3600)
+    ctx = FakeContext(remain=3)
+    scheduler = FutuScheduler("FUTU")
+    wanted = {"HK.00001", "HK.00002", "HK.00003", "HK.00004", "HK.00005"}
+
+    async def fetch_codes():
+        return [code for data in [d async for d in scheduler.fetch(ctx, sorted(wanted))] for code in data["code"]]
+
+    async def main():
+        await scheduler.sync(ctx, wanted)
+        # 额度只够 3 个，按批次订阅，其余轮转拉取快照
+        assert ctx.calls == [("subscribe", ["HK.00001", "HK.00002"]), ("subscribe", ["HK.00003"])]
+        ctx.calls.clear()
+        first, second = await fetch_codes(), await fetch_codes()
+        assert first == ["HK.00001", "HK.00002", "HK.00003", "HK.00004"]
+        assert second == ["HK.00001", "HK.00002", "HK.00003", "HK.00005"]
+        assert [call[0] for call in ctx.calls] == ["quote", "quote", "snapshot"] * 2
+
+        # 未满最短订阅时长不退订，留待之后的周期
+        ctx.calls.clear()
+        wanted.discard("HK.00001")
+        scheduler.mark_dirty()
+        await scheduler.sync(ctx, wanted)
+        assert ctx.calls == [] and scheduler._dirty
+        monkeypatch.setattr(quote_futu, "FUTU_UNSUB_DELAY", 0)
+        await scheduler.sync(ctx, wanted)
+        assert ctx.calls == [("unsubscribe", ["HK.00001"])]
+
+    asyncio.run(main())
+    assert scheduler.status()["subscribed"] == 2
@@ -0,0 +1,65 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 17:36:10
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 17:36:10
+FilePath: /mss_diting/app/tests/test_quote_hub.py
+Description: 多券商行情仲裁：去重、主来源、限定来源补充求值与过期切换
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+from diting import db_sqlite, quote_hub
+from diting.quote_batch import QuoteBatch
+from diting.quote_hub import QuoteHub
+from conftest import make_rule
+
+
+def quote(close: float) -> QuoteBatch:
+    return QuoteBatch.from_snapshots([{"symbol": "HK.00700", "open": 1.0, "high": close, "low": 1.0, "close": close,
+                                       "pct_chg": 0.0, "pct_amp": 0.0, "volume": 100}])
+
+
+def make_hub(fired: list) -> QuoteHub:
+    for name, brokers in (("any", ""), ("futu-only", "futu"), ("ib-only", "ib")):
+        db_sqlite.add_rule(make_rule(name, brokers=brokers))
+    hub = QuoteHub()
+    hub.sources = {"futu", "ib"}
+    hub._load_symbols_rules()
+    hub.fire_rule = lambda rule, symbol, ohlc: fired.append(rule["name"])
+    return hub
+
+
+def test_hub_arbitrates_sources(db):
+    fired = []
+    hub = make_hub(fired)
+
+    hub.publish("FUTU", quote(10))
+    assert sorted(fired) == ["any", "futu-only"]
+    # 其他来源送达相同行情直接丢弃
+    fired.clear()
+    hub.publish("IB", quote(10))
+    assert fired == []
+    # 非主来源先送达的新行情只对限定了该来源的规则求值
+    hub.publish("IB", quote(11))
+    assert fired == ["ib-only"]
+    fired.clear()
+    hub.publish("FUTU", quote(11))
+    assert sorted(fired) == ["any", "futu-only"]
+
+    sources = hub.status()["sources"]
+    assert sources["IB"]["duplicate"] == 1 and sources["IB"]["fallback"] == 1
+    assert sources["FUTU"]["primary_of"] == 1
+
+
+def test_hub_switches_stale_primary(db, monkeypatch):
+    fired = []
+    hub = make_hub(fired)
+    hub.publish("FUTU", quote(10))
+    monkeypatch.setattr(quote_hub, "HUB_STALE", -1)
+    fired.clear()
+    hub.publish("IB", quote(12))
+    assert sorted(fired) == ["any", "ib-only"]
+    assert hub._feeds["HK.00700"].primary == "IB"
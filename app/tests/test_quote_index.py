@@ -0,0 +1,58 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 10:40:12
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 10:40:12
+FilePath: /mss_diting/app/tests/test_quote_index.py
+Description: 阈值区间索引只跳过结果不可能变化的规则
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+
+from diting.quote_index import ThresholdIndex
+from diting.quote_rule import eval_rule
+from conftest import random_condition, random_rule, random_snapshot
+
+
+def test_candidates_cover_every_matched_rule():
+    rng = random.Random(3)
+    rules = [{"id": i, "rule_json": random_condition(rng) if i % 4 else random_rule(rng)} for i in range(300)]
+    index = ThresholdIndex(rules)
+    assert index.size + len(index.compound) == len(rules) and index.size > 0
+    snapshots = [random_snapshot(rng) for _ in range(5)]
+    for _ in range(200):
+        # 从少量快照中取值，使取值不变与来回跨越阈值的情况都会出现
+        snapshot = rng.choice(snapshots)
+        matched = set()
+        for rule in index.candidates(snapshot) + index.compound:
+            result = eval_rule(rule["rule_json"], snapshot)
+            index.settle(rule, result)
+            if result:
+                matched.add(rule["id"])
+        assert matched == {rule["id"] for rule in rules if eval_rule(rule["rule_json"], snapshot)}
+
+
+def test_unchanged_value_skips_invoked_rules():
+    rule = {"id": 1, "rule_json": {"field": "close", "op": ">", "value": 5}}
+    index = ThresholdIndex([rule])
+    assert index.candidates({"close": 6}) == [rule]
+    rule["_invoked"] = True
+    index.settle(rule, True)
+    assert index.candidates({"close": 6}) == []
+    # 冷却结束后重新参与求值
+    index.rearm(rule)
+    assert index.candidates({"close": 6}) == [rule]
+    index.settle(rule, True)
+    assert index.candidates({"close": 4}) == [rule]
+    index.reset()
+    assert index.candidates({"close": 4}) == []
+
+
+def test_edge_rules_are_always_evaluated():
+    rule = {"id": 1, "_mode": "edge", "rule_json": {"field": "close", "op": ">", "value": 5}}
+    index = ThresholdIndex([rule])
+    assert index.size == 0 and index.compound == [rule]
@@ -0,0 +1,78 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-28 14:05:52
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-28 14:05:52
+FilePath: /mss_diting/app/tests/test_quote_indicator.py
+Description: 逐标的指标状态
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+import pytest
+
+from diting.quote_indicator import SymbolIndicators
+
+SPECS = [("sma", "close", 5), ("sma", "close", 20), ("ema", "close", 10), ("roc", "close", 7), ("sma", "volume", 3)]
+
+
+def feed(state: SymbolIndicators, closes: list, volumes: list | None = None) -> list[dict]:
+    snapshots = []
+    for i, close in enumerate(closes):
+        ohlc = {"close": close} if volumes is None else {"close": close, "volume": volumes[i]}
+        state.update(ohlc)
+        snapshots.append(ohlc)
+    return snapshots
+
+
+def naive(closes: list, volumes: list, t: int) -> dict:
+    """按完整历史逐笔重算第 t 笔的指标，历史不足窗口的不出现"""
+    result = dict()
+    for name, field, window in SPECS:
+        values = (closes if field == "close" else volumes)[:t + 1]
+        key = f"{name}({field},{window})"
+        if name == "sma" and len(values) >= window:
+            result[key] = sum(values[-window:]) / window
+        elif name == "roc" and len(values) > window:
+            result[key] = values[-1] / values[-1 - window] * 100 - 100
+        elif name == "ema" and len(values) >= window:
+            ema, alpha = values[0], 2 / (window + 1)
+            for x in values[1:]:
+                ema += alpha * (x - ema)
+            result[key] = ema
+    return result
+
+
+def random_series(rng: random.Random, size: int) -> tuple[list, list]:
+    return [round(rng.uniform(50, 150), 2) for _ in range(size)], [rng.randint(0, 10 ** 6) for _ in range(size)]
+
+
+def test_ring_buffers_match_naive_recompute():
+    closes, volumes = random_series(random.Random(17), 500)
+    snapshots = feed(SymbolIndicators(SPECS), closes, volumes)
+    for t, ohlc in enumerate(snapshots):
+        expected = naive(closes, volumes, t)
+        assert {k: v for k, v in ohlc.items() if "(" in k} == pytest.approx(expected), t
+
+
+def test_rebuild_keeps_history():
+    # 规则变更新增指标时沿用旧缓冲区的历史，新窗口不必重新积累
+    closes, volumes = random_series(random.Random(18), 60)
+    old = SymbolIndicators([("sma", "close", 20), ("sma", "volume", 3)])
+    feed(old, closes[:30], volumes[:30])
+    state = SymbolIndicators([("sma", "close", 5), ("sma", "close", 20), ("roc", "close", 7), ("sma", "volume", 3)], old)
+    snapshots = feed(state, closes[30:], volumes[30:])
+    for t, ohlc in enumerate(snapshots, start=30):
+        expected = {k: v for k, v in naive(closes, volumes, t).items() if not k.startswith("ema")}
+        assert {k: v for k, v in ohlc.items() if "(" in k} == pytest.approx(expected), t
+
+
+def test_roc_compares_with_value_n_ticks_back():
+    # roc(close, 3)：当前一笔相对 3 笔之前的变化，需要 4 笔行情
+    snapshots = feed(SymbolIndicators([("roc", "close", 3)]), [100, 101, 102, 110, 121])
+    assert ["roc(close,3)" in s for s in snapshots] == [False, False, False, True, True]
+    assert snapshots[3]["roc(close,3)"] == 110 / 100 * 100 - 100
+    assert snapshots[4]["roc(close,3)"] == 121 / 101 * 100 - 100
@@ -0,0 +1,52 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 15:52:30
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 15:52:30
+FilePath: /mss_diting/app/tests/test_quote_manager.py
+Description: 规则写入后经事件推送立即在引擎生效
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio
+
+from diting import db_sqlite
+from diting.quote_manager import QuoteManager
+from diting.quote_sim import SimulatedEngine
+from diting.rule_events import rule_bus
+from conftest import make_rule
+
+
+def test_rule_writes_reach_running_engine(db):
+    manager = QuoteManager()
+    engine = SimulatedEngine(rate=0)
+    manager.register(engine)
+
+    async def run():
+        manager.loop = asyncio.get_running_loop()
+        engine.start(manager.loop)
+        try:
+            # 规则写入在 API 线程，引擎不等待兜底同步周期
+            rule_id = await asyncio.to_thread(db_sqlite.add_rule, make_rule("pushed", symbol="SIM.00001", brokers="sim"))
+            await asyncio.sleep(0.05)
+            assert engine._rules_by_id[rule_id]["name"] == "pushed"
+            assert "SIM.00001" in engine._symbols
+
+            await asyncio.to_thread(db_sqlite.update_rule, rule_id, make_rule("renamed", symbol="SIM.00002", brokers="sim"))
+            await asyncio.sleep(0.05)
+            assert engine._rules_by_id[rule_id]["name"] == "renamed"
+            assert "SIM.00001" not in engine._rules or not engine._rules["SIM.00001"]
+
+            await asyncio.to_thread(db_sqlite.delete_rule, rule_id)
+            await asyncio.sleep(0.05)
+            assert rule_id not in engine._rules_by_id
+        finally:
+            engine.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        rule_bus.unsubscribe(manager._on_rule_changed)
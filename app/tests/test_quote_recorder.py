@@ -0,0 +1,48 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 17:08:44
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 17:08:44
+FilePath: /mss_diting/app/tests/test_quote_recorder.py
+Description: 录制文件追加写入后可完整读回并回放
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+import numpy as np
+
+from diting.quote_batch import QuoteBatch
+from diting.quote_recorder import QuoteRecorder, iter_records, records_to_frame
+from diting.quote_replay import read_chunks
+from conftest import random_snapshot
+
+
+def test_recorded_batches_read_back(tmp_path):
+    rng = random.Random(19)
+    batches = [[random_snapshot(rng, f"HK.{i:05d}") for i in range(3)] for _ in range(4)]
+    recorder = QuoteRecorder(str(tmp_path))
+    recorder.start()
+    for snapshots in batches:
+        recorder.record("FUTU", QuoteBatch.from_snapshots(snapshots))
+    recorder.stop()
+
+    files = list(tmp_path.glob("futu-*.qrec"))
+    assert len(files) == 1 and recorder.status()["rows"] == 12
+    # 文件末尾写了一半的记录块被忽略
+    with open(files[0], "ab") as f:
+        f.write(b"\x93NUMPY\x01\x00")
+    records = np.concatenate(list(iter_records(str(files[0]))))
+    data = records_to_frame(records)
+    assert data.drop(columns="ts").to_dict("records") == [s for snapshots in batches for s in snapshots]
+    assert np.all(np.diff(data["ts"].to_numpy()) >= 0)
+    assert sum(len(frame) for frame in read_chunks(str(files[0]))) == 12
+
+
+def test_disabled_recorder_ignores_batches():
+    recorder = QuoteRecorder("")
+    recorder.start()
+    recorder.record("FUTU", QuoteBatch.from_snapshots([random_snapshot(random.Random(1))]))
+    assert recorder.status()["rows"] == 0 and recorder.status()["queue"] == 0
@@ -0,0 +1,29 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-28 15:40:09
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-28 15:40:09
+FilePath: /mss_diting/app/tests/test_quote_replay.py
+Description: 离线回放
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+from diting import db_sqlite
+from diting.quote_replay import ReplayEngine
+from conftest import make_rule
+
+
+def test_replay_fires_without_registering_change_cursor(db, tmp_path):
+    db_sqlite.add_rule(make_rule("break-3", rule_json='{"field":"close","op":">","value":3}', cooldown=0))
+    path = tmp_path / "quotes.csv"
+    path.write_text("ts,symbol,open,high,low,close,volume\n"
+                    + "".join(f"{t},HK.00700,1,9,1,{close},100\n" for t, close in enumerate([1, 5, 2, 6])))
+
+    stats = ReplayEngine().replay([str(path)])
+    assert stats["cycles"] == 4 and stats["triggers"] == 2
+    assert stats["by_rule"] == {"break-3": 2}
+    # 回放不登记变更同步进度，不影响实盘引擎清理变更日志
+    assert db_sqlite.get_conn().execute("SELECT COUNT(*) FROM rule_change_cursors").fetchone()[0] == 0
@@ -0,0 +1,45 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 09:10:25
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 09:10:25
+FilePath: /mss_diting/app/tests/test_quote_rule.py
+Description: 规则编译为闭包后与逐层解释求值一致
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import json, random
+
+from diting.quote_rule import compile_rule, eval_rule, get_compiled_rule, prune_compiled_rules
+from conftest import random_rule, random_snapshot
+
+
+def test_compiled_rule_matches_eval_rule():
+    rng = random.Random(1)
+    for _ in range(300):
+        rule = random_rule(rng)
+        compiled = compile_rule(rule)
+        for _ in range(20):
+            snapshot = random_snapshot(rng)
+            assert compiled(snapshot) == eval_rule(rule, snapshot), rule
+
+
+def test_compiled_rule_short_circuits():
+    # AND 首个条件不成立时不再访问后续字段
+    compiled = compile_rule({"logic": "AND", "conditions": [{"field": "close", "op": ">", "value": 10},
+                                                            {"field": "volume", "op": ">", "value": 1}]})
+    assert compiled({"close": 5}) is False
+
+
+def test_compiled_rule_cache_follows_updated_at():
+    rule_json = json.dumps({"field": "close", "op": ">", "value": 1})
+    rule, first = get_compiled_rule(9001, "2025-01-01 00:00:00", rule_json)
+    assert get_compiled_rule(9001, "2025-01-01 00:00:00", rule_json)[1] is first
+    changed = json.dumps({"field": "close", "op": "<", "value": 1})
+    rule, second = get_compiled_rule(9001, "2025-01-02 00:00:00", changed)
+    assert second is not first and second({"close": 0}) and rule["op"] == "<"
+    prune_compiled_rules(set())
+    assert get_compiled_rule(9001, "2025-01-02 00:00:00", changed)[1] is not second
@@ -0,0 +1,48 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 18:02:57
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 18:02:57
+FilePath: /mss_diting/app/tests/test_quote_sim.py
+Description: 模拟行情可复现，标的变化时保留已有走势
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import numpy as np
+
+from diting.quote_sim import RandomWalk
+
+
+def walk(seed: int, steps: int = 50) -> list:
+    rw = RandomWalk(seed=seed)
+    rw.resize(["SIM.00001", "SIM.00002"])
+    return [rw.step() for _ in range(steps)]
+
+
+def test_same_seed_same_quotes():
+    first, second = walk(7), walk(7)
+    for a, b in zip(first, second):
+        assert all(np.array_equal(a.columns[f], b.columns[f]) for f in a.columns)
+    assert not np.array_equal(first[-1].columns["close"], walk(8)[-1].columns["close"])
+
+
+def test_quotes_are_consistent():
+    for batch in walk(7):
+        close = batch.columns["close"]
+        assert np.all(batch.columns["low"] <= close) and np.all(close <= batch.columns["high"])
+        np.testing.assert_allclose(batch.columns["pct_amp"], batch.columns["high"] / batch.columns["low"] * 100 - 100)
+    volumes = np.array([batch.columns["volume"] for batch in walk(7)])
+    assert np.all(np.diff(volumes, axis=0) >= 0)
+
+
+def test_resize_keeps_existing_walks():
+    rw = RandomWalk(seed=7)
+    rw.resize(["SIM.00002", "SIM.00001"])
+    last = rw.step()
+    rw.resize(["SIM.00003", "SIM.00002"])
+    assert rw.symbols == ["SIM.00002", "SIM.00003"]
+    assert rw._close[0] == last.columns["close"][last.symbols.index("SIM.00002")]
+    assert len(rw.step()) == 2
@@ -0,0 +1,47 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 10:02:44
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 10:02:44
+FilePath: /mss_diting/app/tests/test_quote_vector.py
+Description: 批量向量化求值与逐条求值一致
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import random
+
+from diting.quote_batch import QuoteBatch
+from diting.quote_rule import eval_rule
+from diting.quote_vector import VectorRuleSet
+from conftest import random_rule, random_snapshot
+
+SYMBOLS = [f"HK.{i:05d}" for i in range(8)]
+
+
+def test_vector_rules_match_eval_rule():
+    rng = random.Random(2)
+    rules = [{"id": i, "symbol": rng.choice(SYMBOLS), "rule_json": random_rule(rng)} for i in range(400)]
+    vector = VectorRuleSet(rules)
+    assert len(vector) == len(rules) and not vector.fallback
+    for _ in range(30):
+        # 部分标的本批没有行情，其规则不应触发
+        snapshots = [random_snapshot(rng, s) for s in SYMBOLS if rng.random() < 0.8]
+        batch = QuoteBatch.from_snapshots(snapshots)
+        fired = {(rule["id"], row) for rule, row in vector.evaluate(batch)}
+        rows = {s["symbol"]: i for i, s in enumerate(snapshots)}
+        expected = {(rule["id"], rows[rule["symbol"]]) for rule in rules
+                    if rule["symbol"] in rows and eval_rule(rule["rule_json"], snapshots[rows[rule["symbol"]]])}
+        assert fired == expected
+
+
+def test_non_numeric_rules_fall_back():
+    rules = [{"id": 1, "symbol": "HK.00000", "rule_json": {"field": "close", "op": ">", "value": 1}},
+             {"id": 2, "symbol": "HK.00000", "rule_json": {"field": "close", "op": "=", "value": "x"}},
+             {"id": 3, "symbol": "HK.00000",
+              "rule_json": {"field": {"indicator": "sma", "field": "close", "window": 3}, "op": ">", "value": 1}}]
+    vector = VectorRuleSet(rules)
+    assert [r["id"] for r in vector.rules] == [1]
+    assert [r["id"] for r in vector.fallback] == [2, 3]
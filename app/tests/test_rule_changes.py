@@ -0,0 +1,55 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-27 10:12:36
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-27 10:12:36
+FilePath: /mss_diting/app/tests/test_rule_changes.py
+Description: 规则变更日志按各引擎同步进度清理
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+from diting import db_sqlite
+from conftest import make_rule
+
+
+def add_rule(name: str) -> int:
+    return db_sqlite.add_rule(make_rule(name))
+
+
+def change_seqs() -> list:
+    return [row[0] for row in db_sqlite.get_conn().execute("SELECT seq FROM rule_changes ORDER BY seq")]
+
+
+def test_changes_pruned_up_to_slowest_engine(db):
+    for i in range(3):
+        add_rule(f"rule-{i}")
+    assert db_sqlite.claim_rule_change_seq("A") == 3
+    assert db_sqlite.claim_rule_change_seq("B") == 3
+    for i in range(3, 6):
+        add_rule(f"rule-{i}")
+
+    # B 尚未同步 4~6，A 同步完成后只能清理到 3
+    db_sqlite.ack_rule_changes("A", 6)
+    assert change_seqs() == [4, 5, 6]
+    rows, seq = db_sqlite.get_rule_changes(3)
+    assert [row["name"] for row in rows] == ["rule-3", "rule-4", "rule-5"] and seq == 6
+
+    # 全部同步后只保留最新一条，序号继续递增
+    db_sqlite.ack_rule_changes("B", 6)
+    assert change_seqs() == [6]
+    assert db_sqlite.get_rule_change_seq() == 6
+    add_rule("rule-6")
+    assert db_sqlite.get_rule_changes(6)[1] == 7
+
+
+def test_startup_resets_cursors_and_prunes(db):
+    for i in range(3):
+        add_rule(f"rule-{i}")
+    db_sqlite.claim_rule_change_seq("GONE")
+    add_rule("rule-3")
+    db_sqlite.init_db()
+    assert change_seqs() == [4]
+    assert db_sqlite.get_conn().execute("SELECT COUNT(*) FROM rule_change_cursors").fetchone()[0] == 0
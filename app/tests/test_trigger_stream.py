@@ -0,0 +1,77 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 19:04:21
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 19:04:21
+FilePath: /mss_diting/app/tests/test_trigger_stream.py
+Description: 触发记录推送的断点续传、去重与溢出补齐
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio
+import pytest
+
+from diting import db_sqlite, trigger_stream
+from diting.models import Trigger
+from diting.rule_events import rule_bus
+from diting.trigger_stream import TriggerBroadcaster, TriggerFilter
+from conftest import make_rule
+
+
+@pytest.fixture
+def broadcaster(db):
+    b = TriggerBroadcaster()
+    yield b
+    rule_bus.unsubscribe(b._on_rule_changed)
+
+
+def write(rule_id: int, count: int, symbol: str = "HK.00700") -> list:
+    """写入数据库并返回写入器回调的参数"""
+    triggers = [Trigger(rule_id=rule_id, symbol=symbol, message=f"m{i}") for i in range(count)]
+    ids = db_sqlite.add_triggers_batch([(trigger, None, None, 0) for trigger in triggers])
+    return [(trigger_id, trigger, None) for trigger_id, trigger in zip(ids, triggers)]
+
+
+def test_resume_from_last_id(broadcaster):
+    rule_id = db_sqlite.add_rule(make_rule("s"))
+    write(rule_id, 3)
+
+    async def main():
+        stream = broadcaster.stream(TriggerFilter(), last_id=1)
+        try:
+            first = [await anext(stream), await anext(stream)]
+            # 续传期间写入的记录与数据库中已续传的记录重叠，按 id 去重
+            written = write(rule_id, 1)
+            await asyncio.to_thread(broadcaster.on_triggers_written, [(3, written[0][1], None)] + written, True)
+            return first + [await anext(stream)]
+        finally:
+            await stream.aclose()
+
+    events = asyncio.run(main())
+    assert [e["id"] for e in events] == [2, 3, 4]
+    assert events[0]["name"] == "s" and events[0]["message"] == "m1"
+    assert broadcaster.status()["subscribers"] == 0
+
+
+def test_overflow_backfills_from_db(broadcaster, monkeypatch):
+    monkeypatch.setattr(trigger_stream, "STREAM_BUFFER", 2)
+    monkeypatch.setattr(trigger_stream, "STREAM_HEARTBEAT", 0.05)
+    rule_id = db_sqlite.add_rule(make_rule("s"))
+
+    async def main():
+        stream = broadcaster.stream(TriggerFilter.parse(symbol="HK.00700"))
+        try:
+            assert await anext(stream) is None  # 心跳
+            # 订阅者来不及读取，缓冲区只保留最新 2 条
+            await asyncio.to_thread(broadcaster.on_triggers_written, write(rule_id, 5), True)
+            await asyncio.to_thread(broadcaster.on_triggers_written, write(rule_id, 1, "HK.09988"), True)
+            return [await anext(stream) for _ in range(5)]
+        finally:
+            await stream.aclose()
+
+    events = asyncio.run(main())
+    assert [e["id"] for e in events] == [1, 2, 3, 4, 5]
+    assert broadcaster.status()["dropped"] == 3
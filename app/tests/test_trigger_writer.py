@@ -0,0 +1,71 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 15:16:42
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 15:16:42
+FilePath: /mss_diting/app/tests/test_trigger_writer.py
+Description: 触发记录批量写入、flush 与写入回调
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import sqlite3
+
+from diting import trigger_writer as writer_module
+from diting.db_sqlite import add_rule, get_triggers, count_outbox
+from diting.models import Trigger
+from diting.trigger_writer import TriggerWriter
+from conftest import make_rule
+
+
+def test_writes_batch_and_notifies_listeners(db):
+    rule_id = add_rule(make_rule("w"))
+    writer = TriggerWriter(flush_size=3, flush_interval=5)
+    written = []
+    writer.subscribe(lambda items, ok: written.append((items, ok)))
+    try:
+        # 攒够 flush_size 条即写入，不等待时间窗口
+        seqs = [writer.submit(Trigger(rule_id=rule_id, symbol="HK.00700", message=f"m{n}"), url)
+                for n, url in enumerate(["http://hook/a", None, "http://hook/b"])]
+        assert writer.wait(seqs[-1], timeout=2)
+        assert writer.flush(timeout=2)
+    finally:
+        writer.stop()
+    assert len(written) == 1 and written[0][1] is True
+    assert [(trigger_id, trigger.message, url) for trigger_id, trigger, url in written[0][0]] == \
+        [(1, "m0", "http://hook/a"), (2, "m1", None), (3, "m2", "http://hook/b")]
+    assert [row["message"] for row in get_triggers()] == ["m2", "m1", "m0"]
+    # 没有地址的触发记录不进入发件箱
+    assert count_outbox() == {"pending": 2}
+    assert writer.status()["committed"] == 3
+
+
+def test_failed_batch_is_reported_once(db, monkeypatch):
+    rule_id = add_rule(make_rule("w"))
+    calls = []
+    def add_triggers_batch(items):
+        calls.append(len(items))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        if len(calls) == 2:
+            raise sqlite3.IntegrityError("bad row")
+        return list(range(1, len(items) + 1))
+    monkeypatch.setattr(writer_module, "add_triggers_batch", add_triggers_batch)
+    monkeypatch.setattr(writer_module, "TRIGGER_RETRY_DELAY", 0)
+
+    writer = TriggerWriter(flush_size=1, flush_interval=0)
+    written = []
+    writer.subscribe(lambda items, ok: written.append(([trigger_id for trigger_id, _, _ in items], ok)))
+    try:
+        # 临时错误重试后仍失败的批次被放弃，flush 报告失败
+        writer.submit(Trigger(rule_id=rule_id, symbol="HK.00700", message="lost"))
+        assert writer.flush(timeout=2) is False
+        writer.submit(Trigger(rule_id=rule_id, symbol="HK.00700", message="ok"))
+        assert writer.flush(timeout=2) is True
+    finally:
+        writer.stop()
+    assert calls == [1, 1, 1]
+    assert written == [([None], False), ([1], True)]
+    assert (writer.status()["lost"], writer.status()["errors"]) == (1, 1)
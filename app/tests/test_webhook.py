@@ -0,0 +1,77 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 13:20:16
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 13:20:16
+FilePath: /mss_diting/app/tests/test_webhook.py
+Description: 异步 Webhook 分发器的投递结果与丢弃
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio, threading, httpx
+
+from diting.webhook import WebhookDispatcher, parse_batch_results
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    # /fail 返回 500，其余返回 200
+    return httpx.Response(500 if request.url.path == "/fail" else 200, json={"ok": True})
+
+
+async def start(dispatcher: WebhookDispatcher):
+    dispatcher.start(asyncio.get_running_loop())
+    await dispatcher._client.aclose()
+    dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_dispatcher_reports_delivery_results():
+    results = []
+
+    async def main():
+        dispatcher = WebhookDispatcher(concurrency=2, queue_size=10)
+        await start(dispatcher)
+        dispatcher.submit("http://hook/ok", {"n": 1}, lambda ok, error, items: results.append(("ok", ok, error)))
+        dispatcher.submit("http://hook/fail", {"n": 2}, lambda ok, error, items: results.append(("fail", ok, error)))
+        # 其他线程的提交转交到事件循环
+        thread = threading.Thread(target=dispatcher.submit, args=(
+            "http://hook/ok", {"n": 3}, lambda ok, error, items: results.append(("thread", ok, error))))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+        await dispatcher._queue.join()
+        status = dispatcher.status()
+        await dispatcher.aclose()
+        return status
+
+    status = asyncio.run(main())
+    assert sorted(results) == [("fail", False, "HTTP 500"), ("ok", True, None), ("thread", True, None)]
+    assert (status["sent"], status["failed"], status["dropped"]) == (2, 1, 0)
+
+
+def test_dispatcher_drops_when_full_or_stopped():
+    results = []
+    callback = lambda ok, error, items: results.append((ok, error))
+    assert WebhookDispatcher().submit("http://hook/ok", {}, callback) is False
+
+    async def main():
+        dispatcher = WebhookDispatcher(concurrency=1, queue_size=1)
+        await start(dispatcher)
+        # 入队后 worker 尚未取走，第二条超出队列上限
+        assert dispatcher.submit("http://hook/ok", {}, callback)
+        assert dispatcher.submit("http://hook/ok", {}, callback) is False
+        await dispatcher._queue.join()
+        await dispatcher.aclose()
+
+    asyncio.run(main())
+    assert results == [(False, "dropped"), (False, "dropped"), (True, None)]
+
+
+def test_parse_batch_results():
+    assert parse_batch_results([True, 0], 2) == [True, False]
+    assert parse_batch_results({"results": [{"ok": False}, {"status": 200}, {"status": "error"}]}, 3) == [False, True, False]
+    # 条数不一致或格式无法识别时按整体结果处理
+    assert parse_batch_results([True], 2) is None
+    assert parse_batch_results({"ok": True}, 1) is None
@@ -0,0 +1,118 @@
+'''
+Author: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+Date: 2025-09-29 14:02:51
+LastEditors: kevincnzhengyang kevin.cn.zhengyang@gmail.com
+LastEditTime: 2025-09-29 14:02:51
+FilePath: /mss_diting/app/tests/test_webhook_outbox.py
+Description: 发件箱的退避重试与死信
+
+运行方式：python -m pytest
+
+Copyright (c) 2025 by ${git_name_email}, All Rights Reserved.
+'''
+
+import asyncio, time
+
+from diting import webhook_outbox
+from diting.db_sqlite import add_rule, add_triggers_batch, get_conn
+from diting.models import Trigger
+from diting.webhook_outbox import WebhookOutbox, backoff_delay
+from conftest import make_rule
+
+
+class FakeDispatcher:
+    """只记录提交的投递任务，由测试决定投递结果"""
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, url, payload, callback=None, batch=None):
+        self.jobs.append((url, payload, callback, batch))
+        return True
+
+
+def outbox_row(outbox_id: int):
+    return get_conn().execute("SELECT * FROM webhook_outbox WHERE id=?", (outbox_id,)).fetchone()
+
+
+def test_backoff_delay_doubles_up_to_max(monkeypatch):
+    monkeypatch.setattr(webhook_outbox, "OUTBOX_BACKOFF_BASE", 5)
+    monkeypatch.setattr(webhook_outbox, "OUTBOX_BACKOFF_MAX", 30)
+    assert [backoff_delay(n) for n in range(6)] == [5, 5, 10, 20, 30, 30]
+
+
+def test_failed_delivery_backs_off_then_goes_dead(db, monkeypatch):
+    monkeypatch.setattr(webhook_outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    rule_id = add_rule(make_rule("hook", webhook_url="http://hook/a"))
+    add_triggers_batch([(Trigger(rule_id=rule_id, symbol="HK.00700", message="m"), "http://hook/a", {"n": 1}, 0)])
+    fake = FakeDispatcher()
+    outbox = WebhookOutbox(fake)
+    notified = []
+    outbox.subscribe(lambda rule, ok: notified.append((rule, ok)))
+
+    async def attempt(ok: bool):
+        assert await outbox.drain_once() == 1
+        # 投递中的记录不会被重复领取
+        assert await outbox.drain_once() == 0
+        fake.jobs[-1][2](ok, None if ok else "HTTP 500", None)
+        assert await outbox.settle() == 1
+
+    async def main():
+        for attempts in (1, 2):
+            started = time.time()
+            await attempt(False)
+            row = outbox_row(1)
+            assert (row["status"], row["attempts"], row["last_error"]) == ("pending", attempts, "HTTP 500")
+            assert row["next_attempt_at"] >= started + backoff_delay(attempts)
+            # 未到重试时间不会投递
+            assert await outbox.drain_once() == 0
+            with get_conn() as conn:
+                conn.execute("UPDATE webhook_outbox SET next_attempt_at=0")
+        await attempt(False)
+
+    asyncio.run(main())
+    assert (outbox_row(1)["status"], outbox_row(1)["attempts"]) == ("dead", 3)
+    assert notified == [(rule_id, False)]
+    assert outbox.status()["dead"] == 1
+
+
+def test_successful_delivery_marks_done(db):
+    rule_id = add_rule(make_rule("hook", webhook_url="http://hook/a"))
+    add_triggers_batch([(Trigger(rule_id=rule_id, symbol="HK.00700", message="m"), "http://hook/a", {"n": 1}, 0)])
+    fake = FakeDispatcher()
+    outbox = WebhookOutbox(fake)
+    notified = []
+    outbox.subscribe(lambda rule, ok: notified.append((rule, ok)))
+
+    async def main():
+        assert await outbox.drain_once() == 1
+        fake.jobs[0][2](True, None, None)
+        await outbox.settle()
+
+    asyncio.run(main())
+    assert fake.jobs[0][:2] == ("http://hook/a", {"n": 1})
+    assert (outbox_row(1)["status"], outbox_row(1)["attempts"]) == ("done", 1)
+    assert notified == [(rule_id, True)]
+
+
+def test_batch_url_coalesces_and_settles_per_item(db, monkeypatch):
+    monkeypatch.setattr(webhook_outbox, "WEBHOOK_BATCH_URLS", {"http://hook/b"})
+    rule_id = add_rule(make_rule("hook", webhook_url="http://hook/b"))
+    trigger = Trigger(rule_id=rule_id, symbol="HK.00700", message="m")
+    add_triggers_batch([(trigger, "http://hook/b", {"n": n}, 0) for n in range(3)] +
+                       [(trigger, "http://hook/a", {"n": 3}, 0)])
+    fake = FakeDispatcher()
+    outbox = WebhookOutbox(fake)
+
+    async def main():
+        assert await outbox.drain_once() == 4
+        batched, single = sorted(fake.jobs, key=lambda job: job[0], reverse=True)
+        assert batched[0] == "http://hook/b" and batched[1] == [{"n": 0}, {"n": 1}, {"n": 2}] and batched[3] == 3
+        assert single[1] == {"n": 3} and single[3] is None
+        # 批量请求整体成功，逐条结果中被拒绝的记录单独重试
+        batched[2](True, None, [True, False, True])
+        single[2](True, None, None)
+        assert await outbox.settle() == 4
+
+    asyncio.run(main())
+    assert [outbox_row(i)["status"] for i in range(1, 5)] == ["done", "pending", "done", "done"]
+    assert outbox_row(2)["last_error"] == "batch item rejected"